@@ -0,0 +1 @@
+"""Planner / retrieval benchmarks and the stub Ollama server they run against."""
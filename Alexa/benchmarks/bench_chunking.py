@@ -0,0 +1,111 @@
+"""
+Chunker micro-benchmark: processing.chunk_spans vs the character chunker.
+
+Chunks a set of synthetic ~12k-character pages (paragraphs of sentences, the
+size pipeline.py truncates fetched pages to) with both implementations and
+reports per-page latency plus how many chunks start or end in the middle of a
+word or sentence.
+
+    python benchmarks/bench_chunking.py --out chunking.json
+"""
+import argparse
+import random
+import time
+
+from bench_common import percentile, write_results
+
+from web_retrieval import processing
+
+WORDS = (
+    "the tower was built in for world fair and is metres tall it remains one of most visited "
+    "monuments paris france engineer gustave eiffel company designed iron lattice structure "
+    "visitors can reach top by lift or stairs during summer months tickets sold online"
+).split()
+
+def make_page(rng: random.Random, chars: int = 12000) -> str:
+    paragraphs, size = [], 0
+    while size < chars:
+        sentences = []
+        for _ in range(rng.randint(2, 7)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".....?!"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:chars]
+
+def _char_spans(text: str) -> list:
+    spans, start = [], 0
+    for chunk in processing.chunk_text(text, chunk_size=1500, overlap=100):
+        spans.append((start, start + len(chunk)))
+        start += 1400
+    return spans
+
+def _boundary_stats(text: str, spans: list) -> dict:
+    mid_word = mid_sentence = 0
+    for start, end in spans:
+        if (start > 0 and text[start - 1].isalnum() and text[start].isalnum()) or \
+           (end < len(text) and text[end - 1].isalnum() and text[end].isalnum()):
+            mid_word += 1
+        if end < len(text) and text[:end].rstrip()[-1:] not in (".", "!", "?"):
+            mid_sentence += 1
+    return {"chunks": len(spans), "mid_word": mid_word, "mid_sentence_end": mid_sentence}
+
+def _summary_us(values_us: list) -> dict:
+    # latency_summary rounds to 0.01 ms, too coarse for this
+    return {
+        "n": len(values_us),
+        "mean_us": round(sum(values_us) / len(values_us), 1) if values_us else 0.0,
+        "p50_us": round(percentile(values_us, 50), 1),
+        "p99_us": round(percentile(values_us, 99), 1),
+    }
+
+def run(pages: list, repeat: int) -> dict:
+    impls = {
+        "chunk_text": lambda text: processing.chunk_text(text, chunk_size=1500, overlap=100),
+        "chunk_spans": lambda text: processing.chunk_spans(text, max_tokens=200),
+        # what select_passages actually pays: spans plus materializing each chunk
+        "chunk_spans+slice": lambda text: [text[s:e] for s, e in processing.chunk_spans(text, max_tokens=200)],
+    }
+    results = {}
+    for name, fn in impls.items():
+        times = []
+        for text in pages:
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                fn(text)
+            times.append((time.perf_counter() - t0) * 1e6 / repeat)
+        results[name] = {"per_page": _summary_us(times)}
+
+    for name, span_fn in (("chunk_text", _char_spans), ("chunk_spans", processing.chunk_spans)):
+        totals = {"chunks": 0, "mid_word": 0, "mid_sentence_end": 0}
+        for text in pages:
+            for k, v in _boundary_stats(text, span_fn(text)).items():
+                totals[k] += v
+        results[name]["boundaries"] = totals
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunker micro-benchmark")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="chunking.json")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pages = [make_page(rng) for _ in range(args.pages)]
+    results = {
+        "meta": {"pages": args.pages, "repeat": args.repeat, "page_chars": 12000},
+        "impls": run(pages, args.repeat),
+    }
+    for name, summary in results["impls"].items():
+        line = f"{name:>18}: p50={summary['per_page']['p50_us']:8.1f}us p99={summary['per_page']['p99_us']:8.1f}us"
+        if "boundaries" in summary:
+            b = summary["boundaries"]
+            line += f" chunks={b['chunks']} mid_word={b['mid_word']} mid_sentence={b['mid_sentence_end']}"
+        print(line)
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
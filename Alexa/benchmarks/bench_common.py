@@ -0,0 +1,51 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+"""
+import json
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ALEXA_DIR = os.path.dirname(BENCH_DIR)
+if ALEXA_DIR not in sys.path:
+    sys.path.insert(0, ALEXA_DIR)
+
+CORPUS_PATH = os.path.join(BENCH_DIR, "planner_corpus.jsonl")
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    """Labelled utterances: [{"utterance", "intent", "expected"}, ...]"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def plan_label(plan: dict) -> str:
+    """Collapse a plan dict to the label used in the corpus."""
+    if not isinstance(plan, dict):
+        return "invalid"
+    action = plan.get("action")
+    if action == "call_tool":
+        return plan.get("name") or "invalid"
+    if action in ("call_tools", "final"):
+        return action
+    return "invalid"
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100.0 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+def latency_summary(values_ms: list) -> dict:
+    return {
+        "n": len(values_ms),
+        "mean_ms": round(sum(values_ms) / len(values_ms), 2) if values_ms else 0.0,
+        "p50_ms": round(percentile(values_ms, 50), 2),
+        "p95_ms": round(percentile(values_ms, 95), 2),
+        "p99_ms": round(percentile(values_ms, 99), 2),
+    }
+
+def write_results(results: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
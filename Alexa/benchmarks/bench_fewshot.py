@@ -0,0 +1,91 @@
+"""
+Planner latency / routing accuracy: all FEW_SHOTS vs retrieval-selected shots.
+
+By default runs against the in-process stub server (benchmarks/stub_ollama.py),
+which caches a prompt prefix the way Ollama does, so the prompt tokens each
+setting re-evaluates are comparable offline. Pass --real to use the Ollama at
+OLLAMA_URL. Run from the Alexa folder:
+
+    python benchmarks/bench_fewshot.py --k 0 4 8 --out fewshot_results.json
+    python benchmarks/bench_fewshot.py --real --k 0 8
+"""
+import argparse
+import time
+
+from bench_common import load_corpus, plan_label, latency_summary, write_results
+from bench_planner import stub_plan_for
+from stub_ollama import StubOllama
+
+import planner
+from context_manager import get_context
+
+def _prompt_tokens(stub, evaluated_before: int) -> int:
+    if stub is not None:
+        # The stub counts evaluated prompt tokens even when early stop skips the done chunk
+        return stub.stats["prompt_tokens"] - stub.stats["cached_tokens"] - evaluated_before
+    last = planner.get_planner_metrics()["last"] or {}
+    return last.get("prompt_eval_count") or 0
+
+def run(k: int, corpus: list, stub=None) -> dict:
+    latencies, prompt_tokens = [], []
+    correct, errors = 0, 0
+    for row in corpus:
+        get_context().clear()
+        evaluated_before = stub.stats["prompt_tokens"] - stub.stats["cached_tokens"] if stub else 0
+        t0 = time.perf_counter()
+        try:
+            decision = planner.plan_with_ollama(row["utterance"], fewshot_k=k)
+        except Exception as e:
+            errors += 1
+            print(f"  [k={k}] error on '{row['utterance']}': {e}")
+            continue
+        latencies.append((time.perf_counter() - t0) * 1000)
+        prompt_tokens.append(_prompt_tokens(stub, evaluated_before))
+        if plan_label(decision) == row["expected"]:
+            correct += 1
+
+    n = len(corpus)
+    return {
+        "k": k,
+        "latency": latency_summary(latencies),
+        "mean_prompt_eval_count": round(sum(prompt_tokens) / len(prompt_tokens), 1) if prompt_tokens else 0,
+        "accuracy": round(correct / n, 3) if n else 0.0,
+        "errors": errors,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--k", type=int, nargs="+", default=[0, 8])
+    parser.add_argument("--real", action="store_true", help="use the Ollama at OLLAMA_URL")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="stub sleep multiplier")
+    parser.add_argument("--out", default="fewshot_results.json")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    stub = None
+    if not args.real:
+        stub = StubOllama(answers={row["utterance"]: stub_plan_for(row) for row in corpus},
+                          time_scale=args.time_scale).start()
+        planner.OLLAMA_URL = stub.url
+
+    results = {"backend": "ollama" if args.real else "stub", "corpus_size": len(corpus), "runs": []}
+    try:
+        # One untimed call so model load is not charged to the first configuration
+        planner.warm_up()
+        for k in args.k:
+            summary = run(k, corpus, stub)
+            results["runs"].append(summary)
+            label = "all" if k <= 0 else str(k)
+            print(
+                f"shots={label:>4}  p50={summary['latency']['p50_ms']:8.1f}ms  "
+                f"p95={summary['latency']['p95_ms']:8.1f}ms  "
+                f"prompt_tokens={summary['mean_prompt_eval_count']:7.1f}  "
+                f"accuracy={summary['accuracy']:.3f}"
+            )
+    finally:
+        if stub is not None:
+            stub.stop()
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
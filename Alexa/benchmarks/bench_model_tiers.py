@@ -0,0 +1,146 @@
+"""
+Per-task model assignment benchmark.
+
+Runs the three LLM stages of a web-search turn for every question in
+search_corpus.jsonl under each model assignment:
+
+    planner         planner.plan_with_ollama            ("planner" profile)
+    query_planner   generation.generate_plan            ("query_planner" profile)
+    answer          generation.generate_grounded_answer ("answer" profile)
+
+Assignments:
+    large    every task on --large
+    tiered   planner + query planner on --small, answers on --large
+    small    every task on --small
+
+Search and page fetches are left out: they do not depend on the model. By
+default the stub server stands in for Ollama, with the small model costing
+--small-cost of the large one per token. Pass --real to use the Ollama at
+OLLAMA_URL (both models are loaded before timing starts).
+
+    python benchmarks/bench_model_tiers.py --out model_tiers.json
+    python benchmarks/bench_model_tiers.py --real --small llama3.2:1b --large llama3.1:8b
+"""
+import argparse
+import time
+from collections import defaultdict
+
+from bench_common import latency_summary, write_results
+from bench_query_planning import PlannerStub, load_search_corpus
+from stub_ollama import StubOllama
+
+import config
+import model_warmup
+import ollama_client
+import planner
+from web_retrieval import generation
+
+ASSIGNMENTS = ("large", "tiered", "small")
+STAGES = ("planner", "query_planner", "answer")
+
+# Fixed grounding context so only the model assignment varies between runs
+CONTEXT = [
+    {"text": "The Eiffel Tower is 330 metres tall and was completed in 1889 for the World's Fair.", "citation_id": 1},
+    {"text": "Python was created by Guido van Rossum and first released in 1991.", "citation_id": 2},
+]
+CITATIONS = [
+    {"id": 1, "title": "Eiffel Tower", "url": "https://example.com/eiffel"},
+    {"id": 2, "title": "Python", "url": "https://example.com/python"},
+]
+
+class TierStub(PlannerStub):
+    """Query-planner JSON for generate_plan prompts, a planner action for the rest."""
+
+    def answer_for(self, user_text, json_mode):
+        if json_mode and 'User Question: "' not in user_text:
+            return StubOllama.answer_for(self, user_text, json_mode)
+        return super().answer_for(user_text, json_mode)
+
+def assign(name: str, small: str, large: str):
+    """Point MODEL_PROFILES (and the planner's import-time copy) at the assignment's models."""
+    planning = large if name == "large" else small
+    answering = small if name == "small" else large
+    profiles = dict(config.MODEL_PROFILES)
+    for task, (_, ctx, temperature) in profiles.items():
+        model = planning if task in ("planner", "query_planner") else answering
+        profiles[task] = (model, ctx, temperature)
+    config.MODEL_PROFILES = profiles
+    planner.PLANNER_MODEL, planner.PLANNER_OPTIONS = ollama_client.task_profile("planner")
+
+def run_assignment(corpus: list, repeat: int) -> dict:
+    stage_ms = defaultdict(list)
+    total_ms = []
+    for _ in range(repeat):
+        for row in corpus:
+            question = row["question"]
+            t0 = time.perf_counter()
+            try:
+                planner.plan_with_ollama(question, fewshot_k=0)
+            except Exception as e:
+                print(f"planner failed on '{question}': {e}")
+            t1 = time.perf_counter()
+            generation.generate_plan(question, False)
+            t2 = time.perf_counter()
+            generation.generate_grounded_answer(question, CONTEXT, CITATIONS)
+            t3 = time.perf_counter()
+            stage_ms["planner"].append((t1 - t0) * 1000)
+            stage_ms["query_planner"].append((t2 - t1) * 1000)
+            stage_ms["answer"].append((t3 - t2) * 1000)
+            total_ms.append((t3 - t0) * 1000)
+    return {
+        "models": {task: config.MODEL_PROFILES[task][0] for task in STAGES},
+        "stages": {stage: latency_summary(stage_ms[stage]) for stage in STAGES},
+        "total": latency_summary(total_ms),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-task model assignment benchmark")
+    parser.add_argument("--assignments", nargs="+", choices=ASSIGNMENTS, default=list(ASSIGNMENTS))
+    parser.add_argument("--small", default="stub-small")
+    parser.add_argument("--large", default="stub-large")
+    parser.add_argument("--real", action="store_true", help="use the Ollama at OLLAMA_URL")
+    parser.add_argument("--small-cost", type=float, default=0.3, help="stub: small model cost relative to large")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="stub sleep multiplier")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", default="model_tiers.json")
+    args = parser.parse_args()
+
+    corpus = load_search_corpus()
+    stub = None
+    if not args.real:
+        stub = TierStub(time_scale=args.time_scale, model_costs={args.small: args.small_cost}).start()
+        planner.OLLAMA_URL = generation.OLLAMA_URL = stub.url
+
+    results = {
+        "meta": {
+            "backend": "ollama" if args.real else "stub",
+            "small": args.small,
+            "large": args.large,
+            "corpus_size": len(corpus),
+            "repeat": args.repeat,
+        },
+        "assignments": {},
+    }
+    try:
+        for name in args.assignments:
+            assign(name, args.small, args.large)
+            if args.real:
+                model_warmup.load_all()
+            summary = run_assignment(corpus, args.repeat)
+            results["assignments"][name] = summary
+            stages = " ".join(f"{s}={summary['stages'][s]['p50_ms']:8.1f}ms" for s in STAGES)
+            print(f"{name:>6}: total p50={summary['total']['p50_ms']:8.1f}ms p95={summary['total']['p95_ms']:8.1f}ms {stages}")
+    finally:
+        if stub is not None:
+            results["meta"]["stub"] = stub.stats
+            stub.stop()
+
+    if "large" in results["assignments"]:
+        base = results["assignments"]["large"]["total"]["p50_ms"]
+        results["total_p50_vs_large"] = {
+            name: round(s["total"]["p50_ms"] - base, 1) for name, s in results["assignments"].items()
+        }
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
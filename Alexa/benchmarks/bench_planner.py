@@ -0,0 +1,195 @@
+"""
+Planner latency and routing-accuracy benchmark.
+
+Replays the labelled corpus (planner_corpus.jsonl) through the planner entry
+points and writes a JSON report that can be diffed between commits:
+
+    regex    planner.plan_with_regex
+    router   intent_router.route (fast path only; misses count as fall-through)
+    ollama   planner.plan_with_ollama
+    plan     planner.plan (fast path + LLM, plan cache disabled unless --with-cache)
+
+By default the LLM modes run against the in-process stub server
+(benchmarks/stub_ollama.py) for deterministic timing. Pass --real to use the
+Ollama at OLLAMA_URL instead. Run from the Alexa folder:
+
+    python benchmarks/bench_planner.py --out planner_bench.json
+    python benchmarks/bench_planner.py --real --modes ollama plan
+"""
+import argparse
+import json
+import subprocess
+import time
+from collections import defaultdict
+
+from bench_common import load_corpus, plan_label, latency_summary, write_results, ALEXA_DIR
+from stub_ollama import StubOllama
+
+import planner
+import intent_router
+from context_manager import get_context
+
+MODES = ("regex", "router", "ollama", "plan")
+
+def stub_plan_for(row: dict) -> str:
+    """Plan JSON the stub returns for a corpus row (args are placeholders)."""
+    label = row["expected"]
+    if label == "final":
+        return json.dumps({"action": "final", "text": "Stub reply."})
+    if label == "call_tools":
+        return json.dumps({"action": "call_tools", "calls": [
+            {"name": "get_time_in", "args": {"place": "stub"}},
+            {"name": "get_weather", "args": {"place": "stub"}},
+        ]})
+    if label in ("get_time_in", "get_weather"):
+        args = {"place": "stub"}
+    elif label == "get_time":
+        args = {}
+    elif label == "brainstorm":
+        args = {"topic": row["utterance"]}
+    else:
+        args = {"query": row["utterance"]}
+    return json.dumps({"action": "call_tool", "name": label, "args": args})
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ALEXA_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+def _stub_evaluated(stub) -> int:
+    return stub.stats["prompt_tokens"] - stub.stats["cached_tokens"]
+
+def _run_one(mode: str, text: str, stub=None):
+    """Returns (label, tokens_in, tokens_out)."""
+    if mode == "regex":
+        return plan_label(planner.plan_with_regex(text)), 0, 0
+    if mode == "router":
+        routed = intent_router.route(text)
+        return (plan_label(routed["plan"]) if routed else "fallthrough"), 0, 0
+
+    before = planner.get_planner_metrics()["last"]
+    evaluated_before = _stub_evaluated(stub) if stub else 0
+    decision = planner.plan_with_ollama(text) if mode == "ollama" else planner.plan(text)
+    last = planner.get_planner_metrics()["last"]
+    if last is None or last is before:
+        # Answered without an LLM call (fast path / cache)
+        return plan_label(decision), 0, 0
+    if stub is not None:
+        # The stub knows prompt tokens even when early stop skips the done chunk
+        tokens_in = _stub_evaluated(stub) - evaluated_before
+    else:
+        tokens_in = last.get("prompt_eval_count") or 0
+    return plan_label(decision), tokens_in, last.get("eval_count") or 0
+
+def run_mode(mode: str, corpus: list, repeat: int = 1, stub=None) -> dict:
+    latencies, tokens_in, tokens_out = [], [], []
+    per_intent = defaultdict(lambda: {"n": 0, "correct": 0, "fallthrough": 0, "errors": 0})
+    errors = 0
+
+    for _ in range(repeat):
+        for row in corpus:
+            get_context().clear()
+            bucket = per_intent[row["intent"]]
+            bucket["n"] += 1
+            t0 = time.perf_counter()
+            try:
+                label, t_in, t_out = _run_one(mode, row["utterance"], stub)
+            except Exception as e:
+                errors += 1
+                bucket["errors"] += 1
+                print(f"  [{mode}] error on '{row['utterance']}': {e}")
+                continue
+            latencies.append((time.perf_counter() - t0) * 1000)
+            tokens_in.append(t_in)
+            tokens_out.append(t_out)
+            if label == "fallthrough":
+                bucket["fallthrough"] += 1
+            elif label == row["expected"]:
+                bucket["correct"] += 1
+
+    total = sum(b["n"] for b in per_intent.values())
+    correct = sum(b["correct"] for b in per_intent.values())
+    for b in per_intent.values():
+        b["accuracy"] = round(b["correct"] / b["n"], 3) if b["n"] else 0.0
+
+    summary = {
+        "latency": latency_summary(latencies),
+        "tokens": {
+            "in_total": sum(tokens_in),
+            "out_total": sum(tokens_out),
+            "in_mean": round(sum(tokens_in) / len(tokens_in), 1) if tokens_in else 0.0,
+            "out_mean": round(sum(tokens_out) / len(tokens_out), 1) if tokens_out else 0.0,
+        },
+        "accuracy": round(correct / total, 3) if total else 0.0,
+        "errors": errors,
+        "per_intent": dict(sorted(per_intent.items())),
+    }
+    if mode == "router":
+        routed = total - sum(b["fallthrough"] for b in per_intent.values())
+        summary["hit_rate"] = round(routed / total, 3) if total else 0.0
+        summary["precision"] = round(correct / routed, 3) if routed else 0.0
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Planner latency / routing benchmark")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--real", action="store_true", help="use the Ollama at OLLAMA_URL")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--with-cache", action="store_true", help="leave the plan cache on")
+    parser.add_argument("--early-stop", action=argparse.BooleanOptionalAction, default=None,
+                        help="close the stream at the end of the plan (default: PLANNER_EARLY_STOP); "
+                             "--no-early-stop reads it all so Ollama reports prompt_eval_count")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="stub sleep multiplier")
+    parser.add_argument("--out", default="planner_bench.json")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    planner.PLAN_CACHE_ENABLED = args.with_cache
+    if args.early_stop is not None:
+        planner.PLANNER_EARLY_STOP = args.early_stop
+
+    stub = None
+    if not args.real and any(m in ("ollama", "plan") for m in args.modes):
+        answers = {row["utterance"]: stub_plan_for(row) for row in corpus}
+        stub = StubOllama(answers=answers, time_scale=args.time_scale).start()
+        planner.OLLAMA_URL = stub.url
+
+    results = {
+        "meta": {
+            "revision": _git_revision(),
+            "backend": "ollama" if args.real else "stub",
+            "model": planner.PLANNER_MODEL,
+            "corpus_size": len(corpus),
+            "repeat": args.repeat,
+            "fewshot_k": planner.PLANNER_FEWSHOT_K,
+            "plan_cache": args.with_cache,
+            "early_stop": planner.PLANNER_EARLY_STOP,
+        },
+        "modes": {},
+    }
+
+    try:
+        if "ollama" in args.modes or "plan" in args.modes:
+            planner.warm_up()
+        for mode in args.modes:
+            intent_router.reset_stats()
+            summary = run_mode(mode, corpus, args.repeat, stub)
+            results["modes"][mode] = summary
+            lat = summary["latency"]
+            print(
+                f"{mode:>7}: p50={lat['p50_ms']:8.2f}ms p95={lat['p95_ms']:8.2f}ms "
+                f"p99={lat['p99_ms']:8.2f}ms tokens_in={summary['tokens']['in_mean']:7.1f} "
+                f"tokens_out={summary['tokens']['out_mean']:5.1f} accuracy={summary['accuracy']:.3f}"
+            )
+    finally:
+        if stub is not None:
+            results["meta"]["stub"] = stub.stats
+            stub.stop()
+
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
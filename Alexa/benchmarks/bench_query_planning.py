@@ -0,0 +1,166 @@
+"""
+Search query planning: deterministic expansion vs the LLM query planner.
+
+For every question in search_corpus.jsonl and every mode (fast / llm / auto)
+this records the query-planning latency and, unless --plan-only, the full
+web_search_answer latency per stage (from the tracing spans) plus a simple
+answer-quality signal: whether any expected keyword appears in the answer.
+
+    python benchmarks/bench_query_planning.py --plan-only --stub
+    python benchmarks/bench_query_planning.py --out query_planning.json
+
+--stub answers LLM calls from the in-process stub server; web search and
+page fetches still need network access for the full pipeline.
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from bench_common import BENCH_DIR, latency_summary, write_results
+from stub_ollama import StubOllama
+
+import tracing
+from web_retrieval import generation, pipeline, query_expansion
+
+MODES = ("fast", "llm", "auto")
+STAGES = ("retrieval.plan", "retrieval.search", "retrieval.rerank", "retrieval.fetch", "retrieval.generate")
+SEARCH_CORPUS_PATH = os.path.join(BENCH_DIR, "search_corpus.jsonl")
+
+class PlannerStub(StubOllama):
+    """Stub whose JSON-mode answers look like the query planner's output."""
+
+    def answer_for(self, user_text, json_mode):
+        if json_mode:
+            question = user_text.split('User Question: "', 1)[-1].split('"', 1)[0]
+            return json.dumps({"queries": [question, f"{question} overview", f"{question} official"]})
+        return super().answer_for(user_text, json_mode)
+
+def load_search_corpus(path: str = SEARCH_CORPUS_PATH) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _answer_hit(answer: str, expected: list) -> bool:
+    answer = (answer or "").lower()
+    return any(e.lower() in answer for e in expected)
+
+def _stage_times(trace: dict) -> dict:
+    out = {}
+    for span in trace.get("spans", []):
+        if span["name"] in STAGES:
+            out[span["name"]] = span["duration_ms"]
+    return out
+
+def run_mode(mode: str, corpus: list, plan_only: bool) -> dict:
+    plan_ms, total_ms, hits = [], [], 0
+    stage_ms = defaultdict(list)
+    by_kind = defaultdict(lambda: {"n": 0, "plan_ms": [], "llm_planner_calls": 0, "answer_hits": 0})
+    queries_per_question = []
+
+    original_mode = query_expansion.config.QUERY_EXPANSION_MODE
+    query_expansion.config.QUERY_EXPANSION_MODE = mode
+    try:
+        for row in corpus:
+            bucket = by_kind[row["kind"]]
+            bucket["n"] += 1
+
+            t0 = time.perf_counter()
+            planned = query_expansion.plan_queries(row["question"])
+            elapsed = (time.perf_counter() - t0) * 1000
+            plan_ms.append(elapsed)
+            bucket["plan_ms"].append(elapsed)
+            queries_per_question.append(len(planned["queries"]))
+            if planned["mode"] == "llm":
+                bucket["llm_planner_calls"] += 1
+            if plan_only:
+                continue
+
+            tracing.clear()
+            t0 = time.perf_counter()
+            result = pipeline.web_search_answer(row["question"])
+            total_ms.append((time.perf_counter() - t0) * 1000)
+            traces = tracing.get_traces(limit=1)
+            for name, ms in (_stage_times(traces[0]) if traces else {}).items():
+                stage_ms[name].append(ms)
+            if _answer_hit(result.get("answer"), row["expected"]):
+                hits += 1
+                bucket["answer_hits"] += 1
+    finally:
+        query_expansion.config.QUERY_EXPANSION_MODE = original_mode
+
+    summary = {
+        "plan_latency": latency_summary(plan_ms),
+        "mean_queries": round(sum(queries_per_question) / len(queries_per_question), 2) if queries_per_question else 0.0,
+        "by_kind": {
+            kind: {
+                "n": b["n"],
+                "plan_latency": latency_summary(b["plan_ms"]),
+                "llm_planner_calls": b["llm_planner_calls"],
+                "answer_hit_rate": None if plan_only else round(b["answer_hits"] / b["n"], 3),
+            }
+            for kind, b in sorted(by_kind.items())
+        },
+    }
+    if not plan_only:
+        summary["total_latency"] = latency_summary(total_ms)
+        summary["stages"] = {name: latency_summary(stage_ms[name]) for name in STAGES if stage_ms[name]}
+        summary["answer_hit_rate"] = round(hits / len(corpus), 3) if corpus else 0.0
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Query planning benchmark")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--plan-only", action="store_true", help="time query planning only (no search)")
+    parser.add_argument("--stub", action="store_true", help="answer LLM calls from the stub server")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="stub sleep multiplier")
+    parser.add_argument("--out", default="query_planning.json")
+    args = parser.parse_args()
+
+    corpus = load_search_corpus()
+    stub = None
+    if args.stub:
+        stub = PlannerStub(time_scale=args.time_scale).start()
+        generation.OLLAMA_URL = stub.url
+
+    results = {
+        "meta": {
+            "backend": "stub" if args.stub else "ollama",
+            "model": generation.OLLAMA_MODEL,
+            "corpus_size": len(corpus),
+            "plan_only": args.plan_only,
+        },
+        "modes": {},
+    }
+    try:
+        for mode in args.modes:
+            summary = run_mode(mode, corpus, args.plan_only)
+            results["modes"][mode] = summary
+            line = (
+                f"{mode:>5}: plan p50={summary['plan_latency']['p50_ms']:8.2f}ms "
+                f"p95={summary['plan_latency']['p95_ms']:8.2f}ms queries={summary['mean_queries']:.2f}"
+            )
+            if not args.plan_only:
+                line += (
+                    f" total p50={summary['total_latency']['p50_ms']:8.1f}ms "
+                    f"answer_hit={summary['answer_hit_rate']:.3f}"
+                )
+            print(line)
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if not args.plan_only and "llm" in results["modes"]:
+        base = results["modes"]["llm"]
+        results["deltas_vs_llm"] = {
+            mode: {
+                "total_p50_ms": round(s["total_latency"]["p50_ms"] - base["total_latency"]["p50_ms"], 1),
+                "answer_hit_rate": round(s["answer_hit_rate"] - base["answer_hit_rate"], 3),
+            }
+            for mode, s in results["modes"].items() if mode != "llm"
+        }
+
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
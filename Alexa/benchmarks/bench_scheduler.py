@@ -0,0 +1,124 @@
+"""
+LLM scheduler benchmark: planner latency while long generations are running.
+
+A stub Ollama that serves --parallel generations at once (first come first
+served, like OLLAMA_NUM_PARALLEL) gets a burst of long background brainstorms
+and grounded answers, then a short planner call every --planner-gap ms. Modes:
+
+    fifo            no scheduling (huge LLM_MAX_IN_FLIGHT): Ollama's queue decides
+    priority        LLM_MAX_IN_FLIGHT = --parallel: the planner jumps the queue,
+                    but waits for the generation that is running
+    priority+stop   as priority, and every planner call is a new command on the
+                    brainstorms' channel, so the running brainstorm is cancelled
+
+    python benchmarks/bench_scheduler.py --out scheduler.json
+"""
+import argparse
+import threading
+import time
+from unittest import mock
+
+from bench_common import latency_summary, write_results
+from stub_ollama import StubOllama
+
+import llm_scheduler
+import ollama_client
+
+MODES = ("fifo", "priority", "priority+stop")
+
+LONG = "Idea number one is a thing. " * 12       # ~80 tokens
+SHORT = '{"action": "final", "text": "ok"}'
+
+def _limits(mode: str, parallel: int) -> list:
+    max_in_flight = 1000 if mode == "fifo" else parallel
+    return [
+        mock.patch.object(llm_scheduler.config, "LLM_MAX_IN_FLIGHT", max_in_flight),
+        mock.patch.object(llm_scheduler.config, "LLM_RESERVED_INTERACTIVE", 0),
+        mock.patch.object(llm_scheduler.config, "LLM_MAX_BACKGROUND", max_in_flight),
+        mock.patch.object(ollama_client.config, "OLLAMA_COALESCE", False),
+    ]
+
+def run_mode(mode: str, args) -> dict:
+    answers = {f"brainstorm {i}": LONG for i in range(args.background)}
+    answers.update({f"answer {i}": LONG for i in range(args.answers)})
+    answers.update({f"plan {i}": SHORT for i in range(args.planners)})
+    stub = StubOllama(answers=answers, time_scale=args.time_scale, parallel=args.parallel).start()
+    latencies = {"planner": [], "answer": [], "background": []}
+    outcomes = {"cancelled": 0}
+    lock = threading.Lock()
+
+    def timed(kind: str, channel: str, fn):
+        started = time.perf_counter()
+        try:
+            if channel:
+                with llm_scheduler.turn(channel):
+                    fn()
+            else:
+                fn()
+        except llm_scheduler.Cancelled:
+            with lock:
+                outcomes["cancelled"] += 1
+            return
+        with lock:
+            latencies[kind].append((time.perf_counter() - started) * 1000)
+
+    stop = mode == "priority+stop"
+    threads = []
+
+    def spawn(kind, channel, fn):
+        t = threading.Thread(target=timed, args=(kind, channel, fn))
+        t.start()
+        threads.append(t)
+
+    patches = _limits(mode, args.parallel)
+    for p in patches:
+        p.start()
+    try:
+        for i in range(args.background):
+            spawn("background", "voice" if stop else None, lambda i=i: ollama_client.generate(
+                f"brainstorm {i}", task="creative", caller="brainstorm", base_url=stub.url))
+            time.sleep(0.005)
+        for i in range(args.answers):
+            spawn("answer", None, lambda i=i: ollama_client.stream_generate(
+                f"answer {i}", lambda t: None, task="answer", base_url=stub.url))
+            time.sleep(0.005)
+        for i in range(args.planners):
+            time.sleep(args.planner_gap / 1000)
+            spawn("planner", "voice" if stop else None, lambda i=i: ollama_client.chat(
+                [{"role": "user", "content": f"plan {i}"}], task="planner", base_url=stub.url))
+        for t in threads:
+            t.join()
+    finally:
+        for p in patches:
+            p.stop()
+        stub.stop()
+    result = {kind: latency_summary(values) for kind, values in latencies.items()}
+    result["cancelled"] = outcomes["cancelled"]
+    result["upstream_disconnects"] = stub.stats["disconnects"]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM scheduler benchmark")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--parallel", type=int, default=1, help="stub generations at once")
+    parser.add_argument("--background", type=int, default=3)
+    parser.add_argument("--answers", type=int, default=2)
+    parser.add_argument("--planners", type=int, default=5)
+    parser.add_argument("--planner-gap", type=float, default=600.0, help="ms between planner calls")
+    parser.add_argument("--time-scale", type=float, default=0.2, help="stub sleep multiplier")
+    parser.add_argument("--out", default="scheduler.json")
+    args = parser.parse_args()
+
+    results = {"meta": vars(args).copy(), "modes": {}}
+    results["meta"].pop("out")
+    for mode in args.modes:
+        summary = run_mode(mode, args)
+        results["modes"][mode] = summary
+        print(
+            f"{mode:>14}: planner p50={summary['planner']['p50_ms']:8.1f}ms p95={summary['planner']['p95_ms']:8.1f}ms "
+            f"answer p50={summary['answer']['p50_ms']:8.1f}ms cancelled={summary['cancelled']}"
+        )
+    write_results(results, args.out)
+
+if __name__ == "__main__":
+    main()
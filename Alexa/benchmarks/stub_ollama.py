@@ -0,0 +1,286 @@
+"""
+Deterministic stand-in for the Ollama HTTP API.
+
+Serves /api/chat, /api/generate, /api/tags and /api/ps on localhost with a
+simple cost model so benchmarks are repeatable without a GPU or a model:
+
+    sleep = (prompt tokens not covered by the cached prefix) * prompt_ms
+          + (generated tokens) * gen_ms          (all scaled by time_scale)
+
+Prompt tokens are approximated as len(text) / 4. Like Ollama, the stub keeps
+the previous request's messages per model and only "evaluates" the part of
+the new prompt that differs, so prefix reuse shows up in prompt_eval_count.
+With parallel=N it also runs at most N generations at once and queues the
+rest first come first served, like Ollama's OLLAMA_NUM_PARALLEL.
+
+Usage (standalone):
+    python benchmarks/stub_ollama.py --port 11435
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+def split_tokens(text: str, size: int = 4) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class _FifoSlots:
+    """At most n holders at once; waiters are let in in arrival order."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.cond = threading.Condition()
+        self.waiting = deque()
+        self.active = 0
+
+    def __enter__(self):
+        me = object()
+        with self.cond:
+            self.waiting.append(me)
+            self.cond.wait_for(lambda: self.waiting[0] is me and self.active < self.n)
+            self.waiting.popleft()
+            self.active += 1
+            self.cond.notify_all()
+
+    def __exit__(self, *exc):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+class StubOllama:
+    """
+    In-process stub server.
+
+    Args:
+        answers: Optional {user_text: response_text} used for the last user message
+        prompt_ms: Simulated prompt evaluation cost per uncached token
+        gen_ms: Simulated generation cost per output token
+        time_scale: Multiplier on all sleeps (0 = no sleeping at all)
+        trailing_tokens: Whitespace tokens streamed after the answer, like chatty
+                         JSON-mode models do before emitting EOS
+        model: Name reported by /api/tags and /api/ps
+        model_costs: Optional {model: multiplier} on prompt_ms and gen_ms, to stand
+                     in for smaller/faster and larger/slower models
+        parallel: Generations served at once (None = unlimited)
+    """
+
+    def __init__(self, answers=None, prompt_ms=2.0, gen_ms=30.0, time_scale=0.05,
+                 trailing_tokens=8, model="stub-model", port=0, model_costs=None, parallel=None):
+        self.answers = dict(answers or {})
+        self.prompt_ms = prompt_ms
+        self.gen_ms = gen_ms
+        self.time_scale = time_scale
+        self.trailing_tokens = trailing_tokens
+        self.model = model
+        self.model_costs = dict(model_costs or {})
+        self.slots = _FifoSlots(parallel) if parallel else nullcontext()
+        self._last_prompt = {}          # model -> list of message strings
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                      "eval_tokens": 0, "disconnects": 0}
+        self.loaded = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -----------------------------------------------------------------
+    #  Cost model
+    # -----------------------------------------------------------------
+    def cost(self, model: str) -> float:
+        return self.model_costs.get(model, 1.0)
+
+    def _sleep(self, ms: float):
+        if self.time_scale > 0 and ms > 0:
+            time.sleep(ms * self.time_scale / 1000.0)
+
+    def evaluate_prompt(self, model: str, parts: list) -> tuple:
+        """Returns (total_tokens, evaluated_tokens) honouring the cached prefix."""
+        with self._lock:
+            previous = self._last_prompt.get(model, [])
+            cached = 0
+            for old, new in zip(previous, parts):
+                if old != new:
+                    break
+                cached += approx_tokens(new)
+            total = sum(approx_tokens(p) for p in parts)
+            self._last_prompt[model] = list(parts)
+            self.loaded.add(model)
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += total
+            self.stats["cached_tokens"] += cached
+        evaluated = total - cached
+        self._sleep(evaluated * self.prompt_ms * self.cost(model))
+        return total, evaluated
+
+    def answer_for(self, user_text: str, json_mode: bool) -> str:
+        if user_text in self.answers:
+            return self.answers[user_text]
+        if json_mode:
+            return json.dumps({"action": "final", "text": "Stub reply."})
+        return "This is a stub answer [1]. It has two sentences [2]."
+
+def _make_handler(stub: StubOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, obj, status=200):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, obj):
+            line = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": stub.model, "model": stub.model}]})
+            elif self.path == "/api/ps":
+                self._send_json({"models": [{"name": m, "model": m} for m in sorted(stub.loaded)]})
+            else:
+                self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            with stub.slots:
+                self._handle_post()
+
+        def _handle_post(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json({"error": "bad json"}, status=400)
+                return
+
+            model = req.get("model", stub.model)
+            json_mode = req.get("format") == "json"
+            if self.path == "/api/chat":
+                messages = req.get("messages", [])
+                parts = [f"{m.get('role')}:{m.get('content', '')}" for m in messages]
+                user_text = next(
+                    (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+                )
+                chat = True
+            elif self.path == "/api/generate":
+                prompt = req.get("prompt", "")
+                parts = [f"system:{req.get('system', '')}", f"user:{prompt}"]
+                user_text = prompt
+                chat = False
+            else:
+                self._send_json({"error": "not found"}, status=404)
+                return
+
+            start = time.perf_counter()
+            total, evaluated = stub.evaluate_prompt(model, parts)
+            prompt_ns = int((time.perf_counter() - start) * 1e9)
+
+            # An empty prompt is a load/keep-alive request: nothing to generate
+            answer = stub.answer_for(user_text, json_mode) if user_text else ""
+            num_predict = (req.get("options") or {}).get("num_predict")
+            tokens = split_tokens(answer)
+            if num_predict is not None and num_predict >= 0:
+                tokens = tokens[:num_predict]
+
+            def piece(text, done=False):
+                if chat:
+                    return {"model": model, "message": {"role": "assistant", "content": text}, "done": done}
+                return {"model": model, "response": text, "done": done}
+
+            def final(eval_tokens, gen_ns):
+                out = piece("", done=True)
+                out.update({
+                    "prompt_eval_count": evaluated,
+                    "prompt_eval_duration": prompt_ns,
+                    "eval_count": eval_tokens,
+                    "eval_duration": gen_ns,
+                    "load_duration": 0,
+                    "total_duration": prompt_ns + gen_ns,
+                })
+                return out
+
+            if req.get("stream", True) is False:
+                gen_start = time.perf_counter()
+                stub._sleep(len(tokens) * stub.gen_ms * stub.cost(model))
+                with stub._lock:
+                    stub.stats["eval_tokens"] += len(tokens)
+                out = final(len(tokens), int((time.perf_counter() - gen_start) * 1e9))
+                if chat:
+                    out["message"]["content"] = "".join(tokens)
+                else:
+                    out["response"] = "".join(tokens)
+                self._send_json(out)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            stream = tokens + (["\n"] * stub.trailing_tokens if json_mode else [])
+            gen_start = time.perf_counter()
+            sent = 0
+            try:
+                for tok in stream:
+                    stub._sleep(stub.gen_ms * stub.cost(model))
+                    self._write_chunk(piece(tok))
+                    sent += 1
+                self._write_chunk(final(sent, int((time.perf_counter() - gen_start) * 1e9)))
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # Client closed the stream early (e.g. planner early stop)
+                with stub._lock:
+                    stub.stats["disconnects"] += 1
+            finally:
+                with stub._lock:
+                    stub.stats["eval_tokens"] += sent
+            self.close_connection = True
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stub Ollama server")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    args = parser.parse_args()
+    stub = StubOllama(port=args.port, time_scale=args.time_scale)
+    print(f"Stub Ollama listening on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
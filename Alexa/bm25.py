@@ -0,0 +1,77 @@
+# bm25.py
+"""
+Dependency-free lexical scoring (Okapi BM25).
+
+Small enough to index a few hundred short documents in well under a
+millisecond; used wherever we want relevance ranking without loading a model.
+"""
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by do does for from has have how i in is it its me my
+of on or our so that the their there this to was what when where which who why
+will with you your can could should would please tell
+""".split())
+
+def tokenize(text: str, stopwords=STOPWORDS) -> list:
+    """Lowercase alphanumeric tokens with stopwords removed."""
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in stopwords]
+
+class BM25Index:
+    """
+    BM25 over a fixed list of documents.
+
+    Args:
+        documents: List of strings (or pre-tokenized lists of tokens)
+        k1: Term-frequency saturation
+        b: Length normalisation
+    """
+
+    def __init__(self, documents: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_tokens = [d if isinstance(d, list) else tokenize(d) for d in documents]
+        self.doc_freqs = [Counter(toks) for toks in self.doc_tokens]
+        self.doc_lens = [len(toks) for toks in self.doc_tokens]
+        n = len(self.doc_tokens)
+        self.avg_len = (sum(self.doc_lens) / n) if n else 0.0
+
+        df = Counter()
+        for freqs in self.doc_freqs:
+            df.update(freqs.keys())
+        # BM25+ style idf floor keeps very common terms from scoring negative
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def __len__(self):
+        return len(self.doc_tokens)
+
+    def scores(self, query) -> list:
+        """Score every document against the query (string or token list)."""
+        q_tokens = query if isinstance(query, list) else tokenize(query)
+        q_terms = [t for t in set(q_tokens) if t in self.idf]
+        out = [0.0] * len(self.doc_tokens)
+        if not q_terms or not self.avg_len:
+            return out
+
+        k1, b, avg = self.k1, self.b, self.avg_len
+        for i, freqs in enumerate(self.doc_freqs):
+            norm = k1 * (1 - b + b * self.doc_lens[i] / avg)
+            s = 0.0
+            for t in q_terms:
+                tf = freqs.get(t)
+                if tf:
+                    s += self.idf[t] * tf * (k1 + 1) / (tf + norm)
+            out[i] = s
+        return out
+
+    def top_k(self, query, k: int) -> list:
+        """Indices of the k best documents, ties broken by original order."""
+        scored = self.scores(query)
+        order = sorted(range(len(scored)), key=lambda i: (-scored[i], i))
+        return order[:k]
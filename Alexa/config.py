@@ -7,6 +7,137 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:latest")
 USE_OLLAMA = os.getenv("USE_OLLAMA", "1") == "1"     # set to 0 to force regex fallback
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
 
+# Shared Ollama client (ollama_client.py) used by every LLM call
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))       # same for all callers: a change forces a model reload
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")       # "" = Ollama's default
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "60"))       # seconds
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))          # on connection errors / 502-504
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))  # seconds, doubled per retry
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_COALESCE = os.getenv("OLLAMA_COALESCE", "1") == "1"      # identical concurrent requests share one generation
+
+# LLM request scheduling (llm_scheduler.py): priority classes, in-flight limits, cancellation
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "3"))                # upstream requests at once
+LLM_RESERVED_INTERACTIVE = int(os.getenv("LLM_RESERVED_INTERACTIVE", "1"))  # slots only the planner classes may use
+LLM_MAX_BACKGROUND = int(os.getenv("LLM_MAX_BACKGROUND", "1"))              # brainstorms at once
+LLM_MAX_WARMUP = int(os.getenv("LLM_MAX_WARMUP", "4"))                      # model loads / prefix warm-ups at once,
+                                                                            # outside LLM_MAX_IN_FLIGHT (they generate ~nothing)
+LLM_PRIORITIES = {  # task or caller -> interactive | answer | background | warmup; anything else is "answer"
+    "planner": "interactive",
+    "query_planner": "interactive",
+    "answer": "answer",
+    "chat": "answer",
+    "creative": "background",
+    "brainstorm": "background",
+    "warmup": "warmup",
+}
+
+# Model warm-up / keep-alive (model_warmup.py): preload at startup, re-ping when idle
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") == "1"
+OLLAMA_WARMUP_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARMUP_MODELS", "").split(",") if m.strip()]  # default: every MODEL_PROFILES model
+OLLAMA_KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "600"))  # ping this long after the last answer; keep < OLLAMA_KEEP_ALIVE
+OLLAMA_WARMUP_TIMEOUT = float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "180"))          # a cold load can take a while
+
+# Planner session: keep the model resident and the prompt prefix (SYSTEM_RULES + FEW_SHOTS)
+# byte-identical between calls so Ollama can reuse its cached prefix evaluation.
+PLANNER_SESSION = os.getenv("PLANNER_SESSION", "1") == "1"
+PLANNER_KEEP_ALIVE = os.getenv("PLANNER_KEEP_ALIVE", OLLAMA_KEEP_ALIVE)
+PLANNER_NUM_CTX = int(os.getenv("PLANNER_NUM_CTX", str(OLLAMA_NUM_CTX)))  # changing num_ctx forces a model reload
+PLANNER_WARMUP = os.getenv("PLANNER_WARMUP", "1") == "1"     # warm the prefix at startup
+# Few-shot selection: send only the k most similar FEW_SHOTS pairs (0 = send all of them,
+# which keeps them inside the cached prefix). Off by default: a per-query selection changes
+# the prefix on every call, so Ollama re-evaluates it (on the bench_planner stub k=8 evaluated
+# ~50 prompt tokens per call against ~8 at k=0). Optional sentence-transformers model for ranking.
+PLANNER_FEWSHOT_K = int(os.getenv("PLANNER_FEWSHOT_K", "0"))
+PLANNER_FEWSHOT_EMBED_MODEL = os.getenv("PLANNER_FEWSHOT_EMBED_MODEL", "")  # "" = BM25
+# Close the planner stream as soon as the JSON plan object is complete. A closed stream
+# never gets Ollama's done chunk, so those plans record eval_count and client-side
+# first_token_ms / stream_ms but no prompt_eval_count; set 0 to measure the prefix cache.
+PLANNER_EARLY_STOP = os.getenv("PLANNER_EARLY_STOP", "1") == "1"
+
+# Per-task models: short structured tasks (plans, search queries) can run on a smaller,
+# faster model than the answers. Unset = OLLAMA_MODEL.
+PLANNER_MODEL = os.getenv("PLANNER_MODEL", "") or OLLAMA_MODEL
+QUERY_PLANNER_MODEL = os.getenv("QUERY_PLANNER_MODEL", "") or PLANNER_MODEL
+ANSWER_MODEL = os.getenv("ANSWER_MODEL", "") or OLLAMA_MODEL
+QUERY_PLANNER_NUM_CTX = int(os.getenv("QUERY_PLANNER_NUM_CTX", "2048"))
+ANSWER_NUM_CTX = int(os.getenv("ANSWER_NUM_CTX", str(OLLAMA_NUM_CTX)))
+# task -> (model, num_ctx, temperature). Tasks sharing a model all run with the largest
+# num_ctx among them (ollama_client.context_size) so they never force a reload.
+MODEL_PROFILES = {
+    "planner": (PLANNER_MODEL, PLANNER_NUM_CTX, LLM_TEMPERATURE),
+    "query_planner": (QUERY_PLANNER_MODEL, QUERY_PLANNER_NUM_CTX, 0.2),
+    "answer": (ANSWER_MODEL, ANSWER_NUM_CTX, 0.2),
+    "chat": (ANSWER_MODEL, ANSWER_NUM_CTX, 0.7),
+    "creative": (ANSWER_MODEL, ANSWER_NUM_CTX, 0.7),
+}
+
+# Fast-path intent router: rule-based plans for common intents, skipping the planner LLM
+USE_FAST_ROUTER = os.getenv("USE_FAST_ROUTER", "1") == "1"
+FAST_ROUTER_MIN_CONFIDENCE = float(os.getenv("FAST_ROUTER_MIN_CONFIDENCE", "0.8"))
+
+# Plan cache: memoizes LLM plans per normalized utterance (+ context fingerprint for follow-ups)
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "1") == "1"
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "512"))
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", "21600"))            # seconds (6 hours)
+PLAN_CACHE_PERSIST = os.getenv("PLAN_CACHE_PERSIST", "1") == "1"      # needs diskcache
+
+# Speculative prefetch: guess the tool from the utterance and start it while the planner runs
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "1") == "1"
+SPECULATIVE_MAX_WORKERS = int(os.getenv("SPECULATIVE_MAX_WORKERS", "4"))
+SPECULATIVE_ADOPT_TIMEOUT = float(os.getenv("SPECULATIVE_ADOPT_TIMEOUT", "10"))  # seconds
+
+# Multi-tool plans (call_tools): independent calls run concurrently, merged in plan order
+MULTI_TOOL_MAX_WORKERS = int(os.getenv("MULTI_TOOL_MAX_WORKERS", "4"))
+TOOL_TIMEOUT_FAST = float(os.getenv("TOOL_TIMEOUT_FAST", "10"))    # seconds: time / weather lookups
+TOOL_TIMEOUT_SLOW = float(os.getenv("TOOL_TIMEOUT_SLOW", "60"))    # seconds: web / arxiv / LLM tools
+
+# Tracing: per-stage spans kept in a ring buffer, served at /api/systems/traces
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1") == "1"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))       # finished traces kept
+
+# Web search fan-out: planned queries run concurrently, merged in plan order
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "4"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "8"))            # seconds for the whole search stage
+
+# Search query planning: "auto" expands simple questions deterministically and only calls
+# the LLM planner for complex / multi-part ones; "fast" or "llm" force one path
+QUERY_EXPANSION_MODE = os.getenv("QUERY_EXPANSION_MODE", "auto")
+QUERY_EXPANSION_MAX_WORDS = int(os.getenv("QUERY_EXPANSION_MAX_WORDS", "12"))
+
+# Page fetching: pooled connections, per-host caps, stage deadline, separate extraction threads
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "2"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "6"))              # seconds for the whole fetch stage
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# --- Passage selection (which page chunks go into the answer prompt) ---
+PASSAGE_TOKEN_BUDGET = int(os.getenv("PASSAGE_TOKEN_BUDGET", "1800"))      # approx tokens of source text per prompt
+PASSAGE_CHUNK_TOKENS = int(os.getenv("PASSAGE_CHUNK_TOKENS", "200"))     # chunks end on paragraph/sentence boundaries
+PASSAGE_MAX_PER_SOURCE = int(os.getenv("PASSAGE_MAX_PER_SOURCE", "3"))
+PASSAGE_CROSS_ENCODER = os.getenv("PASSAGE_CROSS_ENCODER", "1") == "1"     # rescore the BM25 shortlist when a model is loaded
+PASSAGE_RERANK_TOP = int(os.getenv("PASSAGE_RERANK_TOP", "12"))
+
+# --- Cross-encoder reranking ---
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "0"))                     # torch CPU threads; 0 leaves the default
+RERANK_BUDGET = float(os.getenv("RERANK_BUDGET", "0.5"))                   # seconds before falling back to BM25
+RERANK_PREFILTER = int(os.getenv("RERANK_PREFILTER", "12"))                # BM25 shortlist sent to the model; 0 = all
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))            # cached (query, text) scores
+RERANK_WARMUP = os.getenv("RERANK_WARMUP", "1") == "1"                     # load the model at startup
+
+# --- Search result cache (seconds, by query class) ---
+SEARCH_TTL_NEWS = int(os.getenv("SEARCH_TTL_NEWS", "900"))                 # "latest", "today", current year...
+SEARCH_TTL_DEFAULT = int(os.getenv("SEARCH_TTL_DEFAULT", "3600"))
+SEARCH_TTL_EVERGREEN = int(os.getenv("SEARCH_TTL_EVERGREEN", "86400"))      # "who invented", "how does ... work"
+SEARCH_NEGATIVE_TTL = int(os.getenv("SEARCH_NEGATIVE_TTL", "120"))         # empty or failed queries
+
+# --- Answer cache (whole web_search_answer results, seconds) ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_TTL = int(os.getenv("ANSWER_TTL", "3600"))                          # keyed on the sources' content
+ANSWER_TTL_FRESH = int(os.getenv("ANSWER_TTL_FRESH", "300"))               # "latest", "today"... questions
+ANSWER_QUESTION_TTL = int(os.getenv("ANSWER_QUESTION_TTL", "120"))         # question-only entry: repeats and double submits
+
 # --- Timezone (your local default) ---
 TIMEZONE = os.getenv("TIMEZONE", "Europe/London")  # Change to your timezone
 
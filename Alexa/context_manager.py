@@ -1,6 +1,8 @@
 # context_manager.py
 from collections import deque
 from typing import List, Dict
+import hashlib
+import json
 
 class ConversationContext:
     """Manages conversation history for context-aware responses."""
@@ -41,6 +43,22 @@ class ConversationContext:
             messages.append({"role": "assistant", "content": turn["assistant"]})
         return messages
     
+    def fingerprint(self, turns: int = 2) -> str:
+        """
+        Stable hash of the most recent turns.
+        
+        Args:
+            turns: How many of the latest turns to include
+            
+        Returns:
+            Hex digest, or "" when there is no history
+        """
+        recent = list(self.history)[-turns:] if turns > 0 else []
+        if not recent:
+            return ""
+        blob = json.dumps(recent, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+    
     def clear(self):
         """Clear all conversation history."""
         self.history.clear()
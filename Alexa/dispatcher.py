@@ -1,16 +1,19 @@
 # dispatcher.py
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from typing import Dict, Any, List
 from planner import plan
-from tools_time import get_time, get_time_in
-from tool_weather import get_weather
 from tool_web import search_web
-from tool_creative import brainstorm_ideas
-from tool_arxiv import search_arxiv
 from tool_image import image_search, should_fetch_images
 from llm_client import generate_response
 from context_manager import get_context
 import config
+import llm_scheduler
+import speculative
+import tool_registry
+import tracing
 import database as db
 import json
 
@@ -18,26 +21,124 @@ import json
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _fmt_time_result(res: dict) -> str:
-    if res.get("place"):
-        return f"In {res['place']}, the time is {res['human']}."
-    return f"The time is {res['human']}."
+def _call_with_speculation(speculation, name: str, args: dict, fn):
+    """Use the speculative result for this call if there is one, else run fn()."""
+    if speculation is not None:
+        adopted, result = speculation.adopt(name, args)
+        if adopted:
+            logger.info(f"Adopted speculative result for {name}")
+            tracing.annotate(speculative=True)
+            return result
+    return fn()
 
-def _fmt_weather_result(res: dict) -> str:
-    temp = res.get("temperature_c")
-    desc = res.get("weather_desc")
-    place = res.get("place")
-    wind = res.get("wind_speed_kmh")
-    if temp is not None and wind is not None:
-        return f"Weather in {place}: {desc}, {temp:.0f}°C, wind {wind:.0f} km/h."
-    if temp is not None:
-        return f"Weather in {place}: {desc}, {temp:.0f}°C."
-    return f"Weather in {place}: {desc}."
+# Shared pool for call_tools plans; bounded so a long plan can't flood the APIs
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=config.MULTI_TOOL_MAX_WORKERS, thread_name_prefix="tool")
 
-def handle_user_text(user_text: str) -> Dict[str, Any]:
+def _emit(on_event, kind: str, payload: dict):
+    if on_event is None:
+        return
+    try:
+        on_event(kind, payload)
+    except Exception as e:
+        logger.warning(f"Stream listener failed on '{kind}': {e}")
+
+def execute_tool(spec, args: dict, speculation=None, on_event=None, deadline=None):
+    """Run a validated call through its spec and return the formatted result."""
+    with tracing.span(f"tool.{spec.name}", args=dict(args)):
+        raw = _call_with_speculation(speculation, spec.name, args,
+                                     lambda: spec.call(args, on_event=on_event, deadline=deadline))
+        return spec.format(raw)
+
+def _run_multi_call(speculation, name: str, args: dict, deadline=None):
+    """
+    Execute one call of a call_tools plan. Returns the result for
+    process_tool_result, or None when the call is skipped or fails.
+    """
+    spec = tool_registry.get_tool(name)
+    if spec is None:
+        logger.warning(f"Multi-tool plan names unknown tool: {name}")
+        return None
+    cleaned = spec.validate(args)
+    if cleaned is None:
+        return None
+    try:
+        return execute_tool(spec, cleaned, speculation, deadline=deadline)
+    except Exception as e:
+        logger.error(f"Multi-tool execution error for {name}: {e}")
+        return None
+
+class _PendingCall:
+    """One submitted call of a call_tools plan; `started` is set when a worker picks it up."""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self.started = threading.Event()
+        self.started_at = None
+        self.future = None
+
+    def run(self, speculation, args: dict):
+        self.started_at = time.monotonic()
+        self.started.set()
+        return _run_multi_call(speculation, self.name, args, deadline=self.started_at + self.timeout)
+
+def _call_timeout(name: str) -> float:
+    spec = tool_registry.get_tool(name)
+    return spec.timeout if spec else config.TOOL_TIMEOUT_FAST
+
+def run_tool_calls(calls: list, speculation=None) -> list:
+    """
+    Run the calls of a call_tools plan concurrently.
+
+    Returns [(name, result)] in plan order. Every call gets its own deadline,
+    the spec's timeout counted from when it starts running (a call still
+    queued for a worker after that long is cancelled). A call that misses its
+    deadline or fails is reported with result None so the rest still gets
+    answered. A running call cannot be stopped: it is left to finish in the
+    background and counted in tool_registry's "abandoned" stats.
+    """
+    calls = [c for c in calls if isinstance(c, dict)]
+    if len(calls) <= 1:
+        return [(c.get("name"), _run_multi_call(speculation, c.get("name"), c.get("args", {}))) for c in calls]
+
+    submitted = time.monotonic()
+    pending = []
+    for c in calls:
+        call = _PendingCall(c.get("name"), _call_timeout(c.get("name")))
+        call.future = _TOOL_EXECUTOR.submit(llm_scheduler.bind(tracing.wrap(call.run)), speculation, c.get("args", {}))
+        pending.append(call)
+
+    results = []
+    for call in pending:
+        if not call.started.wait(max(0.0, submitted + call.timeout - time.monotonic())):
+            if call.future.cancel():
+                tool_registry.record_timeout(call.name)
+                logger.warning(f"Tool {call.name} waited {call.timeout:.0f}s for a worker; answering without it")
+                results.append((call.name, None))
+                continue
+            call.started.wait(1.0)  # a worker picked it up just now
+        remaining = (call.started_at or time.monotonic()) + call.timeout - time.monotonic()
+        try:
+            results.append((call.name, call.future.result(timeout=max(0.0, remaining))))
+        except FutureTimeout:
+            tool_registry.record_timeout(call.name, running=True)
+            call.future.add_done_callback(lambda f, name=call.name: tool_registry.record_abandoned_done(name))
+            logger.warning(f"Tool {call.name} timed out after {call.timeout:.0f}s; answering without it "
+                           f"(it keeps its worker until it returns)")
+            results.append((call.name, None))
+    logger.info(f"Ran {len(calls)} tool calls in {(time.monotonic() - submitted) * 1000:.0f}ms")
+    return results
+
+@tracing.traced("turn")
+def handle_user_text(user_text: str, on_event=None) -> Dict[str, Any]:
     """
     Main dispatcher: routes user input through planner and tools.
     
+    on_event(kind, payload), when given, receives partial output while the
+    turn is still running: "token" / "citations" / "reset" from a streamed web
+    answer and "images" as soon as images are found. The return value is the
+    same complete response either way.
+    
     CRITICAL: This function ALWAYS returns a structured response with:
     {
         "text": str,      # ALWAYS present, never empty
@@ -55,114 +156,66 @@ def handle_user_text(user_text: str) -> Dict[str, Any]:
         "sources": []
     }
     
-    # Get planner decision
-    decision = plan(user_text)
-    action = decision.get("action")
+    # Start likely tool work while the planner is still thinking
+    speculation = None
+    if config.SPECULATIVE_PREFETCH:
+        speculation = speculative.start(user_text)
     
-    logger.info(f"Planner decision: action={action}")
+    try:
+        # Get planner decision
+        decision = plan(user_text)
+        action = decision.get("action")
     
-    # Helper to process tool results
-    def process_tool_result(name: str, result: Any):
-        """Process tool result and merge into final_response"""
-        if name == "search_web" and isinstance(result, dict):
-            # Web search returns structured dict: {answer, sources, debug}
-            answer_text = result.get("answer", "")
-            if answer_text:
-                if final_response["text"]:
-                    final_response["text"] += "\n\n" + answer_text
-                else:
-                    final_response["text"] = answer_text
+        logger.info(f"Planner decision: action={action}")
+    
+        # Helper to process tool results
+        def process_tool_result(name: str, result: Any):
+            """Process tool result and merge into final_response"""
+            if name == "search_web" and isinstance(result, dict):
+                # Web search returns structured dict: {answer, sources, debug}
+                answer_text = result.get("answer", "")
+                if answer_text:
+                    if final_response["text"]:
+                        final_response["text"] += "\n\n" + answer_text
+                    else:
+                        final_response["text"] = answer_text
             
-            # Merge sources
-            sources = result.get("sources", [])
-            if sources:
-                final_response["sources"].extend(sources)
-                logger.info(f"Added {len(sources)} sources from web search")
+                # Merge sources
+                sources = result.get("sources", [])
+                if sources:
+                    final_response["sources"].extend(sources)
+                    logger.info(f"Added {len(sources)} sources from web search")
                 
-        elif name == "image_search":
-            # Image search returns list of images
-            if isinstance(result, list):
-                final_response["images"].extend(result)
-                logger.info(f"Added {len(result)} images")
-            # Don't set default text here - let LLM handle it
+            elif name == "image_search":
+                # Image search returns list of images
+                if isinstance(result, list):
+                    final_response["images"].extend(result)
+                    logger.info(f"Added {len(result)} images")
+                    if result:
+                        _emit(on_event, "images", {"images": result})
+                # Don't set default text here - let LLM handle it
                 
-        else:
-            # Other tools return string
-            text_res = str(result)
-            if final_response["text"]:
-                final_response["text"] += "\n" + text_res
             else:
-                final_response["text"] = text_res
+                # Other tools return string
+                text_res = str(result)
+                if final_response["text"]:
+                    final_response["text"] += "\n" + text_res
+                else:
+                    final_response["text"] = text_res
 
-    # Execute Action
-    if action == "final":
-        # Direct LLM response
-        final_response["text"] = decision.get("text", "Okay.")
+        # Execute Action
+        if action == "final":
+            # Direct LLM response
+            final_response["text"] = decision.get("text", "Okay.")
         
-    elif action == "call_tool":
-        name = decision.get("name")
-        args = decision.get("args", {})
+        elif action == "call_tool":
+            name = decision.get("name")
+            args = decision.get("args", {})
         
-        logger.info(f"Calling tool: {name} with args: {args}")
+            logger.info(f"Calling tool: {name} with args: {args}")
         
-        try:
-            if name == "get_time":
-                process_tool_result(name, _fmt_time_result(get_time()))
-            elif name == "get_time_in":
-                place = args.get("place", "").strip()
-                if not place:
-                    process_tool_result(name, "Which city or country?")
-                else:
-                    process_tool_result(name, _fmt_time_result(get_time_in(place)))
-            elif name == "get_weather":
-                place = args.get("place", "").strip()
-                if not place:
-                    process_tool_result(name, "Which city or country?")
-                else:
-                    process_tool_result(name, _fmt_weather_result(get_weather(place)))
-            elif name == "search_web":
-                query = args.get("query", "").strip()
-                if not query:
-                    process_tool_result(name, "What should I search for?")
-                else:
-                    # Web search with fallback to LLM
-                    try:
-                        web_result = search_web(query)
-                        process_tool_result(name, web_result)
-                    except Exception as e:
-                        logger.error(f"Web search failed: {e}")
-                        # Fallback: generate LLM answer
-                        llm_answer = generate_response(user_text, get_context())
-                        final_response["text"] = llm_answer
-                        
-            elif name == "brainstorm":
-                topic = args.get("topic", "").strip()
-                if not topic:
-                    process_tool_result(name, "I need a topic to brainstorm about.")
-                else:
-                    process_tool_result(name, brainstorm_ideas(topic))
-            elif name == "search_arxiv":
-                query = args.get("query", "").strip()
-                if not query:
-                    process_tool_result(name, "What papers should I search for?")
-                else:
-                    process_tool_result(name, search_arxiv(query))
-            elif name == "image_search":
-                query = args.get("query", "").strip()
-                if not query:
-                    final_response["text"] = "What images should I search for?"
-                else:
-                    try:
-                        imgs = image_search(query)
-                        process_tool_result(name, imgs)
-                        # If we got images but no text, generate a response
-                        if not final_response["text"] and imgs:
-                            final_response["text"] = f"I found {len(imgs)} image(s) for '{query}'."
-                    except Exception as e:
-                        logger.error(f"Image search failed: {e}")
-                        final_response["text"] = f"I couldn't fetch images, but I can tell you about {query}."
-                        
-            else:
+            spec = tool_registry.get_tool(name)
+            if spec is None:
                 # Unknown tool - try fallback
                 fallback_query = args.get("query") or args.get("topic") or args.get("place")
                 if fallback_query:
@@ -178,56 +231,42 @@ def handle_user_text(user_text: str) -> Dict[str, Any]:
                     final_response["text"] = f"I don't have a tool called '{name}', but let me try to help anyway."
                     llm_answer = generate_response(user_text, get_context())
                     final_response["text"] += "\n\n" + llm_answer
-                    
-        except Exception as e:
-            logger.error(f"Tool execution error for {name}: {e}")
-            # Always fallback to LLM
-            final_response["text"] = generate_response(user_text, get_context())
+            else:
+                cleaned = spec.validate(args)
+                if cleaned is None:
+                    final_response["text"] = spec.missing_prompt or "Could you give me a bit more detail?"
+                else:
+                    try:
+                        process_tool_result(name, execute_tool(spec, cleaned, speculation, on_event))
+                        # If we got images but no text, say so
+                        if not final_response["text"] and final_response["images"]:
+                            final_response["text"] = f"I found {len(final_response['images'])} image(s) for '{cleaned.get('query', '')}'."
+                    except Exception as e:
+                        logger.error(f"Tool execution error for {name}: {e}")
+                        if spec.error_reply:
+                            final_response["text"] = spec.error_reply.format(**cleaned)
+                        else:
+                            # Fallback: generate LLM answer
+                            final_response["text"] = generate_response(user_text, get_context())
 
-    elif action == "call_tools":
-        # Multiple tools
-        for call in decision.get("calls", []):
-            name = call.get("name")
-            args = call.get("args", {})
-            try:
-                if name == "get_time":
-                    process_tool_result(name, _fmt_time_result(get_time()))
-                elif name == "get_time_in":
-                    place = args.get("place", "").strip()
-                    if place: process_tool_result(name, _fmt_time_result(get_time_in(place)))
-                elif name == "get_weather":
-                    place = args.get("place", "").strip()
-                    if place: process_tool_result(name, _fmt_weather_result(get_weather(place)))
-                elif name == "search_web":
-                    query = args.get("query", "").strip()
-                    if query:
-                        try:
-                            process_tool_result(name, search_web(query))
-                        except Exception as e:
-                            logger.error(f"Web search in multi-tool failed: {e}")
-                elif name == "brainstorm":
-                    topic = args.get("topic", "").strip()
-                    if topic: process_tool_result(name, brainstorm_ideas(topic))
-                elif name == "search_arxiv":
-                    query = args.get("query", "").strip()
-                    if query: process_tool_result(name, search_arxiv(query))
-                elif name == "image_search":
-                    query = args.get("query", "").strip()
-                    if query:
-                        try:
-                            process_tool_result(name, image_search(query))
-                        except Exception as e:
-                            logger.error(f"Image search in multi-tool failed: {e}")
-            except Exception as e:
-                logger.error(f"Multi-tool execution error for {name}: {e}")
-                continue
+        elif action == "call_tools":
+            # Multiple tools: run concurrently, merge in plan order
+            for name, result in run_tool_calls(decision.get("calls", []), speculation):
+                if result is not None:
+                    process_tool_result(name, result)
                 
-        if not final_response["text"] and not final_response["images"]:
-            final_response["text"] = "Done."
+            if not final_response["text"] and not final_response["images"]:
+                final_response["text"] = "Done."
     
-    else:
-        # Unknown action - use LLM
-        final_response["text"] = generate_response(user_text, get_context())
+        else:
+            # Unknown action - use LLM
+            final_response["text"] = generate_response(user_text, get_context())
+
+    finally:
+        # Discard speculative work the plan did not use, also when the turn is
+        # cancelled (llm_scheduler.Cancelled) or a tool raises
+        if speculation is not None:
+            speculation.finish()
     
     # Heuristic Image Fetching (if user intent suggests images but none fetched)
     if not final_response["images"] and should_fetch_images(user_text):
@@ -237,6 +276,7 @@ def handle_user_text(user_text: str) -> Dict[str, Any]:
             if imgs:
                 final_response["images"].extend(imgs)
                 logger.info(f"Heuristic fetch added {len(imgs)} images")
+                _emit(on_event, "images", {"images": imgs})
         except Exception as e:
             logger.error(f"Heuristic image fetch failed: {e}")
             # Don't crash - just skip images
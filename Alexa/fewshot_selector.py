@@ -0,0 +1,105 @@
+# fewshot_selector.py
+"""
+Picks the few-shot examples most similar to the current utterance.
+
+planner.FEW_SHOTS is indexed once at import. By default a BM25 index over the
+user side of each pair is used; if PLANNER_FEWSHOT_EMBED_MODEL names a
+sentence-transformers model (and the package is installed) cosine similarity
+over embeddings is used instead.
+"""
+import json
+import logging
+
+from bm25 import BM25Index
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sentence_transformers import SentenceTransformer
+    _HAS_SENTENCE_TRANSFORMERS = True
+except ImportError:
+    _HAS_SENTENCE_TRANSFORMERS = False
+
+class FewShotSelector:
+    """
+    Retrieval over (user, assistant) example pairs.
+
+    Args:
+        shots: Flat message list alternating user / assistant turns
+        embed_model: Optional sentence-transformers model name
+    """
+
+    def __init__(self, shots: list, embed_model: str = ""):
+        self.pairs = [
+            (shots[i], shots[i + 1])
+            for i in range(0, len(shots) - 1, 2)
+            if shots[i]["role"] == "user" and shots[i + 1]["role"] == "assistant"
+        ]
+        prompts = [user["content"] for user, _ in self.pairs]
+        self.index = BM25Index(prompts)
+        self.backend = "bm25"
+
+        # When fewer than k examples share any terms with the query, the remaining
+        # slots go to one example per tool/action so the model still sees every shape.
+        seen_labels = set()
+        first_of_label, rest = [], []
+        for i, (_, assistant) in enumerate(self.pairs):
+            label = self._label(assistant["content"])
+            if label in seen_labels:
+                rest.append(i)
+            else:
+                seen_labels.add(label)
+                first_of_label.append(i)
+        self._padding_order = first_of_label + rest
+
+        self._model = None
+        self._embeddings = None
+        if embed_model and _HAS_SENTENCE_TRANSFORMERS:
+            try:
+                self._model = SentenceTransformer(embed_model, device="cpu")
+                self._embeddings = self._model.encode(prompts, normalize_embeddings=True)
+                self.backend = "embeddings"
+            except Exception as e:
+                logger.warning(f"Few-shot embeddings unavailable, using BM25: {e}")
+                self._model = None
+
+    @staticmethod
+    def _label(content: str) -> str:
+        try:
+            plan = json.loads(content)
+        except (TypeError, ValueError):
+            return "unknown"
+        if plan.get("action") == "call_tool":
+            return plan.get("name", "unknown")
+        return plan.get("action", "unknown")
+
+    def _rank(self, query: str, k: int) -> list:
+        if self._model is not None:
+            q = self._model.encode([query], normalize_embeddings=True)[0]
+            sims = self._embeddings @ q
+            return sorted(range(len(self.pairs)), key=lambda i: (-float(sims[i]), i))[:k]
+
+        scores = self.index.scores(query)
+        matched = sorted(
+            (i for i, s in enumerate(scores) if s > 0), key=lambda i: (-scores[i], i)
+        )[:k]
+        chosen = set(matched)
+        for i in self._padding_order:
+            if len(matched) >= k:
+                break
+            if i not in chosen:
+                matched.append(i)
+                chosen.add(i)
+        return matched
+
+    def select(self, query: str, k: int) -> list:
+        """
+        Top-k example pairs for the query, flattened back into messages.
+
+        Pairs are emitted in their original FEW_SHOTS order so the same
+        selection always produces the same prompt bytes.
+        """
+        if k <= 0 or k >= len(self.pairs):
+            return [msg for pair in self.pairs for msg in pair]
+        chosen = sorted(self._rank(query, k))
+        return [msg for i in chosen for msg in self.pairs[i]]
@@ -0,0 +1,284 @@
+# intent_router.py
+"""
+Zero-LLM fast path for the planner.
+
+Compiled rules + a small keyword trie that recognise the most common intents
+(greetings, local time, time/weather in a place, explicit image and arXiv
+requests) and emit the same plan dicts as planner.plan_with_ollama. Anything
+the rules are not confident about falls through to the LLM.
+"""
+import re
+import threading
+
+from config import FAST_ROUTER_MIN_CONFIDENCE
+from planner import TIME_IN_RE, WEATHER_IN_RE
+from tool_image import should_fetch_images
+
+# ---------------------------------------------------------------------
+#  Normalisation
+# ---------------------------------------------------------------------
+_PUNCT_RE = re.compile(r"[?!.,;:]+")
+
+def normalize(user_text: str) -> str:
+    text = user_text.lower().replace("’", "'").strip()
+    text = _PUNCT_RE.sub(" ", text)
+    return " ".join(text.split())
+
+# Words that mean the utterance leans on conversation history ("weather there")
+# or on something the plain tool can't answer ("weather tomorrow"). Never fast-path these.
+REFERENCE_WORDS = {"it", "there", "that", "this", "those", "them", "he", "she", "they", "same"}
+_PLACE_STOPWORDS = REFERENCE_WORDS | {
+    "and", "or", "now", "today", "tonight", "tomorrow", "yesterday", "week", "weekend",
+    "forecast", "please", "right", "currently", "the", "my", "your", "me",
+}
+_MAX_PLACE_WORDS = 4
+_PLACE_RE = re.compile(r"^[a-z][a-z\s\-]*$")
+
+def _clean_place(raw):
+    if not raw:
+        return None
+    place = raw.strip()
+    for suffix in (" right now", " now", " please"):
+        if place.endswith(suffix):
+            place = place[: -len(suffix)].strip()
+    words = place.split()
+    if not words or len(words) > _MAX_PLACE_WORDS:
+        return None
+    if not _PLACE_RE.match(place) or any(w in _PLACE_STOPWORDS for w in words):
+        return None
+    return place
+
+# ---------------------------------------------------------------------
+#  Keyword trie for whole-utterance phrases (greetings, capabilities)
+# ---------------------------------------------------------------------
+class _PhraseTrie:
+    """Token-level trie; matches a phrase only if it covers the whole utterance."""
+
+    _END = object()
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, phrase: str, value):
+        node = self.root
+        for token in phrase.split():
+            node = node.setdefault(token, {})
+        node[self._END] = value
+
+    def match(self, tokens: list, ignore_tail=()):
+        node = self.root
+        for i, token in enumerate(tokens):
+            if token not in node:
+                # Allow trailing filler like "hello vector" / "thanks a lot"
+                if self._END in node and all(t in ignore_tail for t in tokens[i:]):
+                    return node[self._END]
+                return None
+            node = node[token]
+        return node.get(self._END)
+
+_GREETING_TEXT = "Hello! How can I help you today?"
+_CAPABILITIES_TEXT = (
+    "I can tell you the time and weather, search the web for information, "
+    "and answer questions about almost anything!"
+)
+_THANKS_TEXT = "You're welcome!"
+
+_PHRASES = _PhraseTrie()
+for _p in ("hello", "hi", "hey", "hiya", "hello there", "hi there", "hey there",
+           "good morning", "good afternoon", "good evening", "greetings"):
+    _PHRASES.add(_p, ("greeting", _GREETING_TEXT))
+for _p in ("what can you do", "what can you help with", "what can you help me with",
+           "how do you work", "what are you capable of", "help"):
+    _PHRASES.add(_p, ("capabilities", _CAPABILITIES_TEXT))
+for _p in ("thanks", "thank you", "thank you very much", "cheers"):
+    _PHRASES.add(_p, ("thanks", _THANKS_TEXT))
+_PHRASE_FILLER = {"vector", "jarvis", "assistant", "so", "much", "a", "lot", "please"}
+
+# ---------------------------------------------------------------------
+#  Compiled intent rules
+# ---------------------------------------------------------------------
+_LOCAL_TIME_RE = re.compile(
+    r"^(?:what's|what is|tell me|whats)?\s*(?:the\s+)?(?:current\s+|local\s+)?time"
+    r"(?:\s+is\s+it)?(?:\s+now|\s+right\s+now|\s+please)?$"
+    r"|^what\s+time\s+is\s+it(?:\s+now|\s+right\s+now)?$"
+)
+_TIME_ASK_RE = re.compile(
+    r"\b(?:what's\s+the\s+time|what\s+is\s+the\s+time|what\s+time\s+is\s+it|"
+    r"what\s+time\s+in|(?:current|local)\s+time|time\s+is\s+it|"
+    r"time\s+and\s+weather|weather\s+and\s+(?:the\s+)?time)\b"
+    r"(?!\s+(?:difference|differences|zone|zones)\b)"
+)
+_WEATHER_RE = re.compile(r"\bweather\b")
+_IMAGE_RE = re.compile(
+    r"^(?:can\s+you\s+)?(?:please\s+)?(?:show\s+me|find|get|search\s+for|display)?\s*"
+    r"(?:some\s+|a\s+|an\s+)?(?:pictures?|images?|photos?)\s+of\s+(.+)$"
+)
+_ARXIV_RE = re.compile(
+    r"^(?:search|find|look\s+up|get)?\s*(?:on\s+)?arxiv\s+(?:for|on|about)\s+(.+)$"
+    r"|^(?:find|search\s+for|get|show\s+me)\s+(?:some\s+)?(?:research\s+|academic\s+|scientific\s+)?"
+    r"papers\s+(?:on|about)\s+(.+)$"
+)
+_LEADING_ARTICLE_RE = re.compile(r"^(?:a|an|the|some)\s+")
+
+def _refers_back(text):
+    return any(t in REFERENCE_WORDS for t in text.split())
+
+def _route_phrase(text, tokens):
+    hit = _PHRASES.match(tokens, ignore_tail=_PHRASE_FILLER)
+    if hit:
+        name, reply = hit
+        return name, {"action": "final", "text": reply}, 0.99
+    return None
+
+def _route_time_weather(text, tokens):
+    # "what time is it" is not a reference to an earlier turn
+    if _refers_back(text.replace("time is it", "time")):
+        return None
+
+    wants_weather = bool(_WEATHER_RE.search(text))
+    wants_time = bool(_TIME_ASK_RE.search(text)) or bool(_LOCAL_TIME_RE.match(text))
+    if not (wants_time or wants_weather):
+        return None
+
+    m_t = TIME_IN_RE.search(text)
+    m_w = WEATHER_IN_RE.search(text)
+    place_time = _clean_place(m_t.group(1)) if m_t else None
+    place_weather = _clean_place(m_w.group(1)) if m_w else None
+
+    if wants_time and wants_weather:
+        place = place_weather or place_time
+        if not place:
+            return None
+        return "time_and_weather", {
+            "action": "call_tools",
+            "calls": [
+                {"name": "get_time_in", "args": {"place": place}},
+                {"name": "get_weather", "args": {"place": place}},
+            ],
+        }, 0.9
+
+    if wants_weather:
+        if not place_weather:
+            return None
+        return "weather_in", {
+            "action": "call_tool", "name": "get_weather", "args": {"place": place_weather}
+        }, 0.9
+
+    if _LOCAL_TIME_RE.match(text):
+        return "local_time", {"action": "call_tool", "name": "get_time", "args": {}}, 0.95
+    if place_time:
+        return "time_in", {
+            "action": "call_tool", "name": "get_time_in", "args": {"place": place_time}
+        }, 0.9
+    return None
+
+def _route_images(text, tokens):
+    if not should_fetch_images(text):
+        return None
+    m = _IMAGE_RE.match(text)
+    if not m:
+        return None
+    query = _LEADING_ARTICLE_RE.sub("", m.group(1)).strip()
+    if not query or _refers_back(query):
+        return None
+    return "image_search", {
+        "action": "call_tool", "name": "image_search", "args": {"query": query}
+    }, 0.9
+
+def _route_arxiv(text, tokens):
+    m = _ARXIV_RE.match(text)
+    if not m:
+        return None
+    query = (m.group(1) or m.group(2) or "").strip()
+    if not query or _refers_back(query):
+        return None
+    return "search_arxiv", {
+        "action": "call_tool", "name": "search_arxiv", "args": {"query": query}
+    }, 0.85
+
+# Checked in order; first rule that produces a plan wins
+_RULES = (_route_phrase, _route_time_weather, _route_images, _route_arxiv)
+
+# ---------------------------------------------------------------------
+#  Stats
+# ---------------------------------------------------------------------
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "hits": 0, "routes": {}}
+
+def _record(route_name, confidence, hit):
+    with _stats_lock:
+        _stats["calls"] += 1
+        if route_name is None:
+            return
+        entry = _stats["routes"].setdefault(
+            route_name, {"hits": 0, "below_threshold": 0, "confidence_sum": 0.0}
+        )
+        entry["confidence_sum"] += confidence
+        if hit:
+            _stats["hits"] += 1
+            entry["hits"] += 1
+        else:
+            entry["below_threshold"] += 1
+
+def get_stats() -> dict:
+    """Hit rate overall and per route, with mean confidence per route."""
+    with _stats_lock:
+        calls = _stats["calls"]
+        routes = {}
+        for name, entry in _stats["routes"].items():
+            seen = entry["hits"] + entry["below_threshold"]
+            routes[name] = {
+                "hits": entry["hits"],
+                "below_threshold": entry["below_threshold"],
+                "avg_confidence": round(entry["confidence_sum"] / seen, 3) if seen else 0.0,
+                "hit_rate": round(entry["hits"] / calls, 3) if calls else 0.0,
+            }
+        return {
+            "calls": calls,
+            "hits": _stats["hits"],
+            "hit_rate": round(_stats["hits"] / calls, 3) if calls else 0.0,
+            "routes": routes,
+        }
+
+def reset_stats():
+    with _stats_lock:
+        _stats["calls"] = 0
+        _stats["hits"] = 0
+        _stats["routes"] = {}
+
+# ---------------------------------------------------------------------
+#  Public API
+# ---------------------------------------------------------------------
+def predict(user_text: str):
+    """
+    Best rule-based guess regardless of confidence.
+
+    Returns {"route", "plan", "confidence"} or None if no rule applies.
+    Does not touch the stats.
+    """
+    text = normalize(user_text)
+    if not text:
+        return None
+    tokens = text.split()
+    for rule in _RULES:
+        result = rule(text, tokens)
+        if result:
+            name, plan, confidence = result
+            return {"route": name, "plan": plan, "confidence": confidence}
+    return None
+
+def route(user_text: str, min_confidence: float = None):
+    """
+    Fast-path routing used by planner.plan.
+
+    Returns the same dict as predict() when confident enough, otherwise None
+    so the caller falls through to the LLM planner.
+    """
+    threshold = FAST_ROUTER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    guess = predict(user_text)
+    if guess is None:
+        _record(None, 0.0, False)
+        return None
+    hit = guess["confidence"] >= threshold
+    _record(guess["route"], guess["confidence"], hit)
+    return guess if hit else None
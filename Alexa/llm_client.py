@@ -1,7 +1,5 @@
-import requests
-import json
 import logging
-import config
+import ollama_client
 
 logger = logging.getLogger(__name__)
 
@@ -27,8 +25,6 @@ def generate_response(user_text: str, context=None) -> str:
         str: The generated response
     """
     try:
-        url = f"{config.OLLAMA_URL}/api/chat"
-        
         # Build messages list
         # Start with system prompt
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -44,24 +40,9 @@ def generate_response(user_text: str, context=None) -> str:
         # We must append this because context history likely contains PAST turns, not the current trigger
         messages.append({"role": "user", "content": user_text})
         
-        payload = {
-            "model": config.OLLAMA_MODEL,
-            "messages": messages,
-            "options": {
-                "temperature": 0.7, 
-                "num_ctx": 4096
-            },
-            "stream": False 
-        }
-        
         logger.info(f"Generating LLM response for: {user_text[:50]}...")
         
-        # Using a session for potential connection reuse if we were doing multiple calls, 
-        # but here simple post is fine.
-        response = requests.post(url, json=payload, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
+        result = ollama_client.chat(messages, task="chat", caller="llm_client")
         content = result.get("message", {}).get("content", "")
         
         if not content:
@@ -0,0 +1,226 @@
+# llm_scheduler.py
+"""
+Priority scheduling and cancellation for Ollama requests.
+
+Ollama runs a model's generations one (or OLLAMA_NUM_PARALLEL) at a time, so
+a 60 s brainstorm that gets there first makes the next voice command's
+planner wait behind it. ollama_client takes a slot here before it sends any
+request upstream:
+
+    interactive   planner, query planner    may use all LLM_MAX_IN_FLIGHT slots
+    answer        grounded answers, chat    all but LLM_RESERVED_INTERACTIVE
+    background    brainstorm                at most LLM_MAX_BACKGROUND at once
+    warmup        model loads, prefix       LLM_MAX_WARMUP of their own, outside
+                  warm-up                   LLM_MAX_IN_FLIGHT: they generate (almost)
+                                            nothing, and several models should load at once
+
+Waiting requests start in class order, first come first served within a class.
+
+A command runs inside turn(channel). Starting a new turn on the same channel,
+or cancel(channel) ("stop"), cancels everything the old turn has queued or
+running: queued requests never start, and streams are closed so Ollama stops
+generating. The old turn's thread gets Cancelled from its current (or next)
+LLM call. Cancelled derives from BaseException, like asyncio.CancelledError,
+so the `except Exception` fallbacks on the way (planner -> regex, answer ->
+fallback text) do not turn an aborted command into a different answer.
+
+    with llm_scheduler.turn("voice"):
+        response = handle_user_text(command_text)
+"""
+import functools
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+
+CLASSES = ("interactive", "answer", "background", "warmup")
+
+class Cancelled(BaseException):
+    """The request's turn was cancelled (a newer command on its channel, or "stop")."""
+
+_cond = threading.Condition()
+_seq = itertools.count(1)
+_local = threading.local()
+_turns = set()
+_tickets = set()
+_queue = []                      # waiting tickets, sorted by (class, arrival)
+_running = {c: 0 for c in CLASSES}
+_stats = {"admitted": 0, "cancelled": 0, "turns_cancelled": 0, "max_wait_ms": 0.0}
+
+class Turn:
+    """One command's LLM work on a channel ("voice", "web:<sid>", ...)."""
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.cancelled = False
+
+class Ticket:
+    """One request's place in the scheduler. cancel() wakes whoever waits on it."""
+
+    def __init__(self, priority: str, label: str, turn: Turn = None):
+        self.priority = priority if priority in CLASSES else "answer"
+        self.rank = CLASSES.index(self.priority)
+        self.label = label
+        self.turn = turn
+        self.seq = next(_seq)
+        self.cancelled = False
+        self._callbacks = []
+
+    def on_cancel(self, fn):
+        """Call fn() when the ticket is cancelled (right away if it already is)."""
+        with _cond:
+            if not self.cancelled:
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def cancel(self) -> bool:
+        with _cond:
+            if self.cancelled:
+                return False
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+            _stats["cancelled"] += 1
+            _cond.notify_all()
+        for fn in callbacks:
+            fn()
+        return True
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled(f"{self.label} request cancelled")
+
+# ---------------------------------------------------------------------
+#  Slots
+# ---------------------------------------------------------------------
+def priority_for(name: str) -> str:
+    """Class of a task or caller name (LLM_PRIORITIES); anything else is "answer"."""
+    return config.LLM_PRIORITIES.get(name, "answer")
+
+def open_ticket(priority: str, label: str) -> Ticket:
+    """Ticket for one request, tied to this thread's turn (already cancelled if the turn is)."""
+    turn = current_turn()
+    ticket = Ticket(priority, label, turn)
+    with _cond:
+        ticket.cancelled = turn is not None and turn.cancelled
+        _tickets.add(ticket)
+    return ticket
+
+def close_ticket(ticket: Ticket):
+    with _cond:
+        _tickets.discard(ticket)
+
+def _limit(priority: str) -> int:
+    if priority == "interactive":
+        return config.LLM_MAX_IN_FLIGHT
+    return max(1, config.LLM_MAX_IN_FLIGHT - config.LLM_RESERVED_INTERACTIVE)
+
+def _admissible(ticket: Ticket) -> bool:
+    if ticket.priority == "warmup":
+        return _running["warmup"] < config.LLM_MAX_WARMUP
+    if sum(_running.values()) - _running["warmup"] >= _limit(ticket.priority):
+        return False
+    return ticket.priority != "background" or _running["background"] < config.LLM_MAX_BACKGROUND
+
+def _next_locked():
+    for ticket in _queue:
+        if _admissible(ticket):
+            return ticket
+    return None
+
+def acquire(ticket: Ticket) -> str:
+    """Wait for a slot in the ticket's class; returns the slot for release(). Raises Cancelled."""
+    ticket.check()
+    enqueued = time.monotonic()
+    with _cond:
+        _queue.append(ticket)
+        _queue.sort(key=lambda t: (t.rank, t.seq))
+        try:
+            while True:
+                ticket.check()
+                if _next_locked() is ticket:
+                    break
+                _cond.wait()
+        finally:
+            _queue.remove(ticket)
+            _cond.notify_all()
+        _running[ticket.priority] += 1
+        _stats["admitted"] += 1
+        _stats["max_wait_ms"] = max(_stats["max_wait_ms"], round((time.monotonic() - enqueued) * 1000, 1))
+    return ticket.priority
+
+def release(slot: str):
+    with _cond:
+        _running[slot] -= 1
+        _cond.notify_all()
+
+# ---------------------------------------------------------------------
+#  Turns
+# ---------------------------------------------------------------------
+def current_turn():
+    return getattr(_local, "turn", None)
+
+@contextmanager
+def _activate(turn: Turn):
+    previous = current_turn()
+    _local.turn = turn
+    try:
+        yield turn
+    finally:
+        _local.turn = previous
+
+@contextmanager
+def turn(channel: str):
+    """Run a command on `channel`; what an earlier command there still has going is cancelled first."""
+    cancel(channel)
+    t = Turn(channel)
+    with _cond:
+        _turns.add(t)
+    try:
+        with _activate(t):
+            yield t
+    finally:
+        with _cond:
+            _turns.discard(t)
+
+def bind(fn):
+    """Carry the caller's turn to fn on another thread (like tracing.wrap)."""
+    t = current_turn()
+    if t is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _activate(t):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def cancel(channel: str = None) -> int:
+    """
+    Cancel the turns running on `channel` (on every channel if None) and their
+    requests. Requests made outside any turn (warm-up) are left alone.
+    Returns the number of requests cancelled.
+    """
+    with _cond:
+        for t in _turns:
+            if (channel is None or t.channel == channel) and not t.cancelled:
+                t.cancelled = True
+                _stats["turns_cancelled"] += 1
+        tickets = [tk for tk in _tickets if tk.turn is not None and tk.turn.cancelled]
+    return sum(1 for tk in tickets if tk.cancel())
+
+def get_status() -> dict:
+    with _cond:
+        status = dict(_stats)
+        status["in_flight"] = dict(_running)
+        status["queued"] = {c: sum(1 for t in _queue if t.priority == c) for c in CLASSES}
+        status["turns"] = sorted(t.channel for t in _turns)
+    status["limits"] = {
+        "max_in_flight": config.LLM_MAX_IN_FLIGHT,
+        "reserved_interactive": config.LLM_RESERVED_INTERACTIVE,
+        "max_background": config.LLM_MAX_BACKGROUND,
+        "max_warmup": config.LLM_MAX_WARMUP,
+    }
+    return status
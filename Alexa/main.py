@@ -1,5 +1,9 @@
 from dispatcher import handle_user_text
 from context_manager import get_context
+import config
+import planner
+import model_warmup
+from web_retrieval import processing
 import sys
 
 def main():
@@ -20,6 +24,13 @@ def main():
     print(" - price of iPhone 15")
     print("--------------------------------------------------\n")
     
+    if config.OLLAMA_WARMUP:
+        model_warmup.start()
+    if config.PLANNER_WARMUP:
+        planner.warm_up_async()
+    if config.RERANK_WARMUP:
+        processing.warm_up_reranker_async()
+    
     context = get_context()
     
     while True:
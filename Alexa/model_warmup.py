@@ -0,0 +1,134 @@
+# model_warmup.py
+"""
+Keeps the Ollama models resident.
+
+start() loads every model in OLLAMA_WARMUP_MODELS (default: every model in
+MODEL_PROFILES, all at once) with an empty prompt, which makes Ollama load the
+weights without generating, and then re-sends that request whenever Ollama has
+been idle for OLLAMA_KEEPALIVE_INTERVAL seconds (no later: the loop sleeps
+until the next ping is due), so the models' keep_alive never runs out
+between conversations. get_status() reports the load state of each model,
+merged with what /api/ps says is actually in memory.
+
+Planner.warm_up() is separate: it evaluates the planner's prompt prefix once
+the model is in memory.
+"""
+import threading
+import time
+
+import config
+import ollama_client
+
+_lock = threading.Lock()
+_status = {"running": False, "pings": 0, "errors": 0, "models": {}}
+_stop = threading.Event()
+_thread = None
+
+def warmup_models() -> list:
+    return list(config.OLLAMA_WARMUP_MODELS or ollama_client.task_models())
+
+def _set_model(model: str, **fields):
+    with _lock:
+        _status["models"].setdefault(model, {"state": "unknown"}).update(fields)
+
+def load(model: str) -> bool:
+    """Load (or keep loaded) one model. Returns False if Ollama could not be reached."""
+    with _lock:
+        first = _status["models"].get(model, {}).get("state") != "loaded"
+    if first:
+        _set_model(model, state="loading")
+    started = time.monotonic()
+    try:
+        data = ollama_client.generate("", caller="warmup", model=model, timeout=config.OLLAMA_WARMUP_TIMEOUT)
+    except Exception as e:
+        _set_model(model, state="error", error=str(e))
+        with _lock:
+            _status["errors"] += 1
+        print(f"Warm-up: could not load {model}: {e}")
+        return False
+
+    fields = {"state": "loaded", "last_ping": time.time(), "error": None}
+    if first:
+        fields["load_ms"] = round((time.monotonic() - started) * 1000, 1)
+        fields["load_duration_ms"] = round(data.get("load_duration", 0) / 1e6, 1)
+    _set_model(model, **fields)
+    with _lock:
+        _status["pings"] += 1
+    return True
+
+def load_all():
+    """
+    Load every warm-up model at once, so a small and a large model are both
+    resident. Loads use the scheduler's "warmup" class (LLM_MAX_WARMUP at once),
+    so they neither queue behind each other as background work nor take slots
+    from live requests.
+    """
+    threads = [threading.Thread(target=load, args=(m,), name=f"warmup-{m}", daemon=True) for m in warmup_models()]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def _run(interval: float):
+    load_all()
+    wait = interval
+    while not _stop.wait(wait):
+        # Real traffic keeps the models warm on its own; only ping when idle,
+        # and otherwise sleep until `interval` after the last answer
+        idle = ollama_client.idle_seconds()
+        if idle >= interval:
+            load_all()
+            wait = interval
+        else:
+            wait = interval - idle
+    with _lock:
+        _status["running"] = False
+
+def start(interval: float = None) -> threading.Thread:
+    """Start the keep-alive loop in a daemon thread (no-op if already running)."""
+    global _thread
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return _thread
+        _stop.clear()
+        _status["running"] = True
+        interval = config.OLLAMA_KEEPALIVE_INTERVAL if interval is None else interval
+        _thread = threading.Thread(target=_run, args=(interval,), name="ollama-keepalive", daemon=True)
+        _thread.start()
+        return _thread
+
+def stop(timeout: float = None):
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+def get_status(refresh: bool = True) -> dict:
+    """
+    Per-model state ("loading", "loaded", "error", "unknown"). With refresh,
+    /api/ps is asked which models are resident right now; a model Ollama has
+    unloaded shows state "unloaded" until the next ping.
+    """
+    resident = None
+    if refresh:
+        try:
+            resident = {m.get("name") or m.get("model"): m for m in ollama_client.get_json("/api/ps").get("models", [])}
+        except Exception:
+            pass
+
+    with _lock:
+        snapshot = {k: v for k, v in _status.items() if k != "models"}
+        models = {name: dict(info) for name, info in _status["models"].items()}
+    for name in warmup_models():
+        models.setdefault(name, {"state": "unknown"})
+
+    if resident is not None:
+        for name, info in models.items():
+            ps = resident.get(name)
+            info["resident"] = ps is not None
+            if ps is not None:
+                info["expires_at"] = ps.get("expires_at")
+                info["size_vram"] = ps.get("size_vram")
+            elif info["state"] == "loaded":
+                info["state"] = "unloaded"
+    snapshot["models"] = models
+    return snapshot
@@ -0,0 +1,482 @@
+# ollama_client.py
+"""
+The one place that talks HTTP to Ollama.
+
+Every LLM call (planner, chat replies, web answers, brainstorm) goes through a
+pooled requests.Session, so connections are reused, and through the same
+payload defaults (num_ctx, keep_alive). Connection failures and 502/503/504
+are retried with exponential backoff. Token counts and eval durations from each
+final response are recorded per caller and served by get_metrics().
+
+Each task (planner, query_planner, answer, chat, creative) has its own model
+and options in config.MODEL_PROFILES; pass task= to use them.
+
+Identical requests (same URL, model, prompt/messages and options) that are in
+flight at the same time share one upstream generation: the first caller
+sends it, later ones replay its chunks from the start and then follow along
+live (OLLAMA_COALESCE).
+
+Every upstream request first takes a slot from llm_scheduler in its priority
+class (planner before answers before background work) and is cancelled with
+the turn that made it. Non-streaming calls are streamed from Ollama too, so
+closing the connection stops any generation.
+
+    reply = ollama_client.chat(messages, task="chat", caller="llm_client")["message"]["content"]
+
+    with ollama_client.stream("/api/chat", payload, caller="planner") as chunks:
+        for chunk in chunks:
+            ...   # breaking out closes the connection; Ollama stops generating
+"""
+import hashlib
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import llm_scheduler
+
+METRIC_FIELDS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+_RETRY_STATUS = (502, 503, 504)
+
+_last_activity = 0.0  # monotonic time of the last successful request
+
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=config.OLLAMA_POOL_SIZE))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=config.OLLAMA_POOL_SIZE))
+
+# ---------------------------------------------------------------------
+#  Metrics
+# ---------------------------------------------------------------------
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+def _caller_entry(caller: str) -> dict:
+    entry = _metrics.get(caller)
+    if entry is None:
+        entry = _metrics[caller] = {
+            "calls": 0, "coalesced": 0, "errors": 0, "retries": 0,
+            "prompt_eval_count": 0, "eval_count": 0,
+            "prompt_eval_ms": 0.0, "eval_ms": 0.0, "load_ms": 0.0,
+            "last": None,
+        }
+    return entry
+
+def _bump(caller: str, key: str, n=1):
+    with _metrics_lock:
+        _caller_entry(caller)[key] += n
+
+def record(caller: str, chunk: dict):
+    """Fold the counters of a final (done) response into the caller's totals."""
+    sample = {k: chunk[k] for k in METRIC_FIELDS if k in chunk}
+    if not sample:
+        return
+    with _metrics_lock:
+        entry = _caller_entry(caller)
+        entry["prompt_eval_count"] += sample.get("prompt_eval_count", 0)
+        entry["eval_count"] += sample.get("eval_count", 0)
+        entry["prompt_eval_ms"] += sample.get("prompt_eval_duration", 0) / 1e6
+        entry["eval_ms"] += sample.get("eval_duration", 0) / 1e6
+        entry["load_ms"] += sample.get("load_duration", 0) / 1e6
+        entry["last"] = sample
+
+def get_metrics() -> dict:
+    """Per-caller totals plus generation speed (tokens/s) where known."""
+    with _metrics_lock:
+        snapshot = {name: dict(entry) for name, entry in _metrics.items()}
+    for entry in snapshot.values():
+        for key in ("prompt_eval_ms", "eval_ms", "load_ms"):
+            entry[key] = round(entry[key], 1)
+        entry["tokens_per_s"] = round(entry["eval_count"] / (entry["eval_ms"] / 1000), 1) if entry["eval_ms"] else 0.0
+    return snapshot
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+# ---------------------------------------------------------------------
+#  Per-task models
+# ---------------------------------------------------------------------
+def context_size(model: str) -> int:
+    """num_ctx for a model: the largest of the tasks assigned to it (a change would force a reload)."""
+    sizes = [ctx for m, ctx, _ in config.MODEL_PROFILES.values() if m == model]
+    return max(sizes) if sizes else config.OLLAMA_NUM_CTX
+
+def task_profile(task: str) -> tuple:
+    """(model, options) for a task in MODEL_PROFILES; unknown tasks get OLLAMA_MODEL."""
+    if task not in config.MODEL_PROFILES:
+        return config.OLLAMA_MODEL, {"num_ctx": context_size(config.OLLAMA_MODEL)}
+    model, _, temperature = config.MODEL_PROFILES[task]
+    return model, {"temperature": temperature, "num_ctx": context_size(model)}
+
+def task_models() -> list:
+    """Distinct models in MODEL_PROFILES, in first-use order."""
+    models = []
+    for model, _, _ in config.MODEL_PROFILES.values():
+        if model not in models:
+            models.append(model)
+    return models
+
+# ---------------------------------------------------------------------
+#  Coalescing
+# ---------------------------------------------------------------------
+_flights_lock = threading.Lock()
+_flights = {}
+
+def _abort(resp):
+    """Close a response another thread may be blocked reading; shutting the socket down first wakes that read."""
+    try:
+        resp.raw._fp.fp.raw._sock.shutdown(socket.SHUT_RDWR)
+    except Exception:
+        pass
+    resp.close()
+
+class _Flight:
+    """
+    One upstream request shared by every identical request made while it runs.
+    Each member iterates the shared chunk buffer from the first chunk, and
+    whichever member runs out of buffered chunks first reads the next one from
+    the response. The scheduler slot taken to send the request is held until
+    the last member leaves.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.cond = threading.Condition(_flights_lock)
+        self.members = 1
+        self.chunks = []
+        self.error = None
+        self.sending = False
+        self.opened = False
+        self.done = False
+        self.reading = False
+        self.slot = None
+        self._resp = None
+        self._source = None
+
+    def _finish_locked(self, error=None):
+        self.error = error
+        self.opened = self.done = True
+        if _flights.get(self.key) is self:
+            del _flights[self.key]
+        self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self._finish_locked(error)
+
+    def claim(self) -> bool:
+        """True if the caller should send the request: nobody has, and nobody is about to."""
+        with self.cond:
+            if self.opened or self.sending:
+                return False
+            self.sending = True
+            return True
+
+    def unclaim(self):
+        """The claiming member was cancelled before sending; another member may send instead."""
+        with self.cond:
+            self.sending = False
+            self.cond.notify_all()
+
+    def open(self, resp, source, slot):
+        with self.cond:
+            self._resp, self._source, self.slot = resp, source, slot
+            self.opened = True
+            self.cond.notify_all()
+
+    def wait_open(self, ticket) -> bool:
+        """True once the request is sent, False if the sender gave up. Raises the sender's error."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.opened or not self.sending or ticket.cancelled)
+            ticket.check()
+            if not self.opened:
+                return False
+        if self.error is not None and not self.chunks:
+            raise self.error
+        return True
+
+    def interrupt(self):
+        """A member was cancelled: wake it, and stop the upstream read if it is the only member."""
+        with self.cond:
+            self.cond.notify_all()
+            resp = self._resp if self.members == 1 and not self.done else None
+        if resp is not None:
+            _abort(resp)
+
+    def _pull(self):
+        chunk, error, end = None, None, False
+        try:
+            chunk = next(self._source)
+        except StopIteration:
+            end = True
+        except Exception as e:
+            error, end = e, True
+        with self.cond:
+            self.reading = False
+            if chunk is not None:
+                self.chunks.append(chunk)
+                end = end or chunk.get("done") is True
+            if end and not self.done:
+                self._finish_locked(error)
+            self.cond.notify_all()
+
+    def subscribe(self, ticket):
+        """Every chunk of the generation from the first one; raises Cancelled once the ticket is."""
+        i = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: i < len(self.chunks) or self.done or not self.reading or ticket.cancelled
+                )
+                ticket.check()
+                if i < len(self.chunks):
+                    chunk = self.chunks[i]
+                    i += 1
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    self.reading = True
+                    chunk = None
+            if chunk is None:
+                self._pull()
+            else:
+                yield chunk
+
+    def leave(self):
+        """Drop one member; the last one out closes the response (stopping an unfinished generation)."""
+        with self.cond:
+            self.members -= 1
+            last = self.members == 0
+            if last and not self.done:
+                self._finish_locked()
+            resp = slot = None
+            if last:
+                resp, slot, self.slot = self._resp, self.slot, None
+        if resp is not None:
+            resp.close()
+        if slot is not None:
+            llm_scheduler.release(slot)
+
+def _fingerprint(url: str, payload: dict) -> str:
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha1(f"{url}\n{body}".encode("utf-8")).hexdigest()
+
+def _join(url: str, payload: dict) -> _Flight:
+    """The in-flight request identical to this one, or a new one."""
+    key = _fingerprint(url, payload)
+    with _flights_lock:
+        flight = _flights.get(key) if config.OLLAMA_COALESCE else None
+        if flight is not None:
+            flight.members += 1
+            return flight
+        flight = _Flight(key)
+        if config.OLLAMA_COALESCE:
+            _flights[key] = flight
+        return flight
+
+def in_flight() -> int:
+    """Distinct upstream requests currently shared through coalescing."""
+    with _flights_lock:
+        return len(_flights)
+
+# ---------------------------------------------------------------------
+#  Requests
+# ---------------------------------------------------------------------
+def build_payload(model: str = None, options: dict = None, keep_alive=None, **fields) -> dict:
+    """
+    Request body with the shared defaults: OLLAMA_MODEL, num_ctx =
+    context_size(model) and keep_alive = OLLAMA_KEEP_ALIVE. Explicit
+    options/keep_alive override them; fields (messages, prompt, format,
+    stream, ...) are passed through.
+    """
+    model = model or config.OLLAMA_MODEL
+    payload = {"model": model}
+    payload.update(fields)
+    payload["options"] = {"num_ctx": context_size(model), **(options or {})}
+    keep_alive = config.OLLAMA_KEEP_ALIVE if keep_alive is None else keep_alive
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+def _post(path: str, payload: dict, caller: str, stream: bool, timeout: float, base_url: str = None):
+    """POST with retries on connection errors and 502/503/504. Raises the last error."""
+    global _last_activity
+    url = f"{base_url or config.OLLAMA_URL}{path}"
+    attempts = max(1, config.OLLAMA_RETRIES + 1)
+    for attempt in range(attempts):
+        try:
+            resp = _SESSION.post(url, json=payload, stream=stream, timeout=timeout)
+            if resp.status_code in _RETRY_STATUS and attempt < attempts - 1:
+                resp.close()
+            else:
+                resp.raise_for_status()
+                _last_activity = time.monotonic()
+                return resp
+        except (requests.ConnectionError, requests.exceptions.ConnectTimeout):
+            if attempt == attempts - 1:
+                _bump(caller, "errors")
+                raise
+        except Exception:
+            _bump(caller, "errors")
+            raise
+        _bump(caller, "retries")
+        time.sleep(config.OLLAMA_RETRY_BACKOFF * (2 ** attempt))
+
+def idle_seconds() -> float:
+    """Seconds since Ollama last answered a request (inf if it never has)."""
+    return time.monotonic() - _last_activity if _last_activity else float("inf")
+
+def get_json(path: str, timeout: float = 2, base_url: str = None) -> dict:
+    """GET an info endpoint (/api/tags, /api/ps) on the pooled session."""
+    resp = _SESSION.get(f"{base_url or config.OLLAMA_URL}{path}", timeout=timeout)
+    try:
+        resp.raise_for_status()
+        return resp.json()
+    finally:
+        resp.close()
+
+def _iter_chunks(resp, caller: str):
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        try:
+            chunk = json.loads(line)
+        except ValueError:
+            continue
+        if chunk.get("done") is True:
+            record(caller, chunk)
+        yield chunk
+
+def _send(flight: _Flight, ticket, path: str, payload: dict, caller: str, timeout: float, base_url: str):
+    """Send the flight's request (after a scheduler slot) unless another member already has."""
+    while True:
+        if flight.claim():
+            try:
+                slot = llm_scheduler.acquire(ticket)
+            except llm_scheduler.Cancelled:
+                flight.unclaim()
+                raise
+            try:
+                resp = _post(path, payload, caller, True, timeout, base_url)
+            except Exception as e:
+                llm_scheduler.release(slot)
+                flight.finish(error=e)
+                raise
+            flight.open(resp, _iter_chunks(resp, caller), slot)
+            _bump(caller, "calls")
+            return
+        if flight.wait_open(ticket):
+            _bump(caller, "coalesced")
+            return
+
+@contextmanager
+def stream(path: str, payload: dict, caller: str = "other", timeout: float = None, base_url: str = None,
+           priority: str = None):
+    """
+    Streaming call: yields an iterator of parsed chunks. The request waits for
+    a scheduler slot of its priority class (default: llm_scheduler.priority_for(caller)).
+    The final chunk's metrics are recorded when it is read. Leaving the block
+    early closes the connection (and Ollama stops generating) unless an
+    identical coalesced request is still reading it; so does cancelling the
+    caller's turn, which raises llm_scheduler.Cancelled here.
+    """
+    payload = dict(payload, stream=True)
+    ticket = llm_scheduler.open_ticket(priority or llm_scheduler.priority_for(caller), caller)
+    try:
+        ticket.check()
+        flight = _join(f"{base_url or config.OLLAMA_URL}{path}", payload)
+        try:
+            ticket.on_cancel(flight.interrupt)
+            _send(flight, ticket, path, payload, caller, timeout or config.OLLAMA_TIMEOUT, base_url)
+            yield flight.subscribe(ticket)
+        finally:
+            flight.leave()
+    finally:
+        llm_scheduler.close_ticket(ticket)
+
+def request(path: str, payload: dict, caller: str = "other", timeout: float = None, base_url: str = None,
+            priority: str = None) -> dict:
+    """
+    Non-streaming call; returns the complete response (metrics recorded). It is
+    streamed from Ollama all the same, so that cancelling it stops generation.
+    """
+    parts, final = [], {}
+    with stream(path, payload, caller, timeout, base_url, priority) as chunks:
+        for chunk in chunks:
+            parts.append(chunk.get("response") or (chunk.get("message") or {}).get("content", ""))
+            if chunk.get("done") is True:
+                final = chunk
+                break
+    data = dict(final)
+    if path.endswith("/chat"):
+        data["message"] = dict(final.get("message") or {"role": "assistant"}, content="".join(parts))
+    else:
+        data["response"] = "".join(parts)
+    return data
+
+def _resolve(task: str, model: str, options: dict) -> tuple:
+    """Model and options from the task profile, with explicit arguments on top."""
+    if not task:
+        return model, options
+    task_model, task_options = task_profile(task)
+    return model or task_model, {**task_options, **(options or {})}
+
+def _priority(priority: str, task: str, caller: str) -> str:
+    return priority or llm_scheduler.priority_for(task or caller)
+
+def chat(messages: list, caller: str = None, options: dict = None, format: str = None, model: str = None,
+         keep_alive=None, timeout: float = None, base_url: str = None, task: str = None,
+         priority: str = None) -> dict:
+    """Non-streaming /api/chat; returns the full response dict."""
+    model, options = _resolve(task, model, options)
+    fields = {"messages": messages}
+    if format:
+        fields["format"] = format
+    payload = build_payload(model, options, keep_alive, **fields)
+    return request("/api/chat", payload, caller or task or "chat", timeout, base_url,
+                   _priority(priority, task, caller))
+
+def generate(prompt: str, caller: str = None, options: dict = None, format: str = None, model: str = None,
+             keep_alive=None, timeout: float = None, base_url: str = None, task: str = None,
+             priority: str = None) -> dict:
+    """Non-streaming /api/generate; returns the full response dict."""
+    model, options = _resolve(task, model, options)
+    fields = {"prompt": prompt}
+    if format:
+        fields["format"] = format
+    payload = build_payload(model, options, keep_alive, **fields)
+    return request("/api/generate", payload, caller or task or "generate", timeout, base_url,
+                   _priority(priority, task, caller))
+
+def stream_generate(prompt: str, on_token, caller: str = None, options: dict = None, model: str = None,
+                    keep_alive=None, timeout: float = None, base_url: str = None, task: str = None,
+                    priority: str = None) -> str:
+    """Streaming /api/generate: on_token(text) per chunk; returns the full text."""
+    model, options = _resolve(task, model, options)
+    payload = build_payload(model, options, keep_alive, prompt=prompt)
+    parts = []
+    with stream("/api/generate", payload, caller or task or "generate", timeout, base_url,
+                _priority(priority, task, caller)) as chunks:
+        for chunk in chunks:
+            piece = chunk.get("response", "")
+            if piece:
+                parts.append(piece)
+                on_token(piece)
+            if chunk.get("done"):
+                break
+    return "".join(parts)
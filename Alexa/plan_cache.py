@@ -0,0 +1,154 @@
+# plan_cache.py
+"""
+Memoization for planner decisions.
+
+Repeated requests ("weather in london", "latest news on spacex") get the same
+plan back without another Ollama round trip. Entries live in an in-memory
+LRU with a TTL and, when diskcache is installed, are also persisted under
+.cache/planner so they survive restarts.
+"""
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    PLAN_CACHE_MAX_ENTRIES,
+    PLAN_CACHE_TTL,
+    PLAN_CACHE_PERSIST,
+)
+from intent_router import normalize
+
+try:
+    import diskcache
+    _HAS_DISKCACHE = True
+except ImportError:
+    _HAS_DISKCACHE = False
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache", "planner")
+
+_VALID_ACTIONS = {"call_tool", "call_tools", "final"}
+
+# Utterances that only make sense together with earlier turns. Their key includes
+# a fingerprint of recent history so "what about the time there?" is not answered
+# with a plan built for a different conversation.
+_FOLLOW_UP_RE = re.compile(
+    r"\b(?:it|its|there|that|this|those|them|he|she|they|his|her|their|same|again|also)\b"
+    r"|^(?:and|what about|how about|and what about)\b"
+)
+
+def make_key(user_text: str, context=None) -> str:
+    """Cache key: normalized utterance, plus a context fingerprint for follow-ups."""
+    text = normalize(user_text)
+    fingerprint = ""
+    if context is not None and _FOLLOW_UP_RE.search(text):
+        fingerprint = context.fingerprint()
+    raw = f"{text}\x00{fingerprint}"
+    return "plan:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class PlanCache:
+    """LRU + TTL cache of plan dicts with an optional persistent backing store."""
+
+    def __init__(self, max_entries: int = 512, ttl: int = 21600, disk=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self._entries = OrderedDict()  # key -> (expires_at, plan)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, plan = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(plan)
+                del self._entries[key]
+
+        plan, expires_at = None, None
+        if self.disk is not None:
+            try:
+                plan, expires_at = self.disk.get(key, expire_time=True)
+            except Exception as e:
+                print(f"Plan cache: disk read failed: {e}")
+
+        with self._lock:
+            if plan is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            # Promote to memory without outliving the persisted entry
+            self._store(key, plan, now, expires_at)
+        return copy.deepcopy(plan)
+
+    def set(self, key: str, plan: dict):
+        if not isinstance(plan, dict) or plan.get("action") not in _VALID_ACTIONS:
+            return
+        plan = copy.deepcopy(plan)
+        with self._lock:
+            self._store(key, plan, time.time())
+        if self.disk is not None:
+            try:
+                self.disk.set(key, plan, expire=self.ttl)
+            except Exception as e:
+                print(f"Plan cache: disk write failed: {e}")
+
+    def _store(self, key, plan, now, expires_at=None):
+        self._entries[key] = (expires_at or now + self.ttl, plan)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            try:
+                self.disk.clear()
+            except Exception as e:
+                print(f"Plan cache: disk clear failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self.disk is not None,
+            }
+
+def _open_disk():
+    if not (PLAN_CACHE_PERSIST and _HAS_DISKCACHE):
+        return None
+    try:
+        return diskcache.Cache(CACHE_DIR)
+    except Exception as e:
+        print(f"Plan cache: could not open {CACHE_DIR}: {e}")
+        return None
+
+_CACHE = PlanCache(PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_TTL, disk=_open_disk())
+
+def get(key: str):
+    return _CACHE.get(key)
+
+def put(key: str, plan: dict):
+    _CACHE.set(key, plan)
+
+def clear():
+    _CACHE.clear()
+
+def get_stats() -> dict:
+    return _CACHE.stats()
@@ -0,0 +1,115 @@
+# plan_stream.py
+"""
+Incremental parser for the planner's streamed JSON output.
+
+Ollama streams the plan a few characters at a time. Instead of waiting for the
+`done` chunk and parsing everything afterwards, IncrementalPlanParser tracks
+brace depth / string state as text arrives, reports each top-level member
+("action", "name", "args", ...) as soon as it is complete, and says when the
+top-level object is closed so the caller can drop the HTTP stream right away.
+"""
+import json
+
+# Top-level members worth announcing to listeners
+SIGNAL_FIELDS = ("action", "name", "args", "calls", "text")
+
+class IncrementalPlanParser:
+    """
+    Feed text chunks; get told when the plan object is complete.
+
+    Args:
+        on_field: Optional callback(key, value, partial_plan) fired once per
+                  top-level member listed in SIGNAL_FIELDS, in arrival order.
+    """
+
+    def __init__(self, on_field=None):
+        self.on_field = on_field
+        self._chars = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None      # index of the opening '{'
+        self._end = None        # index just past the closing '}'
+        self.fields = {}
+        self.plan = None
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chars)
+
+    def feed(self, chunk: str) -> bool:
+        """Consume a chunk. Returns True once the top-level object is closed."""
+        if self.complete or not chunk:
+            return self.complete
+
+        for ch in chunk:
+            pos = len(self._chars)
+            self._chars.append(ch)
+
+            if self._start is None:
+                # Skip anything before the object (whitespace, ```json fences)
+                if ch == "{":
+                    self._start = pos
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = pos + 1
+                    self._finish()
+                    return True
+            elif ch == "," and self._depth == 1:
+                # A top-level member just ended; parse what we have so far
+                self._announce(self._chars_between(self._start, pos) + "}")
+
+        return False
+
+    def _chars_between(self, start, end) -> str:
+        return "".join(self._chars[start:end])
+
+    def _announce(self, candidate: str):
+        try:
+            partial = json.loads(candidate)
+        except ValueError:
+            return
+        if not isinstance(partial, dict):
+            return
+        for key, value in partial.items():
+            if key in self.fields:
+                continue
+            self.fields[key] = value
+            if self.on_field and key in SIGNAL_FIELDS:
+                try:
+                    self.on_field(key, value, partial)
+                except Exception as e:
+                    print(f"Plan stream: on_field callback failed: {e}")
+
+    def _finish(self):
+        raw = self._chars_between(self._start, self._end)
+        self._announce(raw)
+        try:
+            self.plan = json.loads(raw)
+        except ValueError:
+            self.plan = None
+
+    def result(self):
+        """Parsed top-level object, or None if incomplete / invalid."""
+        return self.plan
@@ -1,14 +1,24 @@
 # planner.py
 import json
 import re
-import requests
+import threading
+import time
 from config import (
     OLLAMA_URL,
-    OLLAMA_MODEL,
     USE_OLLAMA,
-    LLM_TEMPERATURE,
+    PLANNER_SESSION,
+    PLANNER_KEEP_ALIVE,
+    PLANNER_FEWSHOT_K,
+    PLANNER_FEWSHOT_EMBED_MODEL,
+    USE_FAST_ROUTER,
+    PLAN_CACHE_ENABLED,
+    PLANNER_EARLY_STOP,
 )
 from context_manager import get_context
+from fewshot_selector import FewShotSelector
+from plan_stream import IncrementalPlanParser
+import ollama_client
+import tracing
 
 # ---------------------------------------------------------------------
 #  SYSTEM RULES  (updated to forbid fake tools like get_definition)
@@ -267,20 +277,8 @@ def _safe_json(raw: str) -> dict:
     cleaned = _strip_markdown_fences(raw)
     try:
         obj = json.loads(cleaned)
-    except json.JSONDecodeError:
-        try:
-            wrapper = json.loads(cleaned)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Still not valid JSON after cleanup: {e}")
-        if (
-            isinstance(wrapper, dict)
-            and "message" in wrapper
-            and isinstance(wrapper["message"], dict)
-            and "content" in wrapper["message"]
-        ):
-            inner = _strip_markdown_fences(wrapper["message"]["content"])
-            return json.loads(inner)
-        raise ValueError("Wrapper did not contain a valid plan")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Still not valid JSON after cleanup: {e}")
 
     if isinstance(obj, dict) and "action" in obj:
         return obj
@@ -296,51 +294,175 @@ def _safe_json(raw: str) -> dict:
     raise ValueError("JSON parsed but did not contain 'action'")
 
 # ---------------------------------------------------------------------
-#  Talk to Ollama and reconstruct streamed output
+#  Planner session: stable prompt prefix + prompt-eval metrics
 # ---------------------------------------------------------------------
-def plan_with_ollama(user_text: str) -> dict:
-    url = f"{OLLAMA_URL}/api/chat"
+# Built once at import. Every request starts with exactly these messages, in this
+# order, so the tokens Ollama sees for the prefix are identical turn after turn and
+# its prompt cache only has to evaluate the history + new user message.
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_RULES}
+PREFIX_MESSAGES = [SYSTEM_MESSAGE] + FEW_SHOTS
+
+# With PLANNER_FEWSHOT_K > 0 only the system prompt is a fixed prefix; the k examples
+# closest to the utterance follow it (always in FEW_SHOTS order).
+FEWSHOT_SELECTOR = FewShotSelector(FEW_SHOTS, PLANNER_FEWSHOT_EMBED_MODEL)
+
+# Options are part of the session too: a different num_ctx makes Ollama reload the model.
+# Model and options come from the "planner" entry of MODEL_PROFILES.
+PLANNER_MODEL, PLANNER_OPTIONS = ollama_client.task_profile("planner")
+
+# Timing fields Ollama reports on the final chunk (durations are in nanoseconds)
+_METRIC_FIELDS = (
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+    "load_duration",
+    "total_duration",
+    "early_stop",
+    "first_token_ms",
+    "stream_ms",
+)
+
+_metrics_lock = threading.Lock()
+_planner_metrics = {"calls": 0, "early_stops": 0, "warmed_up": False, "last": None}
+
+def _build_messages(user_text: str, history_messages: list, fewshot_k: int = None) -> list:
+    k = PLANNER_FEWSHOT_K if fewshot_k is None else fewshot_k
+    if k > 0:
+        prefix = [SYSTEM_MESSAGE] + FEWSHOT_SELECTOR.select(user_text, k)
+    else:
+        prefix = PREFIX_MESSAGES
+    return prefix + history_messages + [{"role": "user", "content": user_text}]
+
+def _build_payload(messages: list, stream: bool = True) -> dict:
+    return ollama_client.build_payload(
+        PLANNER_MODEL,
+        dict(PLANNER_OPTIONS),
+        # Without a session Ollama's own keep-alive applies
+        keep_alive=PLANNER_KEEP_ALIVE if PLANNER_SESSION else "",
+        messages=messages,
+        format="json",
+        stream=stream,
+    )
+
+def _record_metrics(chunk: dict, kind: str = "plan"):
+    """
+    Store prompt/eval counters from Ollama's final (done) chunk. Plan calls add
+    first_token_ms / stream_ms measured here, which are all an early-stopped
+    call has on the prompt side (first_token_ms ~ queueing + prompt eval).
+    """
+    sample = {k: chunk[k] for k in _METRIC_FIELDS if k in chunk}
+    if not sample:
+        return
+    sample["kind"] = kind
+    with _metrics_lock:
+        if kind == "plan":
+            _planner_metrics["calls"] += 1
+        _planner_metrics["last"] = sample
+
+def get_planner_metrics() -> dict:
+    """
+    Latest planner prompt-eval numbers.
+
+    If the prefix cache is hit, `prompt_eval_count` on a plan call covers only the
+    history + user message instead of the whole SYSTEM_RULES + FEW_SHOTS prefix.
+    """
+    with _metrics_lock:
+        snapshot = dict(_planner_metrics)
+        if snapshot["last"]:
+            snapshot["last"] = dict(snapshot["last"])
+    return snapshot
+
+def warm_up() -> bool:
+    """
+    Load the planner model and evaluate the static prefix once, so the first real
+    request only pays for its own tokens. Safe to call from a background thread.
+    """
+    if not (USE_OLLAMA and PLANNER_SESSION):
+        return False
+
+    payload = _build_payload(_build_messages("hello", []), stream=False)
+    payload["options"]["num_predict"] = 1
+
+    try:
+        data = ollama_client.request("/api/chat", payload, caller="planner", timeout=120, base_url=OLLAMA_URL,
+                                     priority="warmup")
+        _record_metrics(data, kind="warmup")
+    except Exception as e:
+        print(f"Planner: warm-up failed: {e}")
+        return False
 
+    with _metrics_lock:
+        _planner_metrics["warmed_up"] = True
+    return True
+
+def warm_up_async() -> threading.Thread:
+    """Run warm_up() without blocking startup."""
+    t = threading.Thread(target=warm_up, name="planner-warmup", daemon=True)
+    t.start()
+    return t
+
+# ---------------------------------------------------------------------
+#  Talk to Ollama and reconstruct streamed output
+# ---------------------------------------------------------------------
+@tracing.traced("planner.llm")
+def plan_with_ollama(user_text: str, fewshot_k: int = None, on_field=None) -> dict:
+    """
+    Ask Ollama for a plan, parsing the stream as it arrives.
+
+    on_field(key, value, partial_plan) is called as soon as each of "action",
+    "name", "args" (and "calls"/"text") is complete. With PLANNER_EARLY_STOP the
+    HTTP stream is closed once the top-level object ends, so trailing tokens are
+    never waited for; Ollama's done chunk is lost with them, so only eval_count
+    and the timings measured here are recorded for that call.
+    """
     # Get conversation history
     context = get_context()
     history_messages = context.get_context_messages()
-    
-    messages = (
-        [{"role": "system", "content": SYSTEM_RULES}]
-        + FEW_SHOTS
-        + history_messages  # Add conversation history
-        + [{"role": "user", "content": user_text}]
-    )
 
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "options": {"temperature": LLM_TEMPERATURE},
-        "format": "json",
-        "stream": True,
-    }
+    messages = _build_messages(user_text, history_messages, fewshot_k)
+    payload = _build_payload(messages)
 
     try:
-        with requests.post(url, json=payload, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            assembled_content = ""
-            for line in r.iter_lines(decode_unicode=True):
-                if not line:
-                    continue
-                try:
-                    chunk = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
+        sent = time.monotonic()
+        with ollama_client.stream("/api/chat", payload, caller="planner", timeout=30, base_url=OLLAMA_URL) as chunks:
+            parser = IncrementalPlanParser(on_field=on_field)
+            tokens_out = 0  # Ollama streams one token per chunk
+            first_at = None
+
+            def timings():
+                now = time.monotonic()
+                return {
+                    "first_token_ms": round(((first_at or now) - sent) * 1000, 1),
+                    "stream_ms": round((now - sent) * 1000, 1),
+                }
+
+            for chunk in chunks:
                 msg = chunk.get("message", {})
                 if (
                     isinstance(msg, dict)
                     and msg.get("role") == "assistant"
                     and "content" in msg
                 ):
-                    assembled_content += msg["content"]
+                    tokens_out += 1
+                    first_at = first_at or time.monotonic()
+                    if parser.feed(msg["content"]) and PLANNER_EARLY_STOP:
+                        # Leaving the `with` block closes the connection; Ollama stops generating.
+                        # No done chunk will arrive: record the output tokens and our own timings.
+                        _record_metrics(dict(timings(), eval_count=tokens_out, early_stop=True))
+                        tracing.annotate(tokens_out=tokens_out, early_stop=True)
+                        with _metrics_lock:
+                            _planner_metrics["early_stops"] += 1
+                        break
                 if chunk.get("done") is True:
+                    _record_metrics(dict(chunk, **timings()))
+                    tracing.annotate(tokens_out=tokens_out, prompt_eval_count=chunk.get("prompt_eval_count"))
                     break
 
+        plan_obj = parser.result()
+        if isinstance(plan_obj, dict) and "action" in plan_obj:
+            return plan_obj
+        assembled_content = parser.text
         print(f"\nDEBUG assembled_content:\n{assembled_content}\n")
         return _safe_json(assembled_content)
 
@@ -410,10 +532,35 @@ def plan_with_regex(user_text: str) -> dict:
 # ---------------------------------------------------------------------
 #  Public entry point used by dispatcher
 # ---------------------------------------------------------------------
+@tracing.traced("planner.plan")
 def plan(user_text: str) -> dict:
+    if USE_FAST_ROUTER:
+        # Imported here: intent_router builds on this module's regexes
+        import intent_router
+        routed = intent_router.route(user_text)
+        if routed:
+            print(f"Planner: fast path '{routed['route']}' (confidence {routed['confidence']:.2f})")
+            tracing.annotate(source="fast_path", route=routed["route"])
+            return routed["plan"]
+
     if USE_OLLAMA:
+        key = None
+        if PLAN_CACHE_ENABLED:
+            import plan_cache
+            key = plan_cache.make_key(user_text, get_context())
+            cached = plan_cache.get(key)
+            if cached:
+                print("Planner: plan cache hit")
+                tracing.annotate(source="plan_cache")
+                return cached
         try:
-            return plan_with_ollama(user_text)
+            decision = plan_with_ollama(user_text)
+            tracing.annotate(source="llm")
+            # Only LLM plans are memoized; the regex fallback below is never cached
+            if key:
+                plan_cache.put(key, decision)
+            return decision
         except Exception as e:
             print(f"Planner: Ollama failed with error: {e}")
+    tracing.annotate(source="regex")
     return plan_with_regex(user_text)
@@ -0,0 +1,58 @@
+# sentence_stream.py
+"""
+Turns a token stream into complete sentences.
+
+Used by the voice path to hand the first sentence of a streamed answer to TTS
+while the rest is still being generated.
+"""
+import re
+
+# Sentence end: . ! ? (optionally followed by quotes/brackets) then whitespace.
+# Citation markers like "[1]" stay attached to the sentence they follow.
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*(?:\s*\[\d+\])*\s+")
+
+# "e.g. ", "Dr. ", "J. " are not sentence ends
+_NON_TERMINAL_RE = re.compile(r"\b(?:e\.g|i\.e|etc|vs|mr|mrs|ms|dr|st|no|[a-z])\.$", re.IGNORECASE)
+
+_CITATION_RE = re.compile(r"\s*\[\d+(?:\s*,\s*\d+)*\]")
+
+def strip_citations(text: str) -> str:
+    """Remove inline [n] markers (they should not be read aloud)."""
+    return _CITATION_RE.sub("", text)
+
+class SentenceBuffer:
+    """
+    Accumulates streamed text and releases whole sentences.
+
+    Args:
+        min_chars: Sentences shorter than this are merged with the next one,
+                   so TTS is not started for a lone "Yes."
+    """
+
+    def __init__(self, min_chars: int = 20):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        """Add text; returns the sentences completed by it (possibly none)."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END_RE.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if _NON_TERMINAL_RE.search(self._buffer[start:match.start() + 1].rstrip()):
+                continue
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """Whatever is left (an unterminated last sentence)."""
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
+
+    def clear(self):
+        self._buffer = ""
@@ -0,0 +1,161 @@
+# speculative.py
+"""
+Speculative tool prefetch.
+
+While the planner LLM is still deciding, the utterance alone is usually enough
+to guess the tool ("weather in paris" -> get_weather). start() runs that guess
+in the background: the full weather lookup, a geocode for time queries, or a
+raw web query that lands in the search cache. The dispatcher adopts the result
+if the real plan matches and the rest is discarded.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import SPECULATIVE_MAX_WORKERS, SPECULATIVE_ADOPT_TIMEOUT
+import intent_router
+from tools_geo import geocode_location
+from tool_weather import get_weather
+from web_retrieval.search_client import execute_web_query
+from web_retrieval.cache import set_search_cache
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR = ThreadPoolExecutor(max_workers=SPECULATIVE_MAX_WORKERS, thread_name_prefix="speculative")
+
+# Factual-looking questions the router has no rule for are most likely search_web
+_SEARCH_HINT_RE = re.compile(
+    r"^(?:who|what|when|where|which|how much|how many|how tall|how old|latest|news|current)\b"
+)
+
+# ---------------------------------------------------------------------
+#  Stats
+# ---------------------------------------------------------------------
+_stats_lock = threading.Lock()
+_stats = {"started": 0, "jobs": 0, "hits": 0, "misses": 0, "wasted": 0, "cancelled": 0, "errors": 0}
+
+def _bump(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+def get_stats() -> dict:
+    """Counters plus hit rate over jobs that finished one way or the other."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    settled = snapshot["hits"] + snapshot["wasted"] + snapshot["cancelled"]
+    snapshot["hit_rate"] = round(snapshot["hits"] / settled, 3) if settled else 0.0
+    return snapshot
+
+def reset_stats():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+# ---------------------------------------------------------------------
+#  Jobs
+# ---------------------------------------------------------------------
+def _norm(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+def _job_key(name: str, args: dict):
+    if name in ("get_weather", "get_time_in"):
+        return name, _norm(args.get("place"))
+    if name == "search_web":
+        return name, _norm(args.get("query"))
+    return None
+
+def _warm_search(query: str):
+    results = execute_web_query(query)
+    set_search_cache(query, results)
+    return results
+
+def _submit(name: str, args: dict):
+    """Start one speculative job. Returns (kind, future) or None."""
+    if name == "get_weather" and args.get("place"):
+        # Same call the dispatcher would make, so the result itself is adoptable
+        return "result", _EXECUTOR.submit(get_weather, args["place"])
+    if name == "get_time_in" and args.get("place"):
+        # The time must be read when answering; only the geocode lookup is prefetched
+        return "warm", _EXECUTOR.submit(geocode_location, args["place"])
+    if name == "search_web" and args.get("query"):
+        return "warm", _EXECUTOR.submit(_warm_search, _norm(args["query"]))
+    return None
+
+def predict_calls(user_text: str) -> list:
+    """Tool calls worth prefetching for this utterance (may be empty)."""
+    guess = intent_router.predict(user_text)
+    if guess:
+        plan = guess["plan"]
+        if plan.get("action") == "call_tool":
+            return [{"name": plan["name"], "args": plan.get("args", {})}]
+        if plan.get("action") == "call_tools":
+            return list(plan.get("calls", []))
+        return []
+
+    text = intent_router.normalize(user_text)
+    if _SEARCH_HINT_RE.match(text) and not any(w in text.split() for w in intent_router.REFERENCE_WORDS):
+        return [{"name": "search_web", "args": {"query": text}}]
+    return []
+
+class Speculation:
+    """Background jobs for one utterance, waiting to be adopted or discarded."""
+
+    def __init__(self, calls: list):
+        self.jobs = {}
+        for call in calls:
+            key = _job_key(call.get("name"), call.get("args", {}))
+            if key is None or key in self.jobs:
+                continue
+            submitted = _submit(call["name"], call.get("args", {}))
+            if submitted:
+                self.jobs[key] = submitted
+        _bump("jobs", len(self.jobs))
+
+    def adopt(self, name: str, args: dict, timeout: float = None):
+        """
+        Claim the speculative job matching this tool call.
+
+        Returns (True, result) when a finished "result" job can stand in for the
+        call. Returns (False, None) otherwise; for "warm" jobs this first waits for
+        the prefetch so the caller's own call hits the warmed cache.
+        """
+        key = _job_key(name, args)
+        job = self.jobs.pop(key, None) if key else None
+        if job is None:
+            if key is not None:
+                _bump("misses")
+            return False, None
+
+        kind, future = job
+        wait = SPECULATIVE_ADOPT_TIMEOUT if timeout is None else timeout
+        try:
+            result = future.result(timeout=wait)
+        except Exception as e:
+            logger.info(f"Speculative {name} not usable: {e}")
+            _bump("errors")
+            return False, None
+
+        _bump("hits")
+        if kind == "result":
+            return True, result
+        return False, None
+
+    def finish(self):
+        """Drop jobs the plan did not use."""
+        for kind, future in self.jobs.values():
+            if future.cancel():
+                _bump("cancelled")
+            else:
+                _bump("wasted")
+        self.jobs.clear()
+
+def start(user_text: str) -> Speculation:
+    """Kick off prefetch for the predicted tool calls of an utterance."""
+    _bump("started")
+    try:
+        calls = predict_calls(user_text)
+    except Exception as e:
+        logger.warning(f"Speculative prediction failed: {e}")
+        calls = []
+    return Speculation(calls)
@@ -0,0 +1,173 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import dispatcher
+import llm_scheduler
+import tool_registry
+
+
+def _patch_executor(name, fn=None, **kwargs):
+    if fn is None:
+        fn = mock.Mock(**kwargs)
+    return mock.patch.object(tool_registry.get_tool(name), "executor", fn)
+
+
+def _slow(delay, value):
+    def fn(*args, **kwargs):
+        time.sleep(delay)
+        return value
+    return fn
+
+
+class TestMultiToolCalls(unittest.TestCase):
+    """call_tools plans run concurrently and merge in plan order"""
+
+    CALLS = [
+        {"name": "get_time_in", "args": {"place": "new york"}},
+        {"name": "get_weather", "args": {"place": "new york"}},
+    ]
+
+    def setUp(self):
+        tool_registry.clear_cache()
+
+    def test_concurrent_in_plan_order(self):
+        """Latency is max() of the tools, results keep plan order"""
+        time_res = {"place": "New York", "human": "10:00"}
+        weather_res = {"place": "New York", "weather_desc": "clear", "temperature_c": 20.0}
+        with _patch_executor("get_time_in", _slow(0.3, time_res)), \
+             _patch_executor("get_weather", _slow(0.1, weather_res)):
+            t0 = time.monotonic()
+            results = dispatcher.run_tool_calls(self.CALLS)
+            elapsed = time.monotonic() - t0
+
+        self.assertLess(elapsed, 0.38)
+        self.assertEqual([name for name, _ in results], ["get_time_in", "get_weather"])
+        self.assertEqual(results[0][1], "In New York, the time is 10:00.")
+        self.assertTrue(results[1][1].startswith("Weather in New York: clear"))
+
+    def test_slow_tool_gives_partial_result(self):
+        """A call past its deadline is dropped; the others still answer"""
+        time_res = {"place": "New York", "human": "10:00"}
+        with _patch_executor("get_time_in", _slow(0.0, time_res)), \
+             _patch_executor("get_weather", _slow(0.5, {})), \
+             mock.patch.object(tool_registry.get_tool("get_weather"), "timeout", 0.1):
+            results = dispatcher.run_tool_calls(self.CALLS)
+
+        self.assertEqual(results[0][1], "In New York, the time is 10:00.")
+        self.assertEqual(results[1], ("get_weather", None))
+
+    def test_deadline_counts_from_start(self):
+        """Time spent queued for a worker does not count against a call's timeout"""
+        time_res = {"place": "New York", "human": "10:00"}
+        pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        with mock.patch.object(dispatcher, "_TOOL_EXECUTOR", pool), \
+             _patch_executor("get_time_in", _slow(0.3, time_res)), \
+             _patch_executor("get_weather", _slow(0.0, {"place": "NY", "weather_desc": "rain"})), \
+             mock.patch.object(tool_registry.get_tool("get_weather"), "timeout", 0.2):
+            results = dispatcher.run_tool_calls(self.CALLS)
+
+        self.assertEqual(results[1][1], "Weather in NY: rain.")
+
+    def test_abandoned_call_counted(self):
+        """A call still running at its deadline is counted until it returns"""
+        tool_registry.reset_stats()
+        release = threading.Event()
+
+        def stuck(*args, **kwargs):
+            release.wait(2)
+            return {}
+
+        with _patch_executor("get_time_in", _slow(0.0, {"place": "NY", "human": "10:00"})), \
+             _patch_executor("get_weather", stuck), \
+             mock.patch.object(tool_registry.get_tool("get_weather"), "timeout", 0.1):
+            results = dispatcher.run_tool_calls(self.CALLS)
+            stats = tool_registry.get_stats()["get_weather"]
+            self.assertEqual(results[1], ("get_weather", None))
+            self.assertEqual((stats["timeouts"], stats["abandoned"], stats["abandoned_running"]), (1, 1, 1))
+            release.set()
+            deadline = time.monotonic() + 2
+            while tool_registry.get_stats()["get_weather"]["abandoned_running"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(tool_registry.get_stats()["get_weather"]["abandoned_running"], 0)
+
+    def test_failed_tool_is_skipped(self):
+        """Exceptions are contained to their own call"""
+        with _patch_executor("get_time_in", side_effect=RuntimeError("boom")), \
+             _patch_executor("get_weather", _slow(0.0, {"place": "NY", "weather_desc": "rain"})):
+            results = dispatcher.run_tool_calls(self.CALLS)
+
+        self.assertIsNone(results[0][1])
+        self.assertEqual(results[1][1], "Weather in NY: rain.")
+
+
+class TestCancelledTurn(unittest.TestCase):
+    """A cancelled turn still discards its speculative work"""
+
+    def test_tool_cancelled_finishes_speculation(self):
+        speculation = mock.Mock()
+        speculation.adopt.return_value = (False, None)
+        plan = {"action": "call_tool", "name": "get_weather", "args": {"place": "oslo"}}
+        with mock.patch.object(dispatcher.config, "SPECULATIVE_PREFETCH", True), \
+             mock.patch.object(dispatcher.speculative, "start", return_value=speculation), \
+             mock.patch.object(dispatcher, "plan", return_value=plan), \
+             _patch_executor("get_weather", side_effect=llm_scheduler.Cancelled("superseded")):
+            with self.assertRaises(llm_scheduler.Cancelled):
+                dispatcher.handle_user_text("weather in oslo")
+        speculation.finish.assert_called_once_with()
+
+
+class TestToolRegistry(unittest.TestCase):
+    """Specs validate args, cache results and count latency uniformly"""
+
+    def setUp(self):
+        tool_registry.clear_cache()
+        tool_registry.reset_stats()
+
+    def test_validate(self):
+        """Required args are stripped; missing ones reject the call"""
+        spec = tool_registry.get_tool("get_weather")
+        self.assertEqual(spec.validate({"place": "  Paris "}), {"place": "Paris"})
+        self.assertIsNone(spec.validate({"place": "  "}))
+        self.assertIsNone(spec.validate(None))
+        self.assertEqual(tool_registry.get_tool("get_time").validate({}), {})
+
+    def test_cacheable_result_reused(self):
+        """A cacheable tool runs once for repeated args"""
+        res = {"place": "Paris", "weather_desc": "clear"}
+        with _patch_executor("get_weather", return_value=res) as executor:
+            spec = tool_registry.get_tool("get_weather")
+            first = spec.call({"place": "Paris"})
+            second = spec.call({"place": "paris"})
+        self.assertEqual(first, second)
+        self.assertEqual(executor.call_count, 1)
+        stats = tool_registry.get_stats()["get_weather"]
+        self.assertEqual((stats["calls"], stats["cache_hits"]), (2, 1))
+
+    def test_errors_counted(self):
+        """Executor exceptions propagate and are recorded"""
+        with _patch_executor("search_arxiv", side_effect=RuntimeError("down")):
+            with self.assertRaises(RuntimeError):
+                tool_registry.get_tool("search_arxiv").call({"query": "llm"})
+        self.assertEqual(tool_registry.get_stats()["search_arxiv"]["errors"], 1)
+
+    def test_no_slot_before_deadline(self):
+        """A call whose concurrency class stays full past its deadline never starts"""
+        full = threading.BoundedSemaphore(1)
+        full.acquire()
+        with mock.patch.dict(tool_registry._SEMAPHORES, {"web": full}), \
+             _patch_executor("search_arxiv", return_value=[]) as executor:
+            with self.assertRaises(TimeoutError):
+                tool_registry.get_tool("search_arxiv").call({"query": "llm"}, deadline=time.monotonic() + 0.05)
+        executor.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+import intent_router
+
+
+class TestIntentRouter(unittest.TestCase):
+    """Fast-path routes must emit the same plan shapes as the LLM planner"""
+
+    def setUp(self):
+        intent_router.reset_stats()
+
+    def test_greeting_and_capabilities(self):
+        """Whole-utterance phrases become final replies"""
+        self.assertEqual(intent_router.route("Hello!")["plan"]["action"], "final")
+        self.assertEqual(intent_router.route("what can you do")["route"], "capabilities")
+        self.assertIsNone(intent_router.route("hello how do i fix my bike"))
+
+    def test_time_and_weather(self):
+        """Time/weather routes extract the place"""
+        self.assertEqual(
+            intent_router.route("what time is it")["plan"],
+            {"action": "call_tool", "name": "get_time", "args": {}},
+        )
+        self.assertEqual(
+            intent_router.route("weather in singapore")["plan"],
+            {"action": "call_tool", "name": "get_weather", "args": {"place": "singapore"}},
+        )
+        plan = intent_router.route("what's the time and weather in new york")["plan"]
+        self.assertEqual(plan["action"], "call_tools")
+        self.assertEqual([c["name"] for c in plan["calls"]], ["get_time_in", "get_weather"])
+        self.assertEqual(plan["calls"][0]["args"], {"place": "new york"})
+        plan = intent_router.route("time and weather in rome")["plan"]
+        self.assertEqual([c["name"] for c in plan["calls"]], ["get_time_in", "get_weather"])
+        self.assertEqual(
+            intent_router.route("what time is it in tokyo")["plan"],
+            {"action": "call_tool", "name": "get_time_in", "args": {"place": "tokyo"}},
+        )
+
+    def test_falls_through_when_unsure(self):
+        """References to earlier turns and open questions go to the LLM"""
+        for text in [
+            "what's the weather there",
+            "weather in paris tomorrow",
+            "what time does the store close in paris",
+            "who is elon musk",
+            "show me how to tie a tie",
+            "fastest marathon time in history",
+            "show me pictures of it",
+            "find papers on it",
+            "what is the time difference in london",
+            "what's the time zone in tokyo",
+        ]:
+            self.assertIsNone(intent_router.route(text), text)
+
+    def test_images_and_arxiv(self):
+        """Explicit image and paper requests"""
+        self.assertEqual(
+            intent_router.route("show me a picture of a cat")["plan"]["args"], {"query": "cat"}
+        )
+        self.assertEqual(
+            intent_router.route("search arxiv for black holes")["plan"]["name"], "search_arxiv"
+        )
+
+    def test_stats(self):
+        """Hit rate is tracked per route"""
+        intent_router.route("hello")
+        intent_router.route("who is elon musk")
+        stats = intent_router.get_stats()
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["routes"]["greeting"]["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,252 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+import llm_scheduler
+import ollama_client
+from benchmarks.stub_ollama import StubOllama
+
+
+def _limits(max_in_flight, reserved=0, background=1):
+    return [
+        mock.patch.object(llm_scheduler.config, "LLM_MAX_IN_FLIGHT", max_in_flight),
+        mock.patch.object(llm_scheduler.config, "LLM_RESERVED_INTERACTIVE", reserved),
+        mock.patch.object(llm_scheduler.config, "LLM_MAX_BACKGROUND", background),
+    ]
+
+
+class _SchedulerCase(unittest.TestCase):
+    LIMITS = (1, 0, 1)
+
+    def setUp(self):
+        for p in _limits(*self.LIMITS):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _queue(self, priority, label, admitted, channel=None):
+        """Start a thread that waits for a slot (inside a turn on `channel`) and records its label once admitted."""
+        def wait_for_slot():
+            ticket = llm_scheduler.open_ticket(priority, label)
+            try:
+                slot = llm_scheduler.acquire(ticket)
+            except llm_scheduler.Cancelled:
+                admitted.append(f"{label}:cancelled")
+                return
+            finally:
+                llm_scheduler.close_ticket(ticket)
+            admitted.append(label)
+            llm_scheduler.release(slot)
+
+        def run():
+            if channel is None:
+                return wait_for_slot()
+            with llm_scheduler.turn(channel):
+                wait_for_slot()
+
+        before = sum(llm_scheduler.get_status()["queued"].values())
+        t = threading.Thread(target=run)
+        t.start()
+        # wait until it is queued (or was admitted straight away)
+        deadline = time.monotonic() + 2
+        while t.is_alive() and time.monotonic() < deadline:
+            if sum(llm_scheduler.get_status()["queued"].values()) > before:
+                break
+            time.sleep(0.005)
+        return t
+
+
+class TestPriorities(_SchedulerCase):
+    """Waiting requests start in class order; limits keep a slot for the planner"""
+
+    def test_class_order(self):
+        holder = llm_scheduler.open_ticket("background", "brainstorm")
+        slot = llm_scheduler.acquire(holder)
+        admitted = []
+        threads = [
+            self._queue("background", "background", admitted),
+            self._queue("answer", "answer", admitted),
+            self._queue("interactive", "planner", admitted),
+        ]
+        llm_scheduler.release(slot)
+        llm_scheduler.close_ticket(holder)
+        for t in threads:
+            t.join(2)
+        self.assertEqual(admitted, ["planner", "answer", "background"])
+
+
+class TestLimits(_SchedulerCase):
+    LIMITS = (2, 1, 1)
+
+    def test_reserved_interactive_slot(self):
+        first = llm_scheduler.open_ticket("answer", "answer")
+        slot = llm_scheduler.acquire(first)
+        admitted = []
+        waiting = self._queue("answer", "answer-2", admitted)
+        planner = self._queue("interactive", "planner", admitted)
+        planner.join(2)
+        self.assertEqual(admitted, ["planner"])
+        llm_scheduler.release(slot)
+        llm_scheduler.close_ticket(first)
+        waiting.join(2)
+        self.assertEqual(admitted, ["planner", "answer-2"])
+
+    def test_background_limit(self):
+        with mock.patch.object(llm_scheduler.config, "LLM_MAX_IN_FLIGHT", 3):
+            first = llm_scheduler.open_ticket("background", "brainstorm")
+            slot = llm_scheduler.acquire(first)
+            admitted = []
+            second = self._queue("background", "brainstorm-2", admitted)
+            answer = self._queue("answer", "answer", admitted)
+            answer.join(2)
+            self.assertEqual(admitted, ["answer"])
+            llm_scheduler.release(slot)
+            llm_scheduler.close_ticket(first)
+            second.join(2)
+        self.assertEqual(admitted, ["answer", "brainstorm-2"])
+
+    def test_warmup_has_own_allowance(self):
+        """Model loads run side by side, past the background and in-flight limits"""
+        held = [llm_scheduler.open_ticket(p, p) for p in ("interactive", "interactive", "warmup", "warmup")]
+        admitted = []
+        with mock.patch.object(llm_scheduler.config, "LLM_MAX_WARMUP", 2):
+            slots = [llm_scheduler.acquire(t) for t in held]  # would block if warm-ups shared the limits
+            third = self._queue("warmup", "load-3", admitted)
+            self.assertEqual(llm_scheduler.get_status()["queued"]["warmup"], 1)
+            llm_scheduler.release(slots.pop())
+            third.join(2)
+        self.assertEqual(admitted, ["load-3"])
+        for slot in slots:
+            llm_scheduler.release(slot)
+        for ticket in held:
+            llm_scheduler.close_ticket(ticket)
+        self.assertEqual(sum(llm_scheduler.get_status()["in_flight"].values()), 0)
+
+class TestTurns(_SchedulerCase):
+    """A new turn or cancel() aborts the old turn's queued requests and any it makes later"""
+
+    def test_cancel_queued(self):
+        holder = llm_scheduler.open_ticket("interactive", "holder")
+        slot = llm_scheduler.acquire(holder)
+        admitted = []
+        voice = self._queue("answer", "voice", admitted, channel="voice")
+        web = self._queue("answer", "web", admitted, channel="web:1")
+        self.assertEqual(llm_scheduler.cancel("voice"), 1)
+        voice.join(2)
+        self.assertEqual(admitted, ["voice:cancelled"])
+        self.assertEqual(llm_scheduler.get_status()["queued"]["answer"], 1)
+        llm_scheduler.release(slot)
+        llm_scheduler.close_ticket(holder)
+        web.join(2)
+        self.assertEqual(admitted, ["voice:cancelled", "web"])
+
+    def test_new_turn_supersedes(self):
+        started, go_on = threading.Event(), threading.Event()
+        outcome = []
+
+        def old_command():
+            with llm_scheduler.turn("web:1"):
+                started.set()
+                go_on.wait(2)
+                # the next LLM call of a superseded turn never starts
+                ticket = llm_scheduler.open_ticket("answer", "answer")
+                try:
+                    llm_scheduler.acquire(ticket)
+                except llm_scheduler.Cancelled:
+                    outcome.append("cancelled")
+                finally:
+                    llm_scheduler.close_ticket(ticket)
+
+        t = threading.Thread(target=old_command)
+        t.start()
+        started.wait(2)
+        with llm_scheduler.turn("web:2"):
+            pass
+        with llm_scheduler.turn("web:1") as new_turn:
+            self.assertFalse(new_turn.cancelled)
+            go_on.set()
+            t.join(2)
+        self.assertEqual(outcome, ["cancelled"])
+
+    def test_requests_outside_turns_not_cancelled(self):
+        ticket = llm_scheduler.open_ticket("background", "warmup")
+        llm_scheduler.cancel()
+        self.assertFalse(ticket.cancelled)
+        llm_scheduler.close_ticket(ticket)
+
+
+class TestStreamCancellation(unittest.TestCase):
+    """Cancelling a turn closes its Ollama stream and frees the slot"""
+
+    def setUp(self):
+        ollama_client.reset_metrics()
+        self.stub = StubOllama(time_scale=1.0).start()
+        self.addCleanup(self.stub.stop)
+
+    def _stream_in_turn(self, channel, prompt, on_first=None):
+        """Stream a generation inside a turn; returns (text, cancelled, seconds)."""
+        result = {}
+
+        def run():
+            parts, started = [], time.monotonic()
+            try:
+                with llm_scheduler.turn(channel):
+                    ollama_client.stream_generate(prompt, lambda t: (parts.append(t), on_first and on_first()),
+                                                  task="answer", base_url=self.stub.url)
+                result.update(cancelled=False)
+            except llm_scheduler.Cancelled:
+                result.update(cancelled=True)
+            result.update(text="".join(parts), seconds=time.monotonic() - started)
+
+        t = threading.Thread(target=run)
+        t.start()
+        return t, result
+
+    def test_cancel_mid_stream(self):
+        first = threading.Event()
+        t, result = self._stream_in_turn("voice", "hello", on_first=first.set)
+        self.assertTrue(first.wait(5))
+        self.assertEqual(llm_scheduler.cancel("voice"), 1)
+        t.join(5)
+        self.assertTrue(result["cancelled"])
+        self.assertLess(len(result["text"]), len(self.stub.answer_for("hello", False)))
+        self.assertEqual(sum(llm_scheduler.get_status()["in_flight"].values()), 0)
+        deadline = time.monotonic() + 2
+        while not self.stub.stats["disconnects"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.stub.stats["disconnects"], 1)
+
+    def test_cancel_wakes_blocked_read(self):
+        """A read waiting on a slow token is woken by the cancel, not waited out"""
+        self.stub.gen_ms = 600.0
+        first = threading.Event()
+        t, result = self._stream_in_turn("voice", "hello", on_first=first.set)
+        self.assertTrue(first.wait(5))
+        cancelled_at = time.monotonic()
+        llm_scheduler.cancel("voice")
+        t.join(5)
+        self.assertTrue(result["cancelled"])
+        self.assertLess(time.monotonic() - cancelled_at, 0.4)
+
+    def test_cancel_one_coalesced_member(self):
+        """The other turn sharing the generation still gets all of it"""
+        first = threading.Event()
+        with mock.patch.object(ollama_client.config, "OLLAMA_COALESCE", True):
+            voice, voice_result = self._stream_in_turn("voice", "hello", on_first=first.set)
+            web, web_result = self._stream_in_turn("web:1", "hello")
+            self.assertTrue(first.wait(5))
+            llm_scheduler.cancel("voice")
+            voice.join(5)
+            web.join(5)
+        self.assertTrue(voice_result["cancelled"])
+        self.assertFalse(web_result["cancelled"])
+        self.assertEqual(web_result["text"], self.stub.answer_for("hello", False))
+        self.assertEqual(self.stub.stats["requests"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import unittest
+from unittest import mock
+
+import model_warmup
+import ollama_client
+from benchmarks.stub_ollama import StubOllama
+
+
+class TestModelWarmup(unittest.TestCase):
+    """Models are preloaded, re-pinged when idle and reported with /api/ps state"""
+
+    def setUp(self):
+        self.stub = StubOllama(model="warm-model", time_scale=0).start()
+        patches = [
+            mock.patch.object(ollama_client.config, "OLLAMA_URL", self.stub.url),
+            mock.patch.object(model_warmup.config, "OLLAMA_WARMUP_MODELS", ["warm-model"]),
+            mock.patch.dict(model_warmup._status, {"running": False, "pings": 0, "errors": 0, "models": {}}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(self.stub.stop)
+        self.addCleanup(model_warmup.stop, 2)
+
+    def test_preload_with_empty_prompt(self):
+        self.assertTrue(model_warmup.load("warm-model"))
+        self.assertIn("warm-model", self.stub.loaded)
+        self.assertEqual(self.stub.stats["eval_tokens"], 0)
+        status = model_warmup.get_status()
+        info = status["models"]["warm-model"]
+        self.assertEqual((info["state"], info["resident"]), ("loaded", True))
+        self.assertIn("load_ms", info)
+
+    def test_pings_only_when_idle(self):
+        with mock.patch.object(ollama_client, "idle_seconds", return_value=0.0):
+            model_warmup.start(interval=0.05)
+            time.sleep(0.3)
+        self.assertEqual(model_warmup.get_status(refresh=False)["pings"], 1)  # the initial load only
+
+        model_warmup.stop(2)
+        model_warmup.start(interval=0.05)
+        time.sleep(0.3)
+        self.assertGreaterEqual(model_warmup.get_status(refresh=False)["pings"], 2)
+
+    def test_ping_due_interval_after_last_answer(self):
+        """Traffic partway through an interval moves the next ping, it does not skip a whole interval"""
+        idle = iter([0.25])
+        with mock.patch.object(ollama_client, "idle_seconds", side_effect=lambda: next(idle, 10.0)):
+            model_warmup.start(interval=0.3)
+            time.sleep(0.48)  # a ping skipped until the next wake-up would come at 0.6s
+        self.assertEqual(model_warmup.get_status(refresh=False)["pings"], 2)
+
+    def test_unreachable_ollama(self):
+        with mock.patch.object(ollama_client.config, "OLLAMA_URL", "http://127.0.0.1:9"), \
+             mock.patch.object(ollama_client.config, "OLLAMA_RETRIES", 0):
+            self.assertFalse(model_warmup.load("warm-model"))
+            status = model_warmup.get_status()
+        self.assertEqual(status["models"]["warm-model"]["state"], "error")
+        self.assertEqual(status["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
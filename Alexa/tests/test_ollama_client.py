@@ -0,0 +1,190 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import ollama_client
+from benchmarks.stub_ollama import StubOllama
+
+
+class TestOllamaClient(unittest.TestCase):
+    """Shared payload defaults, retries and per-caller metrics"""
+
+    def setUp(self):
+        ollama_client.reset_metrics()
+
+    def test_payload_defaults(self):
+        payload = ollama_client.build_payload(options={"temperature": 0.7}, prompt="hi")
+        self.assertEqual(payload["options"], {"num_ctx": ollama_client.config.OLLAMA_NUM_CTX, "temperature": 0.7})
+        self.assertEqual(payload["prompt"], "hi")
+        if ollama_client.config.OLLAMA_KEEP_ALIVE:
+            self.assertEqual(payload["keep_alive"], ollama_client.config.OLLAMA_KEEP_ALIVE)
+        self.assertNotIn("keep_alive", ollama_client.build_payload(keep_alive="", prompt="hi"))
+
+    def test_metrics_recorded(self):
+        with StubOllama(answers={"hello": "Hi there, friend."}, time_scale=0) as stub:
+            reply = ollama_client.chat([{"role": "user", "content": "hello"}], caller="test", base_url=stub.url)
+            text = ollama_client.stream_generate("hello", lambda t: None, caller="test", base_url=stub.url)
+        self.assertEqual(reply["message"]["content"], "Hi there, friend.")
+        self.assertEqual(text, "Hi there, friend.")
+        metrics = ollama_client.get_metrics()["test"]
+        self.assertEqual(metrics["calls"], 2)
+        self.assertEqual(metrics["eval_count"], 10)
+        self.assertGreater(metrics["prompt_eval_count"], 0)
+
+    def test_early_exit_closes_stream(self):
+        """Leaving the stream block early is fine; no final chunk, no token counts"""
+        with StubOllama(time_scale=0) as stub:
+            payload = ollama_client.build_payload(prompt="hello")
+            with ollama_client.stream("/api/generate", payload, caller="test", base_url=stub.url) as chunks:
+                first = next(chunks)
+        self.assertIn("response", first)
+        self.assertEqual(ollama_client.get_metrics()["test"]["eval_count"], 0)
+
+    def test_retries_then_succeeds(self):
+        ok = mock.Mock(status_code=200)
+        ok.iter_lines.return_value = [json.dumps({"response": "fine", "done": True, "eval_count": 1})]
+        busy = mock.Mock(status_code=503)
+        post = mock.Mock(side_effect=[requests.ConnectionError("refused"), busy, ok])
+        with mock.patch.object(ollama_client._SESSION, "post", post), \
+             mock.patch.object(ollama_client.config, "OLLAMA_RETRY_BACKOFF", 0):
+            data = ollama_client.generate("hi", caller="test")
+        self.assertEqual(data["response"], "fine")
+        self.assertEqual(post.call_count, 3)
+        self.assertEqual(ollama_client.get_metrics()["test"]["retries"], 2)
+
+    def test_gives_up_after_retries(self):
+        post = mock.Mock(side_effect=requests.ConnectionError("refused"))
+        with mock.patch.object(ollama_client._SESSION, "post", post), \
+             mock.patch.object(ollama_client.config, "OLLAMA_RETRY_BACKOFF", 0), \
+             mock.patch.object(ollama_client.config, "OLLAMA_RETRIES", 1):
+            with self.assertRaises(requests.ConnectionError):
+                ollama_client.generate("hi", caller="test")
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(ollama_client.get_metrics()["test"]["errors"], 1)
+
+
+class TestTaskProfiles(unittest.TestCase):
+    """Per-task models: each model gets one num_ctx, the largest its tasks need"""
+
+    PROFILES = {
+        "planner": ("small", 2048, 0.0),
+        "query_planner": ("small", 4096, 0.2),
+        "answer": ("large", 8192, 0.3),
+    }
+
+    def setUp(self):
+        patcher = mock.patch.object(ollama_client.config, "MODEL_PROFILES", self.PROFILES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_task_profile(self):
+        self.assertEqual(ollama_client.task_profile("planner"), ("small", {"temperature": 0.0, "num_ctx": 4096}))
+        self.assertEqual(ollama_client.task_profile("answer"), ("large", {"temperature": 0.3, "num_ctx": 8192}))
+        model, options = ollama_client.task_profile("unknown")
+        self.assertEqual(model, ollama_client.config.OLLAMA_MODEL)
+        self.assertNotIn("temperature", options)
+
+    def test_task_models(self):
+        self.assertEqual(ollama_client.task_models(), ["small", "large"])
+
+    def test_task_routes_request(self):
+        sent = mock.Mock(return_value={})
+        with mock.patch.object(ollama_client, "request", sent):
+            ollama_client.generate("hello", task="planner", options={"temperature": 0.5})
+            ollama_client.generate("hello", task="answer", model="override")
+        _, first, caller = sent.call_args_list[0][0][:3]
+        second = sent.call_args_list[1][0][1]
+        self.assertEqual(first["model"], "small")
+        self.assertEqual(first["options"], {"temperature": 0.5, "num_ctx": 4096})
+        self.assertEqual(caller, "planner")
+        self.assertEqual(second["model"], "override")
+
+class TestCoalescing(unittest.TestCase):
+    """Identical concurrent requests share one upstream generation"""
+
+    def setUp(self):
+        ollama_client.reset_metrics()
+        patcher = mock.patch.object(ollama_client.config, "OLLAMA_COALESCE", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _together(self, fns):
+        """Run the callables at the same moment; returns their results (or exceptions) in order."""
+        barrier = threading.Barrier(len(fns))
+        results = [None] * len(fns)
+
+        def run(i, fn):
+            barrier.wait()
+            try:
+                results[i] = fn()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i, fn)) for i, fn in enumerate(fns)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        return results
+
+    def test_identical_requests_share_one_generation(self):
+        with StubOllama(time_scale=0.5) as stub:
+            call = lambda: ollama_client.generate("hello", caller="test", base_url=stub.url)["response"]
+            results = self._together([call] * 4)
+        self.assertEqual(len(set(results)), 1)
+        self.assertIn("stub answer", results[0])
+        self.assertEqual(stub.stats["requests"], 1)
+        metrics = ollama_client.get_metrics()["test"]
+        self.assertEqual((metrics["calls"], metrics["coalesced"]), (1, 3))
+        self.assertEqual(ollama_client.in_flight(), 0)
+
+    def test_streaming_fan_out(self):
+        """Every waiter sees every chunk; one leaving early does not cut off the rest"""
+        def early_exit():
+            payload = ollama_client.build_payload(prompt="hello")
+            with ollama_client.stream("/api/generate", payload, caller="test", base_url=stub.url) as chunks:
+                return next(chunks)["response"]
+
+        with StubOllama(time_scale=0.5) as stub:
+            full = lambda: ollama_client.stream_generate("hello", lambda t: None, caller="test", base_url=stub.url)
+            results = self._together([full, early_exit, full])
+        self.assertEqual(results[0], "This is a stub answer [1]. It has two sentences [2].")
+        self.assertEqual(results[2], results[0])
+        self.assertTrue(results[0].startswith(results[1]))
+        self.assertEqual(stub.stats["requests"], 1)
+        self.assertEqual(stub.stats["disconnects"], 0)
+
+    def test_different_requests_not_shared(self):
+        with StubOllama(time_scale=0.5) as stub:
+            results = self._together([
+                lambda: ollama_client.generate("hello", options={"temperature": 0.1}, base_url=stub.url),
+                lambda: ollama_client.generate("hello", options={"temperature": 0.9}, base_url=stub.url),
+            ])
+            ollama_client.generate("hello", options={"temperature": 0.1}, base_url=stub.url)
+        self.assertTrue(all(isinstance(r, dict) for r in results))
+        # the third call came after the first finished: a new generation, not a cached one
+        self.assertEqual(stub.stats["requests"], 3)
+
+    def test_leader_error_reaches_waiters(self):
+        def refuse(*args, **kwargs):
+            time.sleep(0.2)
+            raise requests.ConnectionError("refused")
+
+        post = mock.Mock(side_effect=refuse)
+        with mock.patch.object(ollama_client._SESSION, "post", post), \
+             mock.patch.object(ollama_client.config, "OLLAMA_RETRIES", 0):
+            results = self._together([lambda: ollama_client.generate("hi", caller="test")] * 3)
+        self.assertTrue(all(isinstance(r, requests.ConnectionError) for r in results))
+        self.assertEqual(post.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
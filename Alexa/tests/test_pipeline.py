@@ -0,0 +1,597 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from web_retrieval import cache, generation, pipeline, processing, query_expansion
+from benchmarks.stub_ollama import StubOllama
+
+
+def _fake_search(delays):
+    """execute_web_query stand-in: two results per query, one URL shared by all."""
+    def search(query, *args, **kwargs):
+        time.sleep(delays.get(query, 0))
+        return [
+            {"title": query, "url": f"https://example.com/{query}?utm_source=x", "snippet": ""},
+            {"title": "shared", "url": "https://example.com/shared", "snippet": ""},
+        ]
+    return search
+
+
+class TestSearchFanOut(unittest.TestCase):
+    """Planned queries run concurrently and merge deterministically"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(pipeline, "get_search_cache", return_value=None),
+            mock.patch.object(pipeline, "set_search_cache"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_merge_in_plan_order(self):
+        """Slow first query still comes first; duplicates dropped; wall time ~ slowest"""
+        delays = {"a": 0.3, "b": 0.0, "c": 0.1}
+        with mock.patch.object(pipeline, "execute_web_query", _fake_search(delays)):
+            t0 = time.monotonic()
+            candidates = pipeline.search_queries(["a", "b", "c"], deadline=5)
+            elapsed = time.monotonic() - t0
+
+        self.assertLess(elapsed, 0.38)
+        self.assertEqual(
+            [c["url"] for c in candidates],
+            ["https://example.com/a", "https://example.com/shared",
+             "https://example.com/b", "https://example.com/c"],
+        )
+
+    def test_deadline_returns_what_arrived(self):
+        """A query past the deadline is left out and reported"""
+        debug_log = {"errors": []}
+        delays = {"fast": 0.0, "slow": 0.5}
+        with mock.patch.object(pipeline, "execute_web_query", _fake_search(delays)):
+            candidates = pipeline.search_queries(["slow", "fast"], deadline=0.1, debug_log=debug_log)
+
+        self.assertEqual([c["title"] for c in candidates], ["fast", "shared"])
+        self.assertEqual(debug_log["errors"], ["Query timed out: slow"])
+
+
+class TestSearchCache(unittest.TestCase):
+    """Canonical keys, negative entries and per-class TTLs"""
+
+    def setUp(self):
+        patch = mock.patch.object(cache, "SEARCH_CACHE", cache.DummyCache())
+        patch.start()
+        self.addCleanup(patch.stop)
+        cache.reset_stats()
+
+    def test_phrasings_share_an_entry(self):
+        cache.set_search_cache("Eiffel  Tower height ", [{"url": "https://a.example"}])
+        self.assertEqual(cache.get_search_cache("eiffel tower HEIGHT"), [{"url": "https://a.example"}])
+        self.assertEqual(cache.get_stats()["search"]["hits"], 1)
+
+    def test_empty_results_cached_briefly(self):
+        """A failing query is answered from cache until the negative TTL runs out"""
+        search = mock.Mock(return_value=[])
+        with mock.patch.object(pipeline, "execute_web_query", search), \
+             mock.patch.object(cache.config, "SEARCH_NEGATIVE_TTL", 0.2):
+            self.assertEqual(pipeline._run_query("no such thing"), [])
+            self.assertEqual(pipeline._run_query("No such thing"), [])
+            self.assertEqual(search.call_count, 1)
+            time.sleep(0.25)
+            pipeline._run_query("no such thing")
+            self.assertEqual(search.call_count, 2)
+        stats = cache.get_stats()["search"]
+        self.assertEqual((stats["negative_hits"], stats["negative_writes"]), (1, 2))
+
+    def test_force_refresh_bypasses_cache(self):
+        cache.set_search_cache("q", [{"url": "https://old.example"}])
+        with mock.patch.object(pipeline, "execute_web_query", return_value=[{"url": "https://new.example"}]):
+            self.assertEqual(pipeline._run_query("q", force_refresh=True), [{"url": "https://new.example"}])
+        self.assertEqual(cache.get_search_cache("q"), [{"url": "https://new.example"}])
+
+    def test_ttl_by_query_class(self):
+        results = [{"url": "https://a.example"}]
+        self.assertEqual(cache.query_class("latest news on AI"), "news")
+        self.assertEqual(cache.query_class("who invented the telephone"), "evergreen")
+        self.assertEqual(cache.query_class("price of iphone 15"), "default")
+        self.assertEqual(cache.search_ttl("latest news on AI", results), cache.config.SEARCH_TTL_NEWS)
+        self.assertEqual(cache.search_ttl("who invented the telephone", results), cache.config.SEARCH_TTL_EVERGREEN)
+        self.assertEqual(cache.search_ttl("who invented the telephone", []), cache.config.SEARCH_NEGATIVE_TTL)
+
+
+class TestQueryExpansion(unittest.TestCase):
+    """Simple questions get deterministic queries; complex ones go to the LLM planner"""
+
+    def test_expansion(self):
+        year = str(query_expansion.datetime.datetime.now().year)
+        self.assertEqual(
+            query_expansion.expand_queries("Latest Python version?"),
+            ["latest python version", f"latest python version {year}", "latest python version official"],
+        )
+        self.assertEqual(
+            query_expansion.expand_queries("Who is the CEO of Nvidia?"),
+            ["who is the ceo of nvidia", "ceo nvidia official"],
+        )
+
+    def test_simple_vs_complex(self):
+        self.assertTrue(query_expansion.is_simple_question("How tall is the Eiffel Tower?"))
+        self.assertFalse(query_expansion.is_simple_question("Compare Rust and Go for web servers"))
+        self.assertFalse(query_expansion.is_simple_question("Who won? And by how much?"))
+
+    def test_auto_mode_routes(self):
+        """Only complex questions pay for the LLM planner"""
+        with mock.patch.object(query_expansion, "generate_plan", return_value={"queries": ["x", "y"]}) as gp:
+            fast = query_expansion.plan_queries("capital of australia", mode="auto")
+            slow = query_expansion.plan_queries("difference between tcp and udp", mode="auto")
+        self.assertEqual(fast["mode"], "fast")
+        self.assertEqual(slow, {"queries": ["x", "y"], "mode": "llm"})
+        self.assertEqual(gp.call_count, 1)
+
+
+class TestStreamingAnswer(unittest.TestCase):
+    """web_search_answer(on_event=...) streams citations, then tokens"""
+
+    CITATIONS = [{"id": 1, "title": "Example", "url": "https://example.com", "published": None}]
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(pipeline, "plan_queries", return_value={"queries": ["q"], "mode": "fast"}),
+            mock.patch.object(pipeline, "search_queries", return_value=[{"url": "https://example.com", "title": "Example"}]),
+            mock.patch.object(pipeline, "fetch_many", return_value=[{"text": "Paris is the capital of France."}]),
+            mock.patch.object(cache, "ANSWER_CACHE", cache.DummyCache()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _run(self, grounded_tokens, direct_tokens=("Direct answer.",)):
+        def fake_generate(tokens):
+            def generate(*args, on_token=None):
+                for t in tokens:
+                    if on_token:
+                        on_token(t)
+                return "".join(tokens)
+            return generate
+
+        events = []
+        with mock.patch.object(pipeline, "generate_grounded_answer", fake_generate(grounded_tokens)), \
+             mock.patch.object(pipeline, "generate_direct_answer", fake_generate(direct_tokens)):
+            result = pipeline.web_search_answer("capital of france", on_event=lambda k, p: events.append((k, p)))
+        return result, events
+
+    def test_tokens_follow_citations(self):
+        result, events = self._run(["Paris ", "is the capital ", "[1]."])
+        self.assertEqual(events[0], ("citations", {"citations": self.CITATIONS}))
+        streamed = "".join(p["text"] for k, p in events if k == "token")
+        self.assertEqual(streamed, result["answer"])
+        self.assertEqual(result["answer"], "Paris is the capital [1].")
+
+    def test_failure_phrase_never_streamed(self):
+        """A grounded 'couldn't find' answer is swallowed; the fallback streams instead"""
+        result, events = self._run(["I couldn't find ", "sufficient information."])
+        kinds = [k for k, _ in events]
+        self.assertNotIn("reset", kinds)
+        self.assertEqual([p["text"] for k, p in events if k == "token"], ["Direct answer."])
+        self.assertEqual(result["answer"], "Direct answer.")
+        self.assertTrue(result["debug"]["fallback_used"])
+
+    def test_late_failure_resets(self):
+        """If the failure phrase shows up after text was streamed, listeners get a reset"""
+        result, events = self._run(["x" * 80, " context does not contain the answer."])
+        kinds = [k for k, _ in events]
+        self.assertIn("reset", kinds)
+        self.assertEqual(events[-1], ("token", {"text": "Direct answer."}))
+
+    def test_pipeline_failure_resets_and_streams_fallback(self):
+        """A failure after tokens went out resets the listener before the fallback streams"""
+        with mock.patch.object(pipeline, "set_answer_cache", side_effect=RuntimeError("disk full")):
+            result, events = self._run(["x" * 80, " Paris [1]."])
+        kinds = [k for k, _ in events]
+        self.assertIn("reset", kinds)
+        after_reset = [p["text"] for k, p in events[kinds.index("reset"):] if k == "token"]
+        self.assertEqual(after_reset, ["Direct answer."])
+        self.assertEqual(result["answer"], "Direct answer.")
+        self.assertTrue(result["debug"]["fallback_used"])
+
+    def test_broken_stream_falls_back(self):
+        """A grounded stream that breaks midway is reset, replaced and not cached"""
+        def broken_stream(prompt, on_token, **kwargs):
+            on_token("x" * 80)
+            on_token(" Paris is")
+            raise ConnectionError("connection reset")
+
+        events = []
+        with mock.patch.object(generation.ollama_client, "stream_generate", side_effect=broken_stream), \
+             mock.patch.object(pipeline, "generate_direct_answer", return_value="Direct answer."), \
+             mock.patch.object(pipeline, "set_answer_cache") as set_cache:
+            result = pipeline.web_search_answer("capital of france", on_event=lambda k, p: events.append((k, p)))
+        self.assertIn("reset", [k for k, _ in events])
+        self.assertEqual(result["answer"], "Direct answer.")
+        self.assertTrue(result["debug"]["fallback_used"])
+        set_cache.assert_not_called()
+
+
+class TestAnswerCache(unittest.TestCase):
+    """Grounded answers are reused for repeated questions and unchanged sources"""
+
+    def setUp(self):
+        self.plan = mock.Mock(return_value={"queries": ["q"], "mode": "fast"})
+        self.grounded = mock.Mock(return_value="Paris [1].")
+        self.direct = mock.Mock(return_value="Direct answer.")
+        patches = [
+            mock.patch.object(pipeline, "plan_queries", self.plan),
+            mock.patch.object(pipeline, "search_queries", return_value=[{"url": "https://example.com", "title": "Example"}]),
+            mock.patch.object(pipeline, "fetch_many", return_value=[{"text": "Paris is the capital of France."}]),
+            mock.patch.object(pipeline, "generate_grounded_answer", self.grounded),
+            mock.patch.object(pipeline, "generate_direct_answer", self.direct),
+            mock.patch.object(cache, "ANSWER_CACHE", cache.DummyCache()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_repeat_answered_before_search(self):
+        first = pipeline.web_search_answer("Capital of France?")
+        events = []
+        second = pipeline.web_search_answer("capital of  france", on_event=lambda k, p: events.append((k, p)))
+        self.assertEqual(self.plan.call_count, 1)
+        self.assertEqual(self.grounded.call_count, 1)
+        self.assertEqual((second["answer"], second["citations"]), (first["answer"], first["citations"]))
+        self.assertEqual(second["debug"]["answer_cache"], "hit")
+        self.assertEqual([k for k, _ in events], ["citations", "token"])
+
+    def test_force_refresh_regenerates(self):
+        pipeline.web_search_answer("capital of france")
+        pipeline.web_search_answer("capital of france", force_refresh=True)
+        self.assertEqual(self.grounded.call_count, 2)
+
+    def test_unchanged_sources_skip_generation(self):
+        """Once the question entry is gone, identical page content still reuses the answer"""
+        pipeline.web_search_answer("capital of france")
+        for key in [k for k in cache.ANSWER_CACHE._store if k.startswith("answer:q:")]:
+            del cache.ANSWER_CACHE._store[key]
+        result = pipeline.web_search_answer("capital of france")
+        self.assertEqual(self.plan.call_count, 2)
+        self.assertEqual(self.grounded.call_count, 1)
+        self.assertEqual(result["debug"]["answer_cache"], "sources")
+
+        with mock.patch.object(pipeline, "fetch_many", return_value=[{"text": "Paris, France's capital."}]):
+            for key in [k for k in cache.ANSWER_CACHE._store if k.startswith("answer:q:")]:
+                del cache.ANSWER_CACHE._store[key]
+            pipeline.web_search_answer("capital of france")
+        self.assertEqual(self.grounded.call_count, 2)
+
+    def _drop_question_entries(self):
+        for key in [k for k in cache.ANSWER_CACHE._store if k.startswith("answer:q:")]:
+            del cache.ANSWER_CACHE._store[key]
+
+    def test_reordered_sources_regenerate(self):
+        """[n] references belong to the order they were generated for"""
+        results = [{"url": "https://a.example", "title": "A"}, {"url": "https://b.example", "title": "B"}]
+        pages = [{"text": "Alpha says X."}, {"text": "Beta says Y."}]
+        with mock.patch.object(pipeline, "search_queries", return_value=results), \
+             mock.patch.object(pipeline, "fetch_many", return_value=pages):
+            pipeline.web_search_answer("what does alpha say")
+        self._drop_question_entries()
+        with mock.patch.object(pipeline, "search_queries", return_value=results[::-1]), \
+             mock.patch.object(pipeline, "fetch_many", return_value=pages[::-1]):
+            result = pipeline.web_search_answer("what does alpha say")
+        self.assertEqual(self.grounded.call_count, 2)
+        self.assertNotIn("answer_cache", result["debug"])
+        self.assertEqual(result["citations"][0]["url"], "https://b.example")
+
+        self._drop_question_entries()
+        with mock.patch.object(pipeline, "search_queries", return_value=results[::-1]), \
+             mock.patch.object(pipeline, "fetch_many", return_value=pages[::-1]):
+            result = pipeline.web_search_answer("what does alpha say")
+        self.assertEqual(self.grounded.call_count, 2)
+        self.assertEqual(result["debug"]["answer_cache"], "sources")
+
+    def test_question_entry_short_lived(self):
+        """Only the source-keyed entry lives for ANSWER_TTL"""
+        self.assertLess(cache.question_ttl(False), cache.answer_ttl(False))
+        self.assertLessEqual(cache.question_ttl(True), cache.answer_ttl(True))
+        with mock.patch.object(cache.ANSWER_CACHE, "set", wraps=cache.ANSWER_CACHE.set) as cache_set:
+            pipeline.web_search_answer("capital of france")
+        expiries = {call.args[0].split(":")[1]: call.kwargs["expire"] for call in cache_set.call_args_list}
+        self.assertEqual(expiries, {"q": cache.question_ttl(False), "sources": cache.answer_ttl(False)})
+
+    def test_fallback_not_cached(self):
+        self.grounded.return_value = "I couldn't find sufficient information."
+        pipeline.web_search_answer("capital of france")
+        pipeline.web_search_answer("capital of france")
+        self.assertEqual(self.direct.call_count, 2)
+
+    def test_freshness_separates_entries(self):
+        pipeline.web_search_answer("capital of france")
+        pipeline.web_search_answer("capital of france", freshness=True)
+        self.assertEqual(self.grounded.call_count, 2)
+        self.assertLess(cache.answer_ttl(True), cache.answer_ttl(False))
+
+
+class TestStreamOllama(unittest.TestCase):
+    """generation.stream_ollama reads /api/generate chunk by chunk"""
+
+    def test_tokens_arrive_in_order(self):
+        with StubOllama(answers={"hello": "Streaming works fine."}, time_scale=0) as stub, \
+             mock.patch.object(generation, "OLLAMA_URL", stub.url):
+            tokens = []
+            text = generation.stream_ollama("hello", tokens.append)
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), "Streaming works fine.")
+        self.assertEqual(text, "Streaming works fine.")
+
+
+class _PageServer:
+    """Local HTTP server: /slow/<n> sleeps n tenths of a second; tracks peak concurrency."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    parts = self.path.strip("/").split("/")
+                    if parts[0] == "slow":
+                        time.sleep(int(parts[1]) / 10)
+                    body = f"<html><body><p>Page {self.path}</p></body></html>".encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestConcurrentFetch(unittest.TestCase):
+    """Pages are fetched concurrently within per-host caps and a deadline"""
+
+    def setUp(self):
+        self.server = _PageServer()
+        self.addCleanup(self.server.close)
+        patches = [
+            mock.patch.object(processing, "get_content_cache", return_value=None),
+            mock.patch.object(processing, "set_content_cache"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_input_order_and_deadline(self):
+        """Results keep input order; a page past the deadline is reported, not waited for"""
+        urls = [f"{self.server.url}/slow/{n}" for n in (1, 30, 0)]
+        t0 = time.monotonic()
+        results = processing.fetch_many(urls, deadline=1.0)
+        elapsed = time.monotonic() - t0
+
+        self.assertLess(elapsed, 2.0)
+        self.assertIn("/slow/1", results[0]["text"])
+        self.assertEqual(results[1], {"error": "Deadline exceeded"})
+        self.assertIn("/slow/0", results[2]["text"])
+
+    def test_per_host_cap(self):
+        """No more than FETCH_PER_HOST requests hit one host at a time"""
+        urls = [f"{self.server.url}/slow/1/{i}" for i in range(6)]
+        with mock.patch.object(processing, "_host_slots", {}), \
+             mock.patch.object(processing.config, "FETCH_PER_HOST", 2):
+            results = processing.fetch_many(urls, deadline=5)
+        self.assertTrue(all("text" in r for r in results))
+        self.assertLessEqual(self.server.peak, 2)
+
+
+class TestChunkSpans(unittest.TestCase):
+    """Chunks follow paragraph/sentence boundaries and are sized in tokens"""
+
+    def test_sentence_boundaries(self):
+        text = "One. Two three. Four five six. Seven."
+        spans = processing.chunk_spans(text, max_tokens=6)
+        self.assertEqual([text[s:e] for s, e in spans], ["One. Two three.", "Four five six. Seven."])
+
+    def test_prefers_paragraph_break(self):
+        text = "First paragraph here. Still first.\n\nSecond one. Goes on a bit longer than that."
+        spans = processing.chunk_spans(text, max_tokens=15)
+        self.assertEqual(text[slice(*spans[0])], "First paragraph here. Still first.")
+
+    def test_budget_and_coverage(self):
+        """Every chunk fits the budget; without overlap the spans tile the text"""
+        text = ("Lorem ipsum dolor sit amet consectetur. " * 30 + "\n\n") * 10
+        spans = processing.chunk_spans(text, max_tokens=50)
+        for s, e in spans:
+            self.assertLessEqual(e - s, 50 * processing.CHARS_PER_TOKEN)
+            self.assertFalse(text[s].isspace() or text[e - 1].isspace())
+        joined = "".join(text[s:e] for s, e in spans).replace(" ", "").replace("\n", "")
+        self.assertEqual(joined, text.replace(" ", "").replace("\n", ""))
+
+    def test_overlap_repeats_last_sentence(self):
+        text = "One. Two three. Four five six. Seven."
+        spans = processing.chunk_spans(text, max_tokens=8, overlap_tokens=4)
+        self.assertEqual([text[s:e] for s, e in spans], ["One. Two three. Four five six.", "Four five six. Seven."])
+
+    def test_unbroken_text_is_hard_cut(self):
+        self.assertEqual(processing.chunk_spans("x" * 1000, max_tokens=100), [(0, 400), (400, 800), (800, 1000)])
+        self.assertEqual(processing.chunk_spans("   "), [])
+
+
+class TestPassageSelection(unittest.TestCase):
+    """Chunks are chosen by relevance across pages, within the token budget"""
+
+    FILLER = "Unrelated navigation text and cookie banners. " * 40
+
+    def pages(self):
+        return [
+            {"citation_id": 1, "text": self.FILLER + "The Eiffel Tower is 330 metres tall."},
+            {"citation_id": 2, "text": "Tower height: the Eiffel Tower stands 330 metres. " + self.FILLER},
+            {"citation_id": 3, "text": self.FILLER},
+        ]
+
+    def test_relevant_chunks_first(self):
+        """A matching chunk deep in a page beats the page's leading filler"""
+        passages = processing.select_passages("how tall is the eiffel tower", self.pages(),
+                                              use_cross_encoder=False)
+        self.assertIn("330 metres", passages[0]["text"])
+        self.assertIn("330 metres", passages[1]["text"])
+        self.assertEqual({p["citation_id"] for p in passages[:2]}, {1, 2})
+
+    def test_budget_and_per_source_cap(self):
+        passages = processing.select_passages("eiffel tower", self.pages(), token_budget=450,
+                                              max_per_source=1, use_cross_encoder=False)
+        self.assertLessEqual(sum(processing.approx_tokens(p["text"]) for p in passages), 450)
+        ids = [p["citation_id"] for p in passages]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_no_match_keeps_source_order(self):
+        """Without any term overlap the leading chunks of the top sources win"""
+        passages = processing.select_passages("zzz", self.pages(), max_per_source=1,
+                                              use_cross_encoder=False)
+        self.assertEqual([p["citation_id"] for p in passages], [1, 2, 3])
+        self.assertTrue(self.pages()[0]["text"].startswith(passages[0]["text"]))
+
+    def test_cross_encoder_rescores_shortlist(self):
+        class Ranker:
+            def predict(self, pairs, **kwargs):
+                return [1.0 if "stands" in text else 0.0 for _, text in pairs]
+
+        with mock.patch.object(processing, "_RERANKER", Ranker()), \
+             mock.patch.object(processing, "_score_cache", processing.OrderedDict()):
+            passages = processing.select_passages("eiffel tower height", self.pages(),
+                                                  use_cross_encoder=True)
+        self.assertEqual(passages[0]["citation_id"], 2)
+
+
+class _FakeCrossEncoder:
+    """Scores by how often "paris" appears; optionally slow."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs_seen = 0
+        self.batch_sizes = []
+
+    def predict(self, pairs, batch_size=32):
+        time.sleep(self.delay)
+        self.pairs_seen += len(pairs)
+        self.batch_sizes.append(batch_size)
+        return [float(text.lower().count("paris")) for _, text in pairs]
+
+
+class TestRerankCandidates(unittest.TestCase):
+    """Cross-encoder reranking is cached, budgeted and side-effect free"""
+
+    CANDIDATES = [
+        {"url": "https://a.example", "title": "Weather in London", "snippet": "rain"},
+        {"url": "https://b.example", "title": "Paris guide", "snippet": "Paris, the capital of France"},
+        {"url": "https://c.example", "title": "France", "snippet": "capital Paris"},
+    ]
+
+    def rerank(self, ranker, **kwargs):
+        with mock.patch.object(processing, "_RERANKER", ranker):
+            return processing.rerank_candidates("capital of france paris", self.CANDIDATES, **kwargs)
+
+    def setUp(self):
+        patch = mock.patch.object(processing, "_score_cache", processing.OrderedDict())
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_ranked_without_mutation(self):
+        ranker = _FakeCrossEncoder()
+        with mock.patch.object(processing.config, "RERANK_BATCH_SIZE", 8):
+            top = self.rerank(ranker, top_k=2)
+        self.assertEqual([c["url"] for c in top], ["https://b.example", "https://c.example"])
+        self.assertEqual(top[0]["score"], 2.0)
+        self.assertNotIn("score", self.CANDIDATES[1])
+        self.assertEqual(ranker.batch_sizes, [8])
+
+    def test_scores_cached(self):
+        """Repeated (query, text) pairs do not hit the model again"""
+        ranker = _FakeCrossEncoder()
+        self.rerank(ranker)
+        self.rerank(ranker)
+        self.assertEqual(ranker.pairs_seen, 3)
+
+    def test_over_budget_falls_back_to_lexical(self):
+        ranker = _FakeCrossEncoder(delay=0.3)
+        with mock.patch.object(processing.config, "RERANK_BUDGET", 0.05):
+            t0 = time.monotonic()
+            top = self.rerank(ranker, top_k=3)
+            elapsed = time.monotonic() - t0
+        self.assertLess(elapsed, 0.25)
+        self.assertEqual(top[0]["url"], "https://c.example")  # BM25: most query terms in the least text
+        self.assertEqual(top[-1]["url"], "https://a.example")
+
+    def test_no_model_uses_bm25(self):
+        """Without sentence_transformers the order is lexical, not arrival order"""
+        top = self.rerank(False, top_k=2)
+        self.assertEqual({c["url"] for c in top}, {"https://b.example", "https://c.example"})
+
+    def test_prefilter_limits_model_pairs(self):
+        candidates = [{"url": f"https://x.example/{i}", "title": f"page {i}", "snippet": "filler"} for i in range(20)]
+        candidates[15]["snippet"] = "Paris is the capital of France"
+        ranker = _FakeCrossEncoder()
+        with mock.patch.object(processing, "_RERANKER", ranker), \
+             mock.patch.object(processing.config, "RERANK_PREFILTER", 5):
+            top = processing.rerank_candidates("capital of france", candidates, top_k=4)
+        self.assertEqual(ranker.pairs_seen, 5)
+        self.assertEqual(top[0]["url"], "https://x.example/15")
+        self.assertEqual(len(top), 4)
+
+    def test_model_still_loading(self):
+        """A warm-up in progress is not waited for"""
+        with processing._reranker_lock, \
+             mock.patch.object(processing, "_RERANKER", None), \
+             mock.patch.object(processing, "_loader", mock.sentinel.warmup):
+            top = processing.rerank_candidates("capital of france paris", self.CANDIDATES, top_k=1)
+        self.assertIn(top[0]["url"], ("https://b.example", "https://c.example"))
+
+    def test_not_loaded_loads_in_background(self):
+        """Without a warm-up the first request starts the load and answers with BM25"""
+        ranker = _FakeCrossEncoder()
+
+        def slow_load(name, device=None):
+            time.sleep(0.3)
+            return ranker
+
+        with mock.patch.object(processing, "_RERANKER", None), \
+             mock.patch.object(processing, "_loader", None), \
+             mock.patch.object(processing, "_HAS_SENTENCE_TRANSFORMERS", True), \
+             mock.patch.object(processing, "_HAS_NUMPY", True), \
+             mock.patch.object(processing, "CrossEncoder", slow_load, create=True), \
+             mock.patch.object(processing.config, "RERANK_THREADS", 0):
+            t0 = time.monotonic()
+            top = processing.rerank_candidates("capital of france paris", self.CANDIDATES, top_k=1)
+            self.assertLess(time.monotonic() - t0, 0.2)
+            self.assertEqual(ranker.pairs_seen, 0)
+            self.assertIn(top[0]["url"], ("https://b.example", "https://c.example"))
+
+            processing._loader.join(2)
+            self.assertIs(processing._RERANKER, ranker)
+            processing.rerank_candidates("capital of france paris", self.CANDIDATES, top_k=1)
+            self.assertEqual(ranker.pairs_seen, 1 + 3)  # warm-up prediction, then the candidates
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
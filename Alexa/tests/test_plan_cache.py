@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+import plan_cache
+from context_manager import ConversationContext
+
+
+class TestPlanCache(unittest.TestCase):
+    """LRU/TTL behaviour and context-aware keys"""
+
+    def test_key_normalizes_utterance(self):
+        """Case, punctuation and whitespace do not change the key"""
+        ctx = ConversationContext()
+        self.assertEqual(
+            plan_cache.make_key("Weather in London?", ctx),
+            plan_cache.make_key("  weather   in london ", ctx),
+        )
+
+    def test_follow_up_key_depends_on_history(self):
+        """References like 'there' are keyed on the conversation"""
+        a, b = ConversationContext(), ConversationContext()
+        a.add_turn("weather in paris", "Weather in Paris: clear.")
+        b.add_turn("weather in tokyo", "Weather in Tokyo: rain.")
+        self.assertNotEqual(
+            plan_cache.make_key("what's the time there", a),
+            plan_cache.make_key("what's the time there", b),
+        )
+        # Self-contained requests are shared across conversations
+        self.assertEqual(
+            plan_cache.make_key("weather in london", a),
+            plan_cache.make_key("weather in london", b),
+        )
+
+    def test_lru_ttl_and_counters(self):
+        """Oldest entries are evicted, expired ones are misses"""
+        cache = plan_cache.PlanCache(max_entries=2, ttl=60)
+        plan = {"action": "call_tool", "name": "get_weather", "args": {"place": "london"}}
+        cache.set("a", plan)
+        cache.set("b", plan)
+        cache.set("c", plan)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), plan)
+
+        cache.get("c")["args"]["place"] = "mutated"
+        self.assertEqual(cache.get("c")["args"]["place"], "london")
+
+        cache.ttl = -1
+        cache.set("d", plan)
+        self.assertIsNone(cache.get("d"))
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 3)
+        self.assertEqual(stats["misses"], 2)
+
+    def test_invalid_plans_not_cached(self):
+        """Only well-formed plan dicts are stored"""
+        cache = plan_cache.PlanCache()
+        cache.set("x", {"text": "no action"})
+        self.assertIsNone(cache.get("x"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
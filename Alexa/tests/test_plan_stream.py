@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import unittest
+
+from plan_stream import IncrementalPlanParser
+
+
+def _feed_in_pieces(parser, text, size):
+    done = False
+    for i in range(0, len(text), size):
+        done = parser.feed(text[i:i + size])
+        if done:
+            return i + size
+    return None
+
+
+class TestIncrementalPlanParser(unittest.TestCase):
+    """Streamed plan JSON is parsed as it arrives"""
+
+    def test_completes_before_trailing_tokens(self):
+        """Object end is detected even with trailing whitespace still to come"""
+        plan = {"action": "call_tool", "name": "get_weather", "args": {"place": "new york"}}
+        text = json.dumps(plan) + "\n\n\n   \n"
+        parser = IncrementalPlanParser()
+        consumed = _feed_in_pieces(parser, text, 3)
+        self.assertIsNotNone(consumed)
+        self.assertLess(consumed, len(text))
+        self.assertEqual(parser.result(), plan)
+
+    def test_fields_signalled_in_order(self):
+        """action, name and args are announced once each, before completion"""
+        seen = []
+        parser = IncrementalPlanParser(on_field=lambda k, v, partial: seen.append((k, v, parser.complete)))
+        text = '{"action": "call_tool", "name": "search_web", "args": {"query": "a, b {c}"}}'
+        _feed_in_pieces(parser, text, 1)
+        self.assertEqual([k for k, _, _ in seen], ["action", "name", "args"])
+        self.assertFalse(seen[0][2])
+        self.assertEqual(seen[2][1], {"query": "a, b {c}"})
+
+    def test_strings_with_escapes_and_braces(self):
+        """Braces and quotes inside strings do not end the object"""
+        plan = {"action": "final", "text": 'He said "hi" } and left\\'}
+        parser = IncrementalPlanParser()
+        _feed_in_pieces(parser, json.dumps(plan), 2)
+        self.assertEqual(parser.result(), plan)
+
+    def test_leading_fence_and_incomplete(self):
+        """Text before the object is skipped; unfinished objects give None"""
+        parser = IncrementalPlanParser()
+        self.assertTrue(parser.feed('```json\n{"action": "final", "text": "ok"}\n```'))
+        self.assertEqual(parser.result(), {"action": "final", "text": "ok"})
+
+        parser = IncrementalPlanParser()
+        self.assertFalse(parser.feed('{"action": "call_tools", "calls": [{"name": "get_time"'))
+        self.assertIsNone(parser.result())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+import planner
+from benchmarks.stub_ollama import StubOllama
+
+
+class TestPlannerSession(unittest.TestCase):
+    """Prompt prefix must stay byte-identical between planner calls"""
+
+    def test_prefix_is_stable_across_turns(self):
+        """History and user text are appended after an unchanged prefix"""
+        history = [
+            {"role": "user", "content": "weather in paris"},
+            {"role": "assistant", "content": "Weather in Paris: clear, 12°C."},
+        ]
+        first = planner._build_messages("hello", [], fewshot_k=0)
+        second = planner._build_messages("what about the time?", history, fewshot_k=0)
+
+        n = len(planner.PREFIX_MESSAGES)
+        self.assertEqual(first[:n], second[:n])
+        self.assertEqual(first[0]["role"], "system")
+        self.assertEqual(second[n:n + 2], history)
+        self.assertEqual(second[-1], {"role": "user", "content": "what about the time?"})
+
+    def test_selected_shots(self):
+        """k most similar example pairs sit between system prompt and history"""
+        messages = planner._build_messages("weather in lisbon", [], fewshot_k=2)
+        self.assertEqual(len(messages), 1 + 4 + 1)
+        self.assertEqual(messages[0], planner.SYSTEM_MESSAGE)
+        shot_users = [m["content"] for m in messages[1:-1] if m["role"] == "user"]
+        self.assertIn("weather in singapore", shot_users)
+        self.assertEqual(
+            planner._build_messages("weather in lisbon", [], fewshot_k=2),
+            messages,
+        )
+
+    def test_payload_pins_options(self):
+        """Options are copied per request and include num_ctx / keep_alive"""
+        payload = planner._build_payload(planner._build_messages("hi", []))
+        self.assertEqual(payload["model"], planner.PLANNER_MODEL)
+        self.assertEqual(payload["options"]["num_ctx"], planner.ollama_client.context_size(planner.PLANNER_MODEL))
+        payload["options"]["num_predict"] = 1
+        self.assertNotIn("num_predict", planner.PLANNER_OPTIONS)
+        if planner.PLANNER_SESSION and planner.PLANNER_KEEP_ALIVE:
+            self.assertEqual(payload["keep_alive"], planner.PLANNER_KEEP_ALIVE)
+
+    def test_metrics_from_done_chunk(self):
+        """Final chunk counters are recorded"""
+        planner._record_metrics({"done": True, "prompt_eval_count": 12, "prompt_eval_duration": 3400})
+        last = planner.get_planner_metrics()["last"]
+        self.assertEqual(last["prompt_eval_count"], 12)
+        self.assertEqual(last["prompt_eval_duration"], 3400)
+
+
+class TestPlannerAgainstStub(unittest.TestCase):
+    """plan_with_ollama end to end against the benchmark stub server"""
+
+    def setUp(self):
+        answer = '{"action": "call_tool", "name": "get_weather", "args": {"place": "oslo"}}'
+        self.stub = StubOllama(answers={"weather in oslo": answer}, time_scale=0).start()
+        self._saved = (planner.OLLAMA_URL, planner.PLANNER_EARLY_STOP)
+        planner.OLLAMA_URL = self.stub.url
+
+    def tearDown(self):
+        planner.OLLAMA_URL, planner.PLANNER_EARLY_STOP = self._saved
+        self.stub.stop()
+
+    def test_early_stop_drops_trailing_tokens(self):
+        """Stream is closed at the end of the plan object"""
+        planner.PLANNER_EARLY_STOP = True
+        decision = planner.plan_with_ollama("weather in oslo")
+        self.assertEqual(decision["name"], "get_weather")
+        last = planner.get_planner_metrics()["last"]
+        self.assertTrue(last.get("early_stop"))
+        self.assertGreater(last["eval_count"], 0)
+        self.assertLessEqual(last["first_token_ms"], last["stream_ms"])
+
+    def test_full_stream_reports_prompt_tokens(self):
+        """Without early stop the done chunk metrics are recorded"""
+        planner.PLANNER_EARLY_STOP = False
+        decision = planner.plan_with_ollama("weather in oslo")
+        self.assertEqual(decision["args"], {"place": "oslo"})
+        self.assertGreater(planner.get_planner_metrics()["last"]["prompt_eval_count"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
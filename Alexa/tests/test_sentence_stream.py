@@ -0,0 +1,34 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from sentence_stream import SentenceBuffer, strip_citations
+
+
+class TestSentenceBuffer(unittest.TestCase):
+    """Streamed tokens come out as whole sentences"""
+
+    def test_sentences_released_as_completed(self):
+        buf = SentenceBuffer()
+        text = "The tower is 330 metres tall [1]. It opened in 1889, e.g. for the fair. Dr. Eiffel built it"
+        out = []
+        for i in range(0, len(text), 3):
+            out += buf.feed(text[i:i + 3])
+        self.assertEqual(out, [
+            "The tower is 330 metres tall [1].",
+            "It opened in 1889, e.g. for the fair.",
+        ])
+        self.assertEqual(buf.flush(), "Dr. Eiffel built it")
+
+    def test_short_sentences_merged(self):
+        buf = SentenceBuffer(min_chars=20)
+        self.assertEqual(buf.feed("Yes. The capital is Paris. "), ["Yes. The capital is Paris."])
+
+    def test_strip_citations(self):
+        self.assertEqual(strip_citations("Paris [1]. Lyon [2, 3]."), "Paris. Lyon.")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,61 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from unittest import mock
+
+import speculative
+
+
+class TestSpeculation(unittest.TestCase):
+    """Prefetched tool results are adopted only when the plan matches"""
+
+    def setUp(self):
+        speculative.reset_stats()
+
+    def test_prediction(self):
+        """Router rules and question shape drive the guess"""
+        self.assertEqual(
+            speculative.predict_calls("weather in Paris"),
+            [{"name": "get_weather", "args": {"place": "paris"}}],
+        )
+        self.assertEqual(speculative.predict_calls("who is ada lovelace")[0]["name"], "search_web")
+        self.assertEqual(speculative.predict_calls("hello"), [])
+        self.assertEqual(speculative.predict_calls("what is it"), [])
+
+    def test_adopt_matching_result(self):
+        """A matching plan takes the speculative result instead of calling again"""
+        fake = {"place": "Paris, France", "weather_desc": "clear"}
+        with mock.patch.object(speculative, "get_weather", return_value=fake) as gw:
+            spec = speculative.start("weather in paris")
+            adopted, result = spec.adopt("get_weather", {"place": "Paris"})
+            spec.finish()
+        self.assertTrue(adopted)
+        self.assertIs(result, fake)
+        self.assertEqual(gw.call_count, 1)
+        self.assertEqual(speculative.get_stats()["hits"], 1)
+
+    def test_mismatch_is_discarded(self):
+        """A different plan leaves the job unused and counted as waste"""
+        with mock.patch.object(speculative, "get_weather", return_value={}):
+            spec = speculative.start("weather in paris")
+            adopted, _ = spec.adopt("get_weather", {"place": "rome"})
+            spec.finish()
+        self.assertFalse(adopted)
+        stats = speculative.get_stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["wasted"] + stats["cancelled"], 1)
+
+    def test_failed_prefetch_falls_back(self):
+        """Errors in the background job make the caller run the tool itself"""
+        with mock.patch.object(speculative, "get_weather", side_effect=ValueError("no such place")):
+            spec = speculative.start("weather in atlantis")
+            adopted, result = spec.adopt("get_weather", {"place": "atlantis"})
+        self.assertFalse(adopted)
+        self.assertIsNone(result)
+        self.assertEqual(speculative.get_stats()["errors"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+
+class TestTracing(unittest.TestCase):
+    """Spans nest per thread and finished traces land in the ring buffer"""
+
+    def setUp(self):
+        tracing.clear()
+
+    def test_nested_spans(self):
+        """Children point at their parent; the root closes the trace"""
+        with tracing.span("turn"):
+            with tracing.span("planner.plan"):
+                tracing.annotate(source="fast_path")
+            with tracing.span("tool.get_weather"):
+                pass
+        self.assertIsNone(tracing.current_span())
+
+        trace = tracing.get_traces()[0]
+        self.assertEqual(trace["name"], "turn")
+        spans = {s["name"]: s for s in trace["spans"]}
+        root = spans["turn"]
+        self.assertIsNone(root["parent_id"])
+        self.assertEqual(spans["planner.plan"]["parent_id"], root["span_id"])
+        self.assertEqual(spans["planner.plan"]["attrs"], {"source": "fast_path"})
+        self.assertEqual(trace["duration_ms"], root["duration_ms"])
+
+    def test_wrap_keeps_parent_across_threads(self):
+        """Work handed to a pool is attributed to the submitting span"""
+        def work():
+            with tracing.span("tool.search_web"):
+                return tracing.current_span().trace
+
+        with tracing.span("turn") as root:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                trace = pool.submit(tracing.wrap(work)).result()
+        self.assertIs(trace, root.trace)
+        child = [s for s in tracing.get_traces()[0]["spans"] if s["name"] == "tool.search_web"][0]
+        self.assertEqual(child["parent_id"], root.span_id)
+
+    def test_error_recorded(self):
+        """An exception ends the span with an error and propagates"""
+        with self.assertRaises(ValueError):
+            with tracing.span("retrieval.fetch"):
+                raise ValueError("bad page")
+        span = tracing.get_traces()[0]["spans"][0]
+        self.assertEqual(span["error"], "ValueError: bad page")
+
+    def test_newest_first(self):
+        for name in ("a", "b", "c"):
+            with tracing.span(name):
+                pass
+        self.assertEqual([t["name"] for t in tracing.get_traces(limit=2)], ["c", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,5 +1,4 @@
-import requests
-from config import OLLAMA_URL, OLLAMA_MODEL
+import ollama_client
 
 def brainstorm_ideas(topic: str) -> str:
     """
@@ -20,17 +19,8 @@ IMPORTANT INSTRUCTIONS:
 Generate your response now:"""
 
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,  # Higher temperature for creativity
-                "num_ctx": 4096
-            }
-        }
-        resp = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=60)
-        resp.raise_for_status()
-        return resp.json().get("response", "").strip()
+        # "creative" profile: higher temperature
+        resp = ollama_client.generate(prompt, task="creative", caller="brainstorm")
+        return resp.get("response", "").strip()
     except Exception as e:
         return f"I tried to brainstorm, but my creative circuits jammed: {str(e)}"
@@ -0,0 +1,282 @@
+# tool_registry.py
+"""
+Declarative registry of the tools the planner can call.
+
+Each ToolSpec says how to validate a call's args, run it, and turn the raw
+result into what dispatcher.process_tool_result expects, plus the knobs the
+dispatcher applies uniformly: timeout, result caching and concurrency class.
+Per-tool latency counters are kept here as well.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from tools_time import get_time, get_time_in
+from tool_weather import get_weather
+from tool_web import search_web
+from tool_creative import brainstorm_ideas
+from tool_arxiv import search_arxiv
+from tool_image import image_search
+
+logger = logging.getLogger(__name__)
+
+# Max calls in flight per concurrency class (None = unlimited)
+CONCURRENCY_LIMITS = {
+    "local": None,  # no I/O
+    "api": 4,       # small JSON APIs (geocoding, weather)
+    "web": 2,       # search + page fetches, heavy on the network
+    "llm": 1,       # tools that generate with Ollama, which serializes anyway
+}
+
+_SEMAPHORES = {
+    cls: threading.BoundedSemaphore(limit) for cls, limit in CONCURRENCY_LIMITS.items() if limit
+}
+
+RESULT_CACHE_MAX_ENTRIES = 256
+
+# ---------------------------------------------------------------------
+#  Formatters
+# ---------------------------------------------------------------------
+def format_time_result(res: dict) -> str:
+    if res.get("place"):
+        return f"In {res['place']}, the time is {res['human']}."
+    return f"The time is {res['human']}."
+
+def format_weather_result(res: dict) -> str:
+    temp = res.get("temperature_c")
+    desc = res.get("weather_desc")
+    place = res.get("place")
+    wind = res.get("wind_speed_kmh")
+    if temp is not None and wind is not None:
+        return f"Weather in {place}: {desc}, {temp:.0f}°C, wind {wind:.0f} km/h."
+    if temp is not None:
+        return f"Weather in {place}: {desc}, {temp:.0f}°C."
+    return f"Weather in {place}: {desc}."
+
+# ---------------------------------------------------------------------
+#  Spec
+# ---------------------------------------------------------------------
+class ToolSpec:
+    """
+    One callable tool.
+
+    Args:
+        name: Tool name used in plans
+        executor: Called with the validated args positionally, in `args` order
+        args: Required string args, {arg_name: description}
+        formatter: Optional fn(raw_result) -> value for process_tool_result
+        timeout: Seconds a concurrent call may run before it is dropped
+        cache_ttl: Seconds to reuse a result for identical args (0 = never)
+        concurrency: Key into CONCURRENCY_LIMITS
+        missing_prompt: Reply when a required arg is missing or empty
+        error_reply: Reply template (formatted with args) when the call fails;
+                     None means the dispatcher falls back to the LLM
+        streams: The executor accepts on_event= and streams partial output
+    """
+
+    def __init__(self, name, executor, args=None, formatter=None, timeout=None,
+                 cache_ttl=0, concurrency="api", missing_prompt=None, error_reply=None,
+                 streams=False):
+        self.name = name
+        self.executor = executor
+        self.args = dict(args or {})
+        self.formatter = formatter
+        self.timeout = config.TOOL_TIMEOUT_SLOW if timeout is None else timeout
+        self.cache_ttl = cache_ttl
+        self.concurrency = concurrency
+        self.missing_prompt = missing_prompt
+        self.error_reply = error_reply
+        self.streams = streams
+
+    @property
+    def cacheable(self) -> bool:
+        return self.cache_ttl > 0
+
+    def validate(self, args: dict):
+        """Stripped required args, or None when one is missing."""
+        args = args if isinstance(args, dict) else {}
+        cleaned = {}
+        for key in self.args:
+            value = str(args.get(key) or "").strip()
+            if not value:
+                return None
+            cleaned[key] = value
+        return cleaned
+
+    def call(self, args: dict, on_event=None, deadline=None):
+        """
+        Raw executor result (cached when allowed), within the concurrency limit.
+        With a deadline (time.monotonic()), a call that cannot get a concurrency
+        slot before it raises TimeoutError instead of starting late.
+        """
+        key = (self.name, tuple(sorted((k, v.lower()) for k, v in args.items())))
+        if self.cacheable:
+            hit = _cache_get(key)
+            if hit is not None:
+                _record(self.name, 0.0, cached=True)
+                return hit
+
+        positional = [args[k] for k in self.args]
+        kwargs = {"on_event": on_event} if (self.streams and on_event) else {}
+        semaphore = _SEMAPHORES.get(self.concurrency)
+        if semaphore is not None:
+            wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not semaphore.acquire(timeout=wait):
+                raise TimeoutError(f"{self.name}: no free '{self.concurrency}' slot before the deadline")
+        t0 = time.perf_counter()
+        try:
+            raw = self.executor(*positional, **kwargs)
+        except Exception:
+            _record(self.name, (time.perf_counter() - t0) * 1000, error=True)
+            raise
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        _record(self.name, (time.perf_counter() - t0) * 1000)
+
+        if self.cacheable and raw:
+            _cache_put(key, raw, self.cache_ttl)
+        return raw
+
+    def format(self, raw):
+        return self.formatter(raw) if self.formatter else raw
+
+# ---------------------------------------------------------------------
+#  Result cache
+# ---------------------------------------------------------------------
+_cache_lock = threading.Lock()
+_cache = OrderedDict()  # key -> (expires_at, value)
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return copy.deepcopy(value)
+
+def _cache_put(key, value, ttl):
+    with _cache_lock:
+        _cache[key] = (time.time() + ttl, copy.deepcopy(value))
+        _cache.move_to_end(key)
+        while len(_cache) > RESULT_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+# ---------------------------------------------------------------------
+#  Stats
+# ---------------------------------------------------------------------
+_stats_lock = threading.Lock()
+_stats = {}
+
+def _entry(name) -> dict:
+    return _stats.setdefault(
+        name, {"calls": 0, "errors": 0, "timeouts": 0, "abandoned": 0, "abandoned_running": 0,
+               "cache_hits": 0, "total_ms": 0.0, "last_ms": 0.0}
+    )
+
+def _record(name, elapsed_ms, error=False, cached=False):
+    with _stats_lock:
+        s = _entry(name)
+        s["calls"] += 1
+        if cached:
+            s["cache_hits"] += 1
+            return
+        if error:
+            s["errors"] += 1
+        s["total_ms"] += elapsed_ms
+        s["last_ms"] = round(elapsed_ms, 1)
+
+def record_timeout(name: str, running: bool = False):
+    """
+    Count a call dropped at its deadline. A running one cannot be stopped and
+    keeps its worker and concurrency slot: it is also counted as abandoned,
+    and in "abandoned_running" until record_abandoned_done().
+    """
+    with _stats_lock:
+        s = _entry(name)
+        s["timeouts"] += 1
+        if running:
+            s["abandoned"] += 1
+            s["abandoned_running"] += 1
+
+def record_abandoned_done(name: str):
+    with _stats_lock:
+        s = _entry(name)
+        s["abandoned_running"] = max(0, s["abandoned_running"] - 1)
+
+def get_stats() -> dict:
+    """Per-tool counters with mean latency over executed (uncached) calls."""
+    with _stats_lock:
+        out = {}
+        for name, s in _stats.items():
+            executed = s["calls"] - s["cache_hits"]
+            entry = dict(s)
+            entry["total_ms"] = round(s["total_ms"], 1)
+            entry["mean_ms"] = round(s["total_ms"] / executed, 1) if executed else 0.0
+            out[name] = entry
+        return out
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+# ---------------------------------------------------------------------
+#  Registry
+# ---------------------------------------------------------------------
+TOOLS = {}
+
+def register(spec: ToolSpec) -> ToolSpec:
+    TOOLS[spec.name] = spec
+    return spec
+
+def get_tool(name: str):
+    return TOOLS.get(name)
+
+register(ToolSpec(
+    "get_time", get_time,
+    formatter=format_time_result, timeout=config.TOOL_TIMEOUT_FAST, concurrency="local",
+))
+register(ToolSpec(
+    "get_time_in", get_time_in,
+    args={"place": "city or country"},
+    formatter=format_time_result, timeout=config.TOOL_TIMEOUT_FAST,
+    missing_prompt="Which city or country?",
+))
+register(ToolSpec(
+    "get_weather", get_weather,
+    args={"place": "city or country"},
+    formatter=format_weather_result, timeout=config.TOOL_TIMEOUT_FAST, cache_ttl=600,
+    missing_prompt="Which city or country?",
+))
+register(ToolSpec(
+    "search_web", search_web,
+    args={"query": "search query"}, concurrency="web", streams=True,
+    missing_prompt="What should I search for?",
+))
+register(ToolSpec(
+    "brainstorm", brainstorm_ideas,
+    args={"topic": "topic"}, concurrency="llm",
+    missing_prompt="I need a topic to brainstorm about.",
+))
+register(ToolSpec(
+    "search_arxiv", search_arxiv,
+    args={"query": "search query"}, cache_ttl=3600, concurrency="web",
+    missing_prompt="What papers should I search for?",
+))
+register(ToolSpec(
+    "image_search", image_search,
+    args={"query": "image query"}, concurrency="web",
+    missing_prompt="What images should I search for?",
+    error_reply="I couldn't fetch images, but I can tell you about {query}.",
+))
@@ -4,10 +4,13 @@ from web_retrieval import web_search_answer
 
 logger = logging.getLogger(__name__)
 
-def search_web(query: str) -> dict:
+def search_web(query: str, on_event=None) -> dict:
     """
     Public entry point: Search web using the web_retrieval pipeline.
     
+    on_event(kind, payload) streams the answer as it is generated
+    (see web_retrieval.pipeline.web_search_answer).
+    
     ALWAYS returns a dict with:
       - answer: string (never empty)
       - sources: list of {title, url, snippet} dicts
@@ -25,7 +28,7 @@ def search_web(query: str) -> dict:
             }
         
         logger.info(f"Web search for: '{query}'")
-        result = web_search_answer(query)
+        result = web_search_answer(query, on_event=on_event)
         
         answer = result.get("answer", "")
         citations = result.get("citations", [])
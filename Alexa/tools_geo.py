@@ -1,8 +1,14 @@
 import requests
+from functools import lru_cache
 from config import OPEN_METEO_GEOCODE
 
 def geocode_location(name):
     """Geocode a location name to latitude and longitude using Open-Meteo Geocoding API."""
+    # Cached per normalized name; callers get a copy so the cached entry stays intact
+    return dict(_geocode_cached(" ".join(str(name).lower().split())))
+
+@lru_cache(maxsize=256)
+def _geocode_cached(name):
     params = {
         "name": name,
         "count": 1,
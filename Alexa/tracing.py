@@ -0,0 +1,185 @@
+# tracing.py
+"""
+Lightweight in-process tracing.
+
+A trace is the tree of spans for one unit of work (a chat turn, a voice
+command). Spans nest through a thread-local stack; work handed to a thread
+pool keeps its parent via wrap(). When a trace's root span ends the trace is
+pushed into a ring buffer that /api/systems/traces serves.
+
+    with tracing.span("retrieval.search", queries=3):
+        ...
+
+    @tracing.traced("planner.plan")
+    def plan(user_text): ...
+"""
+import functools
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import TRACING_ENABLED, TRACE_BUFFER_SIZE
+
+_buffer = deque(maxlen=TRACE_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+class _Trace:
+    def __init__(self, name: str):
+        self.trace_id = next(_ids)
+        self.name = name
+        self.wall_start = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.duration_ms = None
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.wall_start,
+            "duration_ms": self.duration_ms,
+            "spans": spans,
+        }
+
+class Span:
+    """One timed stage. End it exactly once (span() / traced() do that for you)."""
+
+    def __init__(self, name: str, trace: _Trace, parent_id=None, attrs=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = next(_ids)
+        self.parent_id = parent_id
+        self.attrs = dict(attrs or {})
+        self.start = time.perf_counter()
+        self.ended = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error: str = None):
+        if self.ended:
+            return
+        self.ended = True
+        now = time.perf_counter()
+        record = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start - self.trace.t0) * 1000, 2),
+            "duration_ms": round((now - self.start) * 1000, 2),
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+        if error:
+            record["error"] = error
+        with self.trace.lock:
+            self.trace.spans.append(record)
+        if self.parent_id is None:
+            self.trace.duration_ms = record["duration_ms"]
+            with _buffer_lock:
+                _buffer.append(self.trace)
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def end(self, error: str = None):
+        pass
+
+_NOOP = _NoopSpan()
+
+# ---------------------------------------------------------------------
+#  API
+# ---------------------------------------------------------------------
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+def start_span(name: str, parent=None, **attrs):
+    """
+    Start a span under `parent` (default: the current span of this thread).
+    With no parent at all a new trace is started and this span is its root.
+    """
+    if not TRACING_ENABLED:
+        return _NOOP
+    parent = parent or current_span()
+    if isinstance(parent, Span):
+        return Span(name, parent.trace, parent.span_id, attrs)
+    return Span(name, _Trace(name), None, attrs)
+
+@contextmanager
+def activate(span):
+    """Make `span` the parent for spans started in this thread."""
+    if not isinstance(span, Span):
+        yield span
+        return
+    stack = _stack()
+    stack.append(span)
+    try:
+        yield span
+    finally:
+        stack.pop()
+
+@contextmanager
+def span(name: str, **attrs):
+    s = start_span(name, **attrs)
+    with activate(s):
+        try:
+            yield s
+        except BaseException as e:
+            s.end(error=f"{type(e).__name__}: {e}")
+            raise
+    s.end()
+
+def traced(name: str = None):
+    """Decorator: run the function inside a span (default name: module.function)."""
+    def decorator(fn):
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def wrap(fn):
+    """Bind fn to the caller's current span so it can run on another thread."""
+    parent = current_span()
+    if parent is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with activate(parent):
+            return fn(*args, **kwargs)
+    return wrapper
+
+def annotate(**attrs):
+    """Attach attributes to the current span (no-op outside a span)."""
+    s = current_span()
+    if s is not None:
+        s.set(**attrs)
+
+def get_traces(limit: int = 50) -> list:
+    """Most recent finished traces, newest first."""
+    with _buffer_lock:
+        traces = list(_buffer)[-limit:] if limit > 0 else []
+    return [t.to_dict() for t in reversed(traces)]
+
+def clear():
+    with _buffer_lock:
+        _buffer.clear()
@@ -14,16 +14,89 @@ import tempfile
 import os
 import wave
 import collections
+import tracing
+from sentence_stream import SentenceBuffer, strip_citations
+
+class _StreamingSpeaker:
+    """
+    Speaks a streamed reply sentence by sentence on a worker thread, so TTS for
+    the first sentence starts while the rest is still being generated.
+    """
+
+    def __init__(self, assistant, cancelled=None):
+        self.assistant = assistant
+        self.cancelled = cancelled or threading.Event()
+        self.buffer = SentenceBuffer()
+        self.sentences = queue.Queue()
+        self.streamed = ""
+        self.parent_span = tracing.current_span()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def on_event(self, kind, payload):
+        """Listener for dispatcher events ("token" / "reset")."""
+        if kind == "token":
+            self.streamed += payload.get("text", "")
+            for sentence in self.buffer.feed(payload.get("text", "")):
+                self.sentences.put(sentence)
+        elif kind == "reset":
+            # Replacement answer follows; drop what has not been spoken yet
+            self.streamed = ""
+            self.buffer.clear()
+            while True:
+                try:
+                    self.sentences.get_nowait()
+                except queue.Empty:
+                    break
+
+    def finish(self, response_text):
+        """Speak the rest of the stream and the parts of the reply that were not streamed, and wait."""
+        for rest in [self.buffer.flush()] + self._unstreamed(response_text or ""):
+            if rest:
+                self.sentences.put(rest)
+        self.sentences.put(None)
+        self.thread.join()
+
+    def _unstreamed(self, text):
+        """
+        Parts of the final reply the stream did not carry, e.g. the other tools'
+        output in a call_tools turn around the streamed web answer.
+        """
+        streamed = self.streamed.strip()
+        if not streamed:
+            return [text.strip()]
+        at = text.find(streamed)
+        if at < 0:
+            # Reply was reworded after streaming; what was streamed has been said
+            return []
+        return [part.strip() for part in (text[:at], text[at + len(streamed):])]
+
+    def _run(self):
+        first = True
+        with tracing.activate(self.parent_span):
+            while True:
+                sentence = self.sentences.get()
+                if sentence is None:
+                    break
+                if self.cancelled.is_set():
+                    continue  # superseded: drain without speaking
+                if first:
+                    self.assistant.update_status("speaking")
+                    first = False
+                self.assistant._say(sentence, self.cancelled)
 
 class VoiceAssistant:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, streaming=False):
         """
         Initialize the voice assistant
         
         Args:
             callback: Function to call when a command is received (receives text, returns response text)
+            streaming: Callback also accepts on_event= and streams the reply; speech
+                       starts with the first complete sentence
         """
         self.callback = callback
+        self.streaming = streaming
         self.is_running = False
         self.is_listening = False
         
@@ -74,6 +147,15 @@ class VoiceAssistant:
         self.silence_start_time = 0
         self.is_speech_detected = False
         
+        # Tracing: one trace per command, from wake word to end of speech
+        self._command_span = None
+        self._record_span = None
+        
+        # Commands are answered on a worker thread so the loop keeps listening;
+        # this event silences the reply of the command being answered
+        self._command_lock = threading.Lock()
+        self._command_cancel = None
+        
     def set_status_callback(self, callback):
         """Set callback for status updates"""
         self.status_callback = callback
@@ -125,6 +207,7 @@ class VoiceAssistant:
             
         self.is_running = False
         self.is_listening = False
+        self.interrupt()
         
         if self.stream:
             self.stream.stop_stream()
@@ -157,13 +240,20 @@ class VoiceAssistant:
                     # Listen for wake word with cooldown
                     current_time = time.time()
                     if current_time - self.last_wake_word_time > self.wake_word_cooldown:
+                        predict_start = time.perf_counter()
                         prediction = self.oww_model.predict(audio_array)
+                        predict_ms = (time.perf_counter() - predict_start) * 1000
                         
                         # Check if wake word detected
                         for mdl_name, score in prediction.items():
                             if score > self.wake_word_threshold:
                                 print(f"Wake word detected! (confidence: {score:.2f})")
                                 self.last_wake_word_time = current_time
+                                self._command_span = tracing.start_span("voice.command")
+                                tracing.start_span(
+                                    "voice.wake", parent=self._command_span,
+                                    model=mdl_name, score=round(float(score), 3), predict_ms=round(predict_ms, 2)
+                                ).end()
                                 self.update_status("wake_word_detected")
                                 self._start_recording()
                                 break
@@ -204,13 +294,25 @@ class VoiceAssistant:
             except Exception as e:
                 print(f"Error processing audio: {e}")
                 
+    def interrupt(self):
+        """
+        Stop speaking the reply in progress. Its LLM work is cancelled by the
+        callback's next turn on the voice channel (or by the caller).
+        """
+        with self._command_lock:
+            if self._command_cancel is not None:
+                self._command_cancel.set()
+    
     def _start_recording(self):
         """Start recording user command"""
+        # The user talks over the reply: stop speaking it
+        self.interrupt()
         self.is_listening = True
         self.recording_buffer = []
         self.recording_start_time = time.time()
         self.silence_start_time = 0
         self.is_speech_detected = False
+        self._record_span = tracing.start_span("voice.record", parent=self._command_span)
         self.update_status("recording")
         print("Listening for command...")
         
@@ -222,9 +324,18 @@ class VoiceAssistant:
         self.is_listening = False
         self.update_status("processing")
         
+        command_span = self._command_span or tracing.start_span("voice.command")
+        self._command_span = None
+        if self._record_span is not None:
+            self._record_span.set(chunks=len(self.recording_buffer))
+            self._record_span.end()
+            self._record_span = None
+        
         # Check if we have enough audio
         if len(self.recording_buffer) < 5:  # At least 5 chunks
             print("Recording too short, ignoring")
+            command_span.set(ignored="too_short")
+            command_span.end()
             self.update_status("listening_for_wake_word")
             return
         
@@ -247,32 +358,26 @@ class VoiceAssistant:
         try:
             # Transcribe with Whisper
             print("Transcribing audio...")
-            result = self.whisper_model.transcribe(
-                temp_path, 
-                language="en",
-                fp16=False,  # Use FP32 for CPU
-                verbose=False
-            )
-            command_text = result["text"].strip()
+            with tracing.activate(command_span), tracing.span("voice.transcribe") as stage:
+                result = self.whisper_model.transcribe(
+                    temp_path, 
+                    language="en",
+                    fp16=False,  # Use FP32 for CPU
+                    verbose=False
+                )
+                command_text = result["text"].strip()
+                stage.set(chars=len(command_text))
             
             print(f"Recognized: '{command_text}'")
             
             # Only process if we got meaningful text
             if command_text and len(command_text) > 2:
-                # Get response from callback
-                if self.callback:
-                    response_text = self.callback(command_text)
-                    print(f"Response: {response_text}")
-                    
-                    # Speak response if Piper is configured
-                    if self.piper_model_path:
-                        self._speak(response_text)
-                    else:
-                        print("(Piper TTS not configured, skipping speech output)")
-                else:
-                    print("No callback set for processing command")
-            else:
-                print("No meaningful command recognized")
+                # Answer on a worker and go back to listening, so a newer command
+                # (or a spoken "stop") can supersede this one while it runs
+                self._start_command(command_text, command_span)
+                command_span = None
+                return
+            print("No meaningful command recognized")
                 
         except Exception as e:
             print(f"Error transcribing audio: {e}")
@@ -282,16 +387,80 @@ class VoiceAssistant:
                 os.unlink(temp_path)
             except:
                 pass
+            if command_span is not None:
+                command_span.end()
                 
         self.update_status("listening_for_wake_word")
+    
+    def _start_command(self, command_text, command_span):
+        """Answer a command on a worker thread; the reply of the one before is silenced."""
+        cancelled = threading.Event()
+        with self._command_lock:
+            if self._command_cancel is not None:
+                self._command_cancel.set()
+            self._command_cancel = cancelled
+        worker = threading.Thread(
+            target=self._run_command, args=(command_text, command_span, cancelled),
+            name="voice-command", daemon=True,
+        )
+        worker.start()
+    
+    def _run_command(self, command_text, command_span, cancelled):
+        """Get the response from the callback and speak it unless superseded."""
+        try:
+            if self.callback and self.streaming and self.piper_model_path:
+                # Speak sentence by sentence while the reply is generated
+                with tracing.activate(command_span):
+                    speaker = _StreamingSpeaker(self, cancelled)
+                    response_text = self.callback(command_text, on_event=speaker.on_event)
+                    print(f"Response: {response_text}")
+                    speaker.finish(response_text)
+            elif self.callback:
+                with tracing.activate(command_span):
+                    response_text = self.callback(command_text)
+                print(f"Response: {response_text}")
+                
+                # Speak response if Piper is configured
+                if self.piper_model_path:
+                    if not cancelled.is_set():
+                        with tracing.activate(command_span):
+                            self._speak(response_text, cancelled)
+                else:
+                    print("(Piper TTS not configured, skipping speech output)")
+            else:
+                print("No callback set for processing command")
+        except Exception as e:
+            print(f"Error handling command: {e}")
+        finally:
+            command_span.end()
+            with self._command_lock:
+                current = self._command_cancel is cancelled
+                if current:
+                    self._command_cancel = None
+            # A newer command owns the status now
+            if current and not self.is_listening:
+                self.update_status("listening_for_wake_word")
         
-    def _speak(self, text):
+    @tracing.traced("voice.speak")
+    def _speak(self, text, cancelled=None):
         """Convert text to speech using Piper and play it"""
         if not self.piper_model_path:
             return
             
         self.update_status("speaking")
         
+        try:
+            self._say(text, cancelled)
+        finally:
+            if cancelled is None or not cancelled.is_set():
+                self.update_status("listening_for_wake_word")
+    
+    def _say(self, text, cancelled=None):
+        """Synthesize one piece of text with Piper and play it (no status changes); stops once `cancelled` is set"""
+        text = strip_citations(text).strip()
+        if not text or (cancelled is not None and cancelled.is_set()):
+            return
+        
         try:
             # Create temporary files
             with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_output:
@@ -308,29 +477,29 @@ class VoiceAssistant:
                 cmd.extend(['--config', self.piper_config_path])
             
             # Send text to Piper via stdin
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            process.communicate(input=text.encode('utf-8'))
+            with tracing.span("voice.speak.synthesize", chars=len(text)):
+                process = subprocess.Popen(
+                    cmd,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
+                
+                process.communicate(input=text.encode('utf-8'))
             
             # Play audio file
             if os.path.exists(output_path):
-                self._play_audio_file(output_path)
+                with tracing.span("voice.speak.playback"):
+                    self._play_audio_file(output_path, cancelled)
                 os.unlink(output_path)
             else:
                 print("Failed to generate speech")
                 
         except Exception as e:
             print(f"Error generating speech: {e}")
-        finally:
-            self.update_status("listening_for_wake_word")
             
-    def _play_audio_file(self, filepath):
-        """Play an audio file and emit audio levels for visualization"""
+    def _play_audio_file(self, filepath, cancelled=None):
+        """Play an audio file and emit audio levels for visualization; stops early once `cancelled` is set"""
         try:
             # Read WAV file
             with wave.open(filepath, 'rb') as wf:
@@ -346,7 +515,7 @@ class VoiceAssistant:
                 chunk_size = 1024
                 data = wf.readframes(chunk_size)
                 
-                while data:
+                while data and not (cancelled is not None and cancelled.is_set()):
                     stream.write(data)
                     
                     # Calculate audio level for visualization
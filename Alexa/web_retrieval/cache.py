@@ -1,15 +1,28 @@
+import hashlib
 import os
+import re
+import threading
+import time
+
+import config
 
 class DummyCache:
     """Simple in-memory cache when diskcache is missing."""
     def __init__(self, *args, **kwargs):
         self._store = {}
-        
+
     def get(self, key):
-        return self._store.get(key)
-        
+        entry = self._store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            self._store.pop(key, None)
+            return None
+        return value
+
     def set(self, key, value, expire=None):
-        self._store[key] = value
+        self._store[key] = (value, time.time() + expire if expire else None)
 
 try:
     import diskcache
@@ -21,22 +34,156 @@ except ImportError:
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "web_retrieval")
 
 if _HAS_DISKCACHE:
-    # 60 mins for search results
+    # Search results, TTL per query class (see search_ttl)
     SEARCH_CACHE = diskcache.Cache(os.path.join(CACHE_DIR, "search"))
     # 12 hours for content extraction
     CONTENT_CACHE = diskcache.Cache(os.path.join(CACHE_DIR, "content"))
+    # Final web_search_answer results, ANSWER_TTL / ANSWER_TTL_FRESH
+    ANSWER_CACHE = diskcache.Cache(os.path.join(CACHE_DIR, "answers"))
 else:
     SEARCH_CACHE = DummyCache()
     CONTENT_CACHE = DummyCache()
+    ANSWER_CACHE = DummyCache()
+
+# ---------------------------------------------------------------------
+#  Stats
+# ---------------------------------------------------------------------
+_stats_lock = threading.Lock()
+_stats = {
+    "search": {"hits": 0, "negative_hits": 0, "misses": 0, "writes": 0, "negative_writes": 0},
+    "content": {"hits": 0, "misses": 0, "writes": 0},
+    "answer": {"hits": 0, "source_hits": 0, "misses": 0, "writes": 0},
+}
+
+def _bump(cache: str, key: str):
+    with _stats_lock:
+        _stats[cache][key] += 1
+
+def get_stats() -> dict:
+    """Per-cache counters plus hit rate (negative and source hits count as hits)."""
+    with _stats_lock:
+        snapshot = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in snapshot.values():
+        hits = counts["hits"] + counts.get("negative_hits", 0) + counts.get("source_hits", 0)
+        lookups = hits + counts["misses"]
+        counts["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+    snapshot["backend"] = "diskcache" if _HAS_DISKCACHE else "memory"
+    return snapshot
+
+def reset_stats():
+    with _stats_lock:
+        for counts in _stats.values():
+            for key in counts:
+                counts[key] = 0
+
+# ---------------------------------------------------------------------
+#  Search results
+# ---------------------------------------------------------------------
+# Questions whose answer does not change from day to day
+_EVERGREEN_RE = re.compile(
+    r"^(?:what (?:is|are) an?|who (?:was|invented|wrote|discovered|founded|painted)|how (?:does|do)|"
+    r"define|definition of|meaning of|history of|why (?:is|are|do|does))\b"
+)
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a search query: trimmed, lowercased, single-spaced."""
+    return " ".join((query or "").strip().lower().split())
+
+def search_cache_key(query: str) -> str:
+    return f"search:{normalize_query(query)}"
 
-def get_search_cache(key):
-    return SEARCH_CACHE.get(key)
+def query_class(query: str) -> str:
+    """"news" (freshness-sensitive), "evergreen" (definitional/historical) or "default"."""
+    from .query_expansion import is_fresh
+    q = normalize_query(query)
+    if is_fresh(q):
+        return "news"
+    if _EVERGREEN_RE.match(q):
+        return "evergreen"
+    return "default"
 
-def set_search_cache(key, value, expire=3600):
-    SEARCH_CACHE.set(key, value, expire=expire)
+def search_ttl(query: str, results: list = None) -> int:
+    """Seconds to keep results for this query; empty results get the short negative TTL."""
+    if not results:
+        return config.SEARCH_NEGATIVE_TTL
+    return {
+        "news": config.SEARCH_TTL_NEWS,
+        "evergreen": config.SEARCH_TTL_EVERGREEN,
+    }.get(query_class(query), config.SEARCH_TTL_DEFAULT)
 
+def get_search_cache(query):
+    """
+    Cached results for a query (any phrasing with the same canonical form).
+    None on a miss; [] when the query recently returned nothing or failed.
+    """
+    value = SEARCH_CACHE.get(search_cache_key(query))
+    if value is None:
+        _bump("search", "misses")
+    elif value:
+        _bump("search", "hits")
+    else:
+        _bump("search", "negative_hits")
+    return value
+
+def set_search_cache(query, value, expire=None):
+    """Store results for a query; empty results are cached too, briefly."""
+    value = list(value or [])
+    expire = search_ttl(query, value) if expire is None else expire
+    SEARCH_CACHE.set(search_cache_key(query), value, expire=expire)
+    _bump("search", "writes" if value else "negative_writes")
+
+# ---------------------------------------------------------------------
+#  Extracted page content
+# ---------------------------------------------------------------------
 def get_content_cache(key):
-    return CONTENT_CACHE.get(key)
+    value = CONTENT_CACHE.get(key)
+    _bump("content", "hits" if value is not None else "misses")
+    return value
 
 def set_content_cache(key, value, expire=43200):
     CONTENT_CACHE.set(key, value, expire=expire)
+    _bump("content", "writes")
+
+# ---------------------------------------------------------------------
+#  Final answers
+# ---------------------------------------------------------------------
+# Two entries per answer: one keyed on the question alone (answers a repeat
+# instantly, before any search, but only for ANSWER_QUESTION_TTL since it
+# cannot tell whether the pages changed) and one keyed on the question plus
+# the content of the pages it was generated from, in citation order (skips
+# generation when a re-run fetches the same sources under the same [n]).
+def content_hash(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8", "ignore")).hexdigest()[:16]
+
+def _question_form(question: str, freshness: bool) -> str:
+    return f"{'fresh' if freshness else 'default'}:{normalize_query(question).rstrip('?.! ')}"
+
+def answer_ttl(freshness: bool) -> int:
+    return config.ANSWER_TTL_FRESH if freshness else config.ANSWER_TTL
+
+def question_ttl(freshness: bool) -> int:
+    return min(config.ANSWER_QUESTION_TTL, answer_ttl(freshness))
+
+def answer_source_key(question: str, freshness: bool, source_hashes: list) -> str:
+    """source_hashes: [(citation_id, content_hash)] in citation order; order matters for [n] references."""
+    sources = [f"{cid}={digest}" for cid, digest in source_hashes]
+    digest = hashlib.sha1("|".join([_question_form(question, freshness)] + sources).encode("utf-8"))
+    return f"answer:sources:{digest.hexdigest()}"
+
+def get_answer_cache(question: str, freshness: bool):
+    """Cached {"answer", "citations"} for this question, or None."""
+    value = ANSWER_CACHE.get(f"answer:q:{_question_form(question, freshness)}")
+    _bump("answer", "hits" if value is not None else "misses")
+    return value
+
+def get_answer_cache_for_sources(question: str, freshness: bool, source_hashes: list):
+    """Cached answer generated from exactly these sources, or None (not counted as a miss)."""
+    value = ANSWER_CACHE.get(answer_source_key(question, freshness, source_hashes))
+    if value is not None:
+        _bump("answer", "source_hits")
+    return value
+
+def set_answer_cache(question: str, freshness: bool, source_hashes: list, value: dict):
+    ANSWER_CACHE.set(f"answer:q:{_question_form(question, freshness)}", value, expire=question_ttl(freshness))
+    ANSWER_CACHE.set(answer_source_key(question, freshness, source_hashes), value, expire=answer_ttl(freshness))
+    _bump("answer", "writes")
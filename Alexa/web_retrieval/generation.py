@@ -1,4 +1,3 @@
-import requests
 import json
 import datetime
 try:
@@ -10,26 +9,41 @@ except ImportError:
     from .. import config
     OLLAMA_URL = config.OLLAMA_URL
     OLLAMA_MODEL = config.OLLAMA_MODEL
+import ollama_client
 
-def call_ollama(prompt: str, json_mode: bool = False) -> str:
-    url = f"{OLLAMA_URL}/api/generate"
-    payload = {
-        "model": OLLAMA_MODEL,
-        "prompt": prompt,
-        "stream": False,
-        "options": {"temperature": 0.2, "num_ctx": 4096}
-    }
-    if json_mode:
-        payload["format"] = "json"
-
+def call_ollama(prompt: str, json_mode: bool = False, task: str = "answer") -> str:
+    """task picks the model profile: "answer" for grounded answers, "query_planner" for plans."""
     try:
-        resp = requests.post(url, json=payload, timeout=60)
-        resp.raise_for_status()
-        return resp.json().get("response", "").strip()
+        resp = ollama_client.generate(
+            prompt,
+            task=task,
+            format="json" if json_mode else None,
+            base_url=OLLAMA_URL,
+        )
+        return resp.get("response", "").strip()
     except Exception as e:
         print(f"Ollama call failed: {e}")
         return ""
 
+def stream_ollama(prompt: str, on_token) -> str:
+    """
+    Streamed variant of call_ollama: on_token(text) is called for every chunk
+    as it arrives. Returns the full text, or "" on failure - also when the
+    stream breaks partway, so a truncated answer is never taken for a whole one.
+    """
+    parts = []
+
+    def collect(piece):
+        parts.append(piece)
+        on_token(piece)
+
+    try:
+        ollama_client.stream_generate(prompt, collect, task="answer", base_url=OLLAMA_URL)
+    except Exception as e:
+        print(f"Ollama stream failed after {len(parts)} chunk(s): {e}")
+        return ""
+    return "".join(parts).strip()
+
 def generate_plan(question: str, freshness: bool) -> dict:
     today = datetime.datetime.now().strftime("%B %Y")
     
@@ -48,7 +62,7 @@ Output JSON ONLY:
   "queries": ["query 1", "query 2", ...]
 }}
 """
-    resp = call_ollama(prompt, json_mode=True)
+    resp = call_ollama(prompt, json_mode=True, task="query_planner")
     if not resp:
         return {"queries": [question]}
     
@@ -61,11 +75,12 @@ Output JSON ONLY:
     
     return {"queries": [question]}
 
-def generate_grounded_answer(question: str, chunks: list, citations: list) -> str:
+def generate_grounded_answer(question: str, chunks: list, citations: list, on_token=None) -> str:
     """
     Generate answer grounded in web sources.
     chunks: list of text chunks with citation_id.
     citations: list of dicts with 'id', 'url', 'title', etc.
+    on_token: optional callback; when given the answer is streamed through it.
     """
     
     context_str = ""
@@ -88,12 +103,15 @@ Instructions:
 
 Answer:"""
     
+    if on_token:
+        return stream_ollama(prompt, on_token)
     return call_ollama(prompt)
 
-def generate_direct_answer(question: str) -> str:
+def generate_direct_answer(question: str, on_token=None) -> str:
     """
     Generate a direct LLM answer without web sources.
     Used as fallback when web retrieval fails.
+    on_token: optional callback; when given the answer is streamed through it.
     """
     prompt = f"""You are a helpful AI assistant. Answer the user's question to the best of your knowledge.
 
@@ -107,7 +125,7 @@ Instructions:
 
 Answer:"""
     
-    answer = call_ollama(prompt)
+    answer = stream_ollama(prompt, on_token) if on_token else call_ollama(prompt)
     if not answer:
         return "I'm having trouble generating a response right now."
     return answer
@@ -1,19 +1,160 @@
-import datetime
 import logging
-from .generation import generate_plan, generate_grounded_answer, generate_direct_answer
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from .generation import generate_grounded_answer, generate_direct_answer
 from .search_client import execute_web_query, clean_url
-from .processing import rerank_candidates, fetch_content, chunk_text
-from .cache import get_search_cache, set_search_cache
+from .processing import rerank_candidates, fetch_many, select_passages
+from .cache import (get_search_cache, set_search_cache, get_answer_cache,
+                    get_answer_cache_for_sources, set_answer_cache, content_hash)
+from .query_expansion import is_fresh, plan_queries
+import config
+import tracing
 
 logger = logging.getLogger(__name__)
 
-def web_search_answer(question: str, freshness: bool = False, force_refresh: bool = False) -> dict:
+# Shared by all requests; each planned query is one job
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=config.SEARCH_MAX_WORKERS, thread_name_prefix="search")
+
+def _run_query(query: str, force_refresh: bool = False) -> list:
+    """One planned query, served from the search cache when possible."""
+    results = get_search_cache(query) if not force_refresh else None
+    if results is not None:
+        return results
+    with tracing.span("retrieval.search.query", query=query):
+        results = execute_web_query(query)
+    # Empty results are cached too (briefly) so a failing query is not retried every turn
+    set_search_cache(query, results)
+    if results:
+        logger.info(f"Query '{query}' returned {len(results)} results")
+    return results or []
+
+def search_queries(queries: list, force_refresh: bool = False, deadline: float = None, debug_log: dict = None) -> list:
+    """
+    Run the planned queries concurrently and merge their results.
+
+    Results are merged in plan order (then rank order within a query) and
+    deduplicated by cleaned URL, so the candidate list does not depend on which
+    query finished first. Queries still running when the deadline expires are
+    left out.
+    """
+    deadline = config.SEARCH_DEADLINE if deadline is None else deadline
+    errors = debug_log["errors"] if debug_log is not None else []
+
+    started = time.monotonic()
+    futures = [(q, _SEARCH_EXECUTOR.submit(tracing.wrap(_run_query), q, force_refresh)) for q in queries]
+    wait([f for _, f in futures], timeout=deadline)
+
+    candidates = []
+    seen_urls = set()
+    for q, future in futures:
+        if not future.done():
+            future.cancel()
+            logger.warning(f"Query '{q}' missed the {deadline:.1f}s search deadline")
+            errors.append(f"Query timed out: {q}")
+            continue
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Search query '{q}' failed: {e}")
+            errors.append(f"Query failed: {str(e)}")
+            continue
+        if not results:
+            logger.warning(f"Query '{q}' returned no results")
+            continue
+
+        for res in results:
+            url = clean_url(res.get("url"))
+            if url not in seen_urls:
+                seen_urls.add(url)
+                candidates.append(dict(res, url=url))  # copy: don't touch cached results
+
+    logger.info(f"Searched {len(queries)} queries in {(time.monotonic() - started) * 1000:.0f}ms")
+    return candidates
+
+FAILURE_PHRASES = (
+    "i couldn't find sufficient information",
+    "i could not find sufficient information",
+    "context doesn't contain",
+    "context does not contain",
+)
+
+class _GuardedStream:
+    """
+    Forwards streamed answer tokens to on_event("token", ...), holding back the
+    first few characters: a grounded answer that opens with a failure phrase is
+    swallowed so the fallback answer can replace it without the user seeing it.
+    """
+
+    HOLD_CHARS = 64
+
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self.held = []
+        self.flushed = False
+        self.emitted = False
+
+    def __call__(self, text: str):
+        if self.flushed:
+            self.emit(text)
+            return
+        self.held.append(text)
+        head = "".join(self.held)
+        if len(head) >= self.HOLD_CHARS:
+            self.flush()
+
+    def failed_early(self) -> bool:
+        head = "".join(self.held).lower()
+        return not self.flushed and any(p in head for p in FAILURE_PHRASES)
+
+    def flush(self):
+        if self.flushed:
+            return
+        self.flushed = True
+        head = "".join(self.held)
+        self.held = []
+        if head and not any(p in head.lower() for p in FAILURE_PHRASES):
+            self.emit(head)
+
+    def emit(self, text: str):
+        """Pass text straight through (used for the fallback answer)."""
+        self.emitted = True
+        _emit(self.on_event, "token", {"text": text})
+
+def _from_answer_cache(cached: dict, how: str, debug_log: dict, on_event=None, emit_citations: bool = True) -> dict:
+    """Replay a cached answer: same result shape, streamed as one token."""
+    debug_log["answer_cache"] = how
+    tracing.annotate(answer_cache=how)
+    citations = list(cached.get("citations", []))
+    if emit_citations and citations:
+        _emit(on_event, "citations", {"citations": citations})
+    _emit(on_event, "token", {"text": cached["answer"]})
+    return {"answer": cached["answer"], "citations": citations, "debug": debug_log}
+
+def _emit(on_event, kind: str, payload: dict):
+    if on_event is None:
+        return
+    try:
+        on_event(kind, payload)
+    except Exception as e:
+        logger.warning(f"Stream listener failed on '{kind}': {e}")
+
+@tracing.traced("retrieval.web_search_answer")
+def web_search_answer(question: str, freshness: bool = False, force_refresh: bool = False, on_event=None) -> dict:
     """
     Web search pipeline that ALWAYS returns an answer.
     
     If web retrieval fails, falls back to direct LLM answer.
     Never returns "I couldn't find..." - always provides value.
     
+    Grounded answers are cached (see cache.py): a repeated question is answered
+    before searching, and a re-run that fetches unchanged sources skips
+    generation. force_refresh bypasses both lookups (the result is still stored).
+
+    on_event(kind, payload), when given, turns on streaming:
+        "citations" {"citations": [...]}  once sources are fetched, before generation
+        "token"     {"text": str}         answer text as it is generated
+        "reset"     {}                    discard streamed text; a fallback answer follows
+    
     Returns:
         dict with keys: answer, citations, debug
     """
@@ -21,134 +162,132 @@ def web_search_answer(question: str, freshness: bool = False, force_refresh: boo
     
     try:
         # 1. Freshness detection
-        fresh_kw = ["latest", "recent", "news", "today", "yesterday", "current", str(datetime.datetime.now().year)]
-        if any(kw in question.lower() for kw in fresh_kw):
+        if is_fresh(question):
             freshness = True
+
+        use_answer_cache = config.ANSWER_CACHE_ENABLED
+        if use_answer_cache and not force_refresh:
+            cached = get_answer_cache(question, freshness)
+            if cached:
+                return _from_answer_cache(cached, "hit", debug_log, on_event)
         
-        # 2. Planning
-        plan = generate_plan(question, freshness)
-        queries = plan.get("queries", [question])
-        debug_log["queries"] = queries
-        logger.info(f"Generated {len(queries)} search queries")
-
-        # 3. Search (DuckDuckGo via search_client)
-        candidates = []
-        seen_urls = set()
-        
-        for q in queries:
-            # Check cache
-            cache_key = f"search:{q}"
-            results = get_search_cache(cache_key) if not force_refresh else None
-            
-            if not results:
-                try:
-                    results = execute_web_query(q)
-                    if results:
-                        set_search_cache(cache_key, results)
-                        logger.info(f"Query '{q}' returned {len(results)} results")
-                except Exception as e:
-                    logger.error(f"Search query '{q}' failed: {e}")
-                    debug_log["errors"].append(f"Query failed: {str(e)}")
-                    continue
-            
-            if not results:
-                logger.warning(f"Query '{q}' returned no results")
-                continue
-
-            for res in results:
-                url = clean_url(res.get("url"))
-                if url not in seen_urls:
-                    seen_urls.add(url)
-                    res["url"] = url # update to clean
-                    candidates.append(res)
+        # 2. Planning (deterministic expansion for simple questions, LLM planner otherwise)
+        with tracing.span("retrieval.plan", freshness=freshness) as stage:
+            plan = plan_queries(question, freshness)
+            queries = plan["queries"]
+            debug_log["queries"] = queries
+            debug_log["query_mode"] = plan["mode"]
+            logger.info(f"Generated {len(queries)} search queries ({plan['mode']})")
+            stage.set(queries=len(queries), mode=plan["mode"])
+
+        # 3. Search (DuckDuckGo via search_client, queries fanned out concurrently)
+        with tracing.span("retrieval.search", queries=len(queries)) as stage:
+            candidates = search_queries(queries, force_refresh=force_refresh, debug_log=debug_log)
+            stage.set(candidates=len(candidates))
         
         # 3.1 Rerank
-        top_candidates = rerank_candidates(question, candidates, top_k=4)
-        debug_log["ranked_urls"] = [c["url"] for c in top_candidates]
-        logger.info(f"Reranked to {len(top_candidates)} candidates")
+        with tracing.span("retrieval.rerank", candidates=len(candidates)):
+            top_candidates = rerank_candidates(question, candidates, top_k=4)
+            debug_log["ranked_urls"] = [c["url"] for c in top_candidates]
+            logger.info(f"Reranked to {len(top_candidates)} candidates")
         
-        # 4. Fetch & Extract
-        sources_text = []
-        citations = []
+        # 4. Fetch & Extract (concurrent, per-host capped, deadline-bound)
+        with tracing.span("retrieval.fetch", urls=len(top_candidates)) as stage:
+            pages = []
+            citations = []
+            # All pages at once; whatever is not back by FETCH_DEADLINE is skipped
+            fetched = fetch_many([cand["url"] for cand in top_candidates])
         
-        for idx, cand in enumerate(top_candidates):
-            cid = idx + 1
-            meta = {
-                "id": cid,
-                "title": cand.get("title"),
-                "url": cand.get("url"),
-                "published": cand.get("published_date"),
-            }
+            for idx, (cand, extracted) in enumerate(zip(top_candidates, fetched)):
+                cid = idx + 1
+                meta = {
+                    "id": cid,
+                    "title": cand.get("title"),
+                    "url": cand.get("url"),
+                    "published": cand.get("published_date"),
+                }
             
-            try:
-                extracted = fetch_content(cand["url"])
-                if extracted.get("error"):
-                    logger.warning(f"Fetch failed {cand['url']}: {extracted['error']}")
-                    debug_log["errors"].append(f"Fetch failed {cand['url']}: {extracted['error']}")
-                    continue
-                    
-                text = extracted.get("text", "")
-                if not text:
-                    # Fallback to snippet if extraction failed but search had snippet
-                    text = cand.get("snippet", "")
+                try:
+                    if extracted.get("error"):
+                        logger.warning(f"Fetch failed {cand['url']}: {extracted['error']}")
+                        debug_log["errors"].append(f"Fetch failed {cand['url']}: {extracted['error']}")
+                        continue
                     
-                # Truncate immense pages
-                text = text[:12000] 
-                
-                chunks = chunk_text(text, chunk_size=1500, overlap=100)
-                # Take first 2 chunks max per source to stay in context limit
-                best_chunks = chunks[:2]
-                
-                for ch in best_chunks:
-                    sources_text.append({"text": ch, "citation_id": cid})
+                    text = extracted.get("text", "")
+                    if not text:
+                        # Fallback to snippet if extraction failed but search had snippet
+                        text = cand.get("snippet", "")
                     
-                citations.append(meta)
-            except Exception as e:
-                logger.error(f"Error processing {cand['url']}: {e}")
-                debug_log["errors"].append(f"Processing error: {str(e)}")
-                continue
+                    # Truncate immense pages
+                    pages.append({"citation_id": cid, "text": text[:12000]})
+                    citations.append(meta)
+                except Exception as e:
+                    logger.error(f"Error processing {cand['url']}: {e}")
+                    debug_log["errors"].append(f"Processing error: {str(e)}")
+                    continue
+            stage.set(sources=len(citations))
+
+        # 4.1 Passage selection: best chunks across all pages, packed into the prompt budget
+        with tracing.span("retrieval.passages", sources=len(pages)) as stage:
+            sources_text = select_passages(question, pages)
+            debug_log["passages"] = [(p["citation_id"], p["score"]) for p in sources_text]
+            stage.set(chunks=len(sources_text))
+        if citations:
+            _emit(on_event, "citations", {"citations": citations})
+
+        # Keyed in citation order: a cached "[1]" must still point at the same page
+        source_hashes = [(p["citation_id"], content_hash(p["text"])) for p in pages]
+        if use_answer_cache and sources_text and not force_refresh:
+            cached = get_answer_cache_for_sources(question, freshness, source_hashes)
+            if cached:
+                return _from_answer_cache(dict(cached, citations=citations), "sources", debug_log, on_event,
+                                          emit_citations=False)
 
         # 5. Generate Answer
-        answer = ""
-        used_fallback = False
+        with tracing.span("retrieval.generate") as stage:
+            answer = ""
+            used_fallback = False
         
-        if sources_text:
-            # We have web sources - generate grounded answer
-            logger.info(f"Generating grounded answer from {len(sources_text)} text chunks")
-            try:
-                # Try to generate answer from sources
-                grounded_answer = generate_grounded_answer(question, sources_text, citations)
-                
-                # Check for "I couldn't find" or similar failure modes
-                failure_phrases = [
-                    "i couldn't find sufficient information",
-                    "i could not find sufficient information",
-                    "context doesn't contain",
-                    "context does not contain"
-                ]
+            stream = _GuardedStream(on_event) if on_event else None
+            if sources_text:
+                # We have web sources - generate grounded answer
+                logger.info(f"Generating grounded answer from {len(sources_text)} text chunks")
+                try:
+                    # Try to generate answer from sources
+                    grounded_answer = generate_grounded_answer(question, sources_text, citations, on_token=stream)
+                    if stream and not stream.failed_early():
+                        stream.flush()
                 
-                if any(phrase in grounded_answer.lower() for phrase in failure_phrases) or not grounded_answer.strip():
-                     logger.warning("Grounded answer failed to find info, falling back to direct LLM.")
-                     used_fallback = True
-                else:
-                    answer = grounded_answer
-            except Exception as e:
-                logger.error(f"Grounded generation failed: {e}")
+                    # Check for "I couldn't find" or similar failure modes
+                    if any(phrase in grounded_answer.lower() for phrase in FAILURE_PHRASES) or not grounded_answer.strip():
+                         logger.warning("Grounded answer failed to find info, falling back to direct LLM.")
+                         used_fallback = True
+                    else:
+                        answer = grounded_answer
+                except Exception as e:
+                    logger.error(f"Grounded generation failed: {e}")
+                    used_fallback = True
+            else:
                 used_fallback = True
-        else:
-            used_fallback = True
             
-        if used_fallback:
-            # No web sources or grounded answer failed - fallback to direct LLM answer
-            logger.warning("Using direct LLM answer (fallback)")
-            debug_log["fallback_used"] = True
-            # Clear citations if we are falling back (because the answer isn't based on them)
-            # BUT user says: "Images and sources are ADDITIONS"
-            # If we used fallback because sources were IRRELEVANT, we shouldn't show them?
-            # Or if we used fallback because Fetch Failed, we have no sources anyway.
-            # If we have sources but LLM couldn't use them, maybe keep them as "See also"?
-            # For now, let's keep citations if they exist, but answer is direct.
-            answer = generate_direct_answer(question)
+            if used_fallback:
+                # No web sources or grounded answer failed - fallback to direct LLM answer
+                logger.warning("Using direct LLM answer (fallback)")
+                debug_log["fallback_used"] = True
+                # Clear citations if we are falling back (because the answer isn't based on them)
+                # BUT user says: "Images and sources are ADDITIONS"
+                # If we used fallback because sources were IRRELEVANT, we shouldn't show them?
+                # Or if we used fallback because Fetch Failed, we have no sources anyway.
+                # If we have sources but LLM couldn't use them, maybe keep them as "See also"?
+                # For now, let's keep citations if they exist, but answer is direct.
+                if stream and stream.emitted:
+                    # Part of the failed grounded answer already reached the listener
+                    _emit(on_event, "reset", {})
+                answer = generate_direct_answer(question, on_token=stream.emit if stream else None)
+            stage.set(fallback=used_fallback)
+
+        if use_answer_cache and not used_fallback and answer:
+            set_answer_cache(question, freshness, source_hashes, {"answer": answer, "citations": citations})
         
         return {
             "answer": answer,
@@ -162,8 +301,11 @@ def web_search_answer(question: str, freshness: bool = False, force_refresh: boo
         debug_log["errors"].append(f"Pipeline failure: {str(e)}")
         debug_log["fallback_used"] = True
         
+        # Whatever was streamed belongs to the failed run; the fallback streams like the normal one
+        _emit(on_event, "reset", {})
+        stream = _GuardedStream(on_event) if on_event else None
         try:
-            answer = generate_direct_answer(question)
+            answer = generate_direct_answer(question, on_token=stream.emit if stream else None)
         except Exception as e2:
             logger.error(f"Even LLM fallback failed: {e2}")
             answer = "I'm having trouble processing that request right now, but I'm here to help."
@@ -16,127 +16,310 @@ try:
 except ImportError:
     _HAS_NUMPY = False
 
-import requests
+import bisect
+import hashlib
+import json
+import re
+import threading
 import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bm25 import BM25Index
+import config
+import tracing
 from .cache import get_content_cache, set_content_cache
 
-# Initialize Reranker (Lazy load to avoid startup delay if possible, but here global is okay)
-# usage of CPU is requested.
+# ---------------------------------------------------------------------
+#  Reranking
+# ---------------------------------------------------------------------
+# Loaded lazily (or by warm_up_reranker_async at startup), always on CPU
 RERANKER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
 _RERANKER = None
+_reranker_lock = threading.Lock()
+_loader = None                # the background load thread, once started
+_loader_lock = threading.Lock()
+
+# One worker: predictions are serialized so concurrent requests do not oversubscribe the CPU.
+# A prediction that outlives its budget keeps running here and still fills the score cache.
+_RERANK_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+_score_cache = OrderedDict()  # (query, text hash) -> cross-encoder score
+_score_cache_lock = threading.Lock()
 
-def get_reranker():
+def get_reranker(block: bool = True):
+    """
+    The cross-encoder, loading it on first use. False if unavailable.
+    With block=False it never loads on the caller's thread: until the model
+    is ready it returns None and starts the load in the background if no
+    warm-up has.
+    """
     global _RERANKER
-    if _RERANKER is None:
-        if not _HAS_SENTENCE_TRANSFORMERS or not _HAS_NUMPY:
-            # print("sentence_transformers or numpy not installed, skipping reranker.")
-            _RERANKER = False
-            return _RERANKER
-            
+    if _RERANKER is not None:
+        return _RERANKER
+    if not block:
+        warm_up_reranker_async()
+        return None
+    with _reranker_lock:
+        if _RERANKER is None:
+            if not _HAS_SENTENCE_TRANSFORMERS or not _HAS_NUMPY:
+                # print("sentence_transformers or numpy not installed, skipping reranker.")
+                _RERANKER = False
+                return _RERANKER
+
+            try:
+                # print(f"Loading reranker model: {RERANKER_MODEL_NAME}...")
+                if config.RERANK_THREADS > 0:
+                    import torch
+                    torch.set_num_threads(config.RERANK_THREADS)
+                _RERANKER = CrossEncoder(RERANKER_MODEL_NAME, device='cpu')
+            except Exception as e:
+                # print(f"Failed to load reranker: {e}")
+                _RERANKER = False # sentinel for failed
+        return _RERANKER
+
+def warm_up_reranker():
+    """Load the cross-encoder and run one prediction so the first request does not pay for it."""
+    ranker = get_reranker()
+    if ranker:
+        ranker.predict([("warm up", "warm up")], batch_size=1)
+    return bool(ranker)
+
+def warm_up_reranker_async() -> threading.Thread:
+    """Run warm_up_reranker() without blocking startup. Starts it once; later calls get the same thread."""
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = threading.Thread(target=warm_up_reranker, name="reranker-warmup", daemon=True)
+            _loader.start()
+        return _loader
+
+def _text_key(query: str, text: str) -> tuple:
+    return (query, hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest())
+
+def _predict_and_cache(ranker, query: str, texts: list, keys: list) -> list:
+    scores = ranker.predict([(query, t) for t in texts], batch_size=config.RERANK_BATCH_SIZE)
+    scores = [float(x) for x in scores]
+    with _score_cache_lock:
+        for key, score in zip(keys, scores):
+            _score_cache[key] = score
+            _score_cache.move_to_end(key)
+        while len(_score_cache) > config.RERANK_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+    return scores
+
+def cross_encoder_scores(query: str, texts: list, budget: float = None):
+    """
+    Cross-encoder scores for (query, text) pairs, or None when they cannot be
+    had in time: no model, the model still loading, a prediction error, or
+    the uncached pairs not scored within `budget` seconds (default
+    RERANK_BUDGET). Cached scores are reused without touching the model.
+    """
+    budget = config.RERANK_BUDGET if budget is None else budget
+    ranker = get_reranker(block=False)
+    if not ranker:
+        return None
+
+    keys = [_text_key(query, t) for t in texts]
+    with _score_cache_lock:
+        cached = [_score_cache.get(k) for k in keys]
+    missing = [i for i, score in enumerate(cached) if score is None]
+    tracing.annotate(cache_hits=len(texts) - len(missing))
+    if missing:
+        future = _RERANK_EXECUTOR.submit(
+            _predict_and_cache, ranker, query, [texts[i] for i in missing], [keys[i] for i in missing]
+        )
         try:
-            # print(f"Loading reranker model: {RERANKER_MODEL_NAME}...")
-            _RERANKER = CrossEncoder(RERANKER_MODEL_NAME, device='cpu')
-        except Exception as e:
-            # print(f"Failed to load reranker: {e}")
-            _RERANKER = False # sentinel for failed
-    return _RERANKER
+            fresh = future.result(timeout=budget)
+        except FutureTimeout:
+            tracing.annotate(budget_exceeded=True)
+            return None
+        except Exception:
+            return None
+        for i, score in zip(missing, fresh):
+            cached[i] = score
+    return cached
+
+def _lexical_scores(query: str, texts: list) -> list:
+    return BM25Index(texts).scores(query)
 
 def rerank_candidates(query: str, candidates: list, top_k: int = 4) -> list:
-    """Rerank candidates based on query-document relevance."""
+    """
+    Rerank candidates based on query-document relevance.
+
+    Returns the top_k as new dicts with a "score"; the input list is not
+    modified. Candidates are first ranked with BM25 over title + snippet
+    (no model needed, ties keep arrival order). When the cross-encoder is
+    available the RERANK_PREFILTER best of those are rescored with it within
+    RERANK_BUDGET; otherwise, or when it is over budget or fails, the BM25
+    order stands.
+    """
     if not candidates:
         return []
 
-    ranker = get_reranker()
-    if not ranker:
-        # Fallback: simple dedupe and return top_k
-        return candidates[:top_k]
+    texts = [f"{cand.get('title', '')} {cand.get('snippet', '')}" for cand in candidates]
+    scores = _lexical_scores(query, texts)
+    order = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+    method = "lexical"
 
-    # Prepare pairs: [ (query, title + " " + snippet), ... ]
-    pairs = []
-    for cand in candidates:
-        text = f"{cand.get('title', '')} {cand.get('snippet', '')}"
-        pairs.append((query, text))
+    if get_reranker(block=False) is not False:
+        shortlist = order[:config.RERANK_PREFILTER] if config.RERANK_PREFILTER > 0 else order
+        ce_scores = cross_encoder_scores(query, [texts[i] for i in shortlist])
+        if ce_scores is not None:
+            for i, score in zip(shortlist, ce_scores):
+                scores[i] = score
+            order = sorted(shortlist, key=lambda i: (-scores[i], i)) + order[len(shortlist):]
+            method = "cross_encoder"
+            tracing.annotate(prefiltered=len(candidates) - len(shortlist))
+    tracing.annotate(method=method)
 
-    scores = ranker.predict(pairs)
-    
-    # Attach scores
-    for i, cand in enumerate(candidates):
-        cand['score'] = float(scores[i])
+    return [dict(candidates[i], score=float(scores[i])) for i in order[:top_k]]
 
-    # Sort descending
-    candidates.sort(key=lambda x: x['score'], reverse=True)
-    return candidates[:top_k]
+# ---------------------------------------------------------------------
+#  Fetching
+# ---------------------------------------------------------------------
+# One pooled session keeps connections (and TLS handshakes) alive between pages
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=config.FETCH_MAX_WORKERS))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=config.FETCH_MAX_WORKERS))
+_SESSION.headers.update({"User-Agent": "Mozilla/5.0 (compatible; VectorAssistant/1.0)"})
 
-def fetch_content(url: str, timeout: int = 10) -> dict:
-    """
-    Fetch URL content, extracting main text and metadata.
-    Uses caching.
-    """
-    # Check cache
-    cached = get_content_cache(url)
-    if cached:
-        return cached
+# Downloads are I/O bound; extraction (trafilatura / lxml) is CPU bound and gets its own smaller
+# pool so parsing does not tie up download workers. These are threads: extraction runs mostly
+# under the GIL, so it overlaps with downloads but pages are not parsed in parallel.
+_FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=config.FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+_EXTRACT_EXECUTOR = ThreadPoolExecutor(max_workers=config.EXTRACT_WORKERS, thread_name_prefix="extract")
 
-    # Fetch
-    try:
-        if not _HAS_TRAFILATURA:
-            # Fallback: simple requests get
-            try:
-                resp = requests.get(url, timeout=timeout)
-                resp.raise_for_status()
-                # Very basic text extraction as last resort
-                # This is better than nothing if trafilatura is missing
-                text = resp.text
-                # Remove script/style tags (rudimentary)
-                import re
-                text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
-                text = re.sub(r'<style.*?>.*?</style>', '', text, flags=re.DOTALL)
-                text = re.sub(r'<[^>]+>', ' ', text)
-                text = re.sub(r'\s+', ' ', text).strip()
-                
-                extracted = {
-                    "text": text[:5000],  # Limit length for fallback
-                    "title": "",
-                    "author": None,
-                    "published": None,
-                    "url": url,
-                    "accessed": time.strftime("%Y-%m-%dT%H:%M:%S%z")
-                }
-                set_content_cache(url, extracted)
-                return extracted
-            except Exception as e:
-                return {"error": f"Basic fetch failed: {str(e)}"}
-
-        downloaded = trafilatura.fetch_url(url)
-        if not downloaded:
-            return {"error": "Empty response"}
-        
-        result = trafilatura.extract(downloaded, output_format='json', include_comments=False)
-        if not result:
-            return {"error": "Extraction failed"}
-        
-        # trafilatura json format: {"text": "...", "title": "...", "date": "...", ...}
-        import json
-        data = json.loads(result)
-        
-        # Normalize
-        extracted = {
-            "text": data.get("text", ""),
-            "title": data.get("title", ""),
-            "author": data.get("author"),
-            "published": data.get("date"),
+_host_lock = threading.Lock()
+_host_slots = {}
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    host = urllib.parse.urlparse(url).netloc.lower()
+    with _host_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(config.FETCH_PER_HOST)
+        return slot
+
+def _download(url: str, timeout: float) -> str:
+    with _host_slot(url):
+        resp = _SESSION.get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.text
+
+def extract_content(url: str, html: str) -> dict:
+    """Main text and metadata from a downloaded page."""
+    if not _HAS_TRAFILATURA:
+        # Very basic text extraction as last resort
+        # This is better than nothing if trafilatura is missing
+        text = re.sub(r'<script.*?>.*?</script>', '', html, flags=re.DOTALL)
+        text = re.sub(r'<style.*?>.*?</style>', '', text, flags=re.DOTALL)
+        text = re.sub(r'<[^>]+>', ' ', text)
+        text = re.sub(r'\s+', ' ', text).strip()
+        return {
+            "text": text[:5000],  # Limit length for fallback
+            "title": "",
+            "author": None,
+            "published": None,
             "url": url,
             "accessed": time.strftime("%Y-%m-%dT%H:%M:%S%z")
         }
 
-        set_content_cache(url, extracted)
-        return extracted
+    result = trafilatura.extract(html, output_format='json', include_comments=False)
+    if not result:
+        return {"error": "Extraction failed"}
+
+    # trafilatura json format: {"text": "...", "title": "...", "date": "...", ...}
+    data = json.loads(result)
 
+    # Normalize
+    return {
+        "text": data.get("text", ""),
+        "title": data.get("title", ""),
+        "author": data.get("author"),
+        "published": data.get("date"),
+        "url": url,
+        "accessed": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+
+def _fetch(url: str, timeout: float, extract_in_pool: bool) -> dict:
+    cached = get_content_cache(url)
+    if cached:
+        return cached
+
+    try:
+        html = _download(url, timeout)
+    except Exception as e:
+        return {"error": f"Fetch failed: {str(e)}"}
+    if not html:
+        return {"error": "Empty response"}
+
+    try:
+        if extract_in_pool:
+            extracted = _EXTRACT_EXECUTOR.submit(extract_content, url, html).result()
+        else:
+            extracted = extract_content(url, html)
     except Exception as e:
         return {"error": str(e)}
 
+    if not extracted.get("error"):
+        set_content_cache(url, extracted)
+    return extracted
+
+def fetch_content(url: str, timeout: int = 10) -> dict:
+    """
+    Fetch URL content, extracting main text and metadata.
+    Uses caching.
+    """
+    return _fetch(url, timeout, extract_in_pool=False)
+
+def fetch_many(urls: list, deadline: float = None, timeout: float = 10) -> list:
+    """
+    Fetch and extract several pages concurrently.
+
+    Downloads share a pooled session and at most FETCH_PER_HOST run against
+    one host at a time; extraction runs on a separate worker pool. `timeout`
+    applies to each download; the stage as a whole is bounded by `deadline`
+    seconds (FETCH_DEADLINE by default). Returns one entry per url, in input
+    order: the extracted dict, or {"error": "Deadline exceeded"} for pages
+    not finished by the deadline.
+    """
+    deadline = config.FETCH_DEADLINE if deadline is None else deadline
+    futures = [_FETCH_EXECUTOR.submit(tracing.wrap(_fetch), url, timeout, True) for url in urls]
+    wait(futures, timeout=deadline)
+
+    results = []
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            results.append({"error": "Deadline exceeded"})
+            continue
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append({"error": str(e)})
+    return results
+
+# ---------------------------------------------------------------------
+#  Chunking
+# ---------------------------------------------------------------------
+CHARS_PER_TOKEN = 4  # close enough for English prose with the llama tokenizers
+
+# Paragraph break, or a sentence end (. ! ? plus closing quotes/brackets) followed by whitespace
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_RE = re.compile(r"[.!?][\"')\]]*\s+")
+_SPACE_RE = re.compile(r"\s*")
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose)."""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> list:
-    """Simple character-based chunking."""
+    """Simple character-based chunking (kept as the chunk_spans baseline)."""
     if not text:
         return []
     
@@ -148,3 +331,110 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> list:
         chunks.append(chunk)
         start += (chunk_size - overlap)
     return chunks
+
+def chunk_spans(text: str, max_tokens: int = 200, overlap_tokens: int = 0) -> list:
+    """
+    Split text into chunks of at most ~max_tokens, as (start, end) offsets.
+
+    Chunks end at a paragraph break when one falls in the second half of the
+    window, otherwise at the last sentence end, otherwise at the last space;
+    only a single unbroken run longer than the window is cut mid-word.
+    Leading/trailing whitespace is excluded from each span. overlap_tokens
+    restarts the next chunk at the first sentence within that distance of the
+    previous end. Nothing is copied: slice text[start:end] when needed.
+    """
+    if not text:
+        return []
+    n = len(text)
+    limit = max(1, max_tokens) * CHARS_PER_TOKEN
+    overlap = min(max(0, overlap_tokens) * CHARS_PER_TOKEN, limit // 2)
+    paragraphs = [m.end() for m in _PARAGRAPH_RE.finditer(text)]
+    sentences = sorted(set([m.end() for m in _SENTENCE_RE.finditer(text)] + paragraphs))
+
+    spans = []
+    cut = 0
+    start = _SPACE_RE.match(text, 0).end()
+    while start < n:
+        window = start + limit
+        floor = max(start, cut)  # an overlapping chunk must still end past the previous one
+        if window >= n:
+            cut = n
+        else:
+            i = bisect.bisect_right(paragraphs, window) - 1
+            if i >= 0 and paragraphs[i] > max(start + limit // 2, floor):
+                cut = paragraphs[i]
+            else:
+                i = bisect.bisect_right(sentences, window) - 1
+                if i >= 0 and sentences[i] > floor:
+                    cut = sentences[i]
+                else:
+                    space = text.rfind(" ", floor + 1, window)
+                    cut = space + 1 if space > floor else window
+
+        end = cut
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            spans.append((start, end))
+
+        next_start = cut
+        if overlap and cut < n:
+            i = bisect.bisect_left(sentences, cut - overlap)
+            if i < len(sentences) and start < sentences[i] < cut:
+                next_start = sentences[i]
+        start = _SPACE_RE.match(text, next_start).end()
+    return spans
+
+# ---------------------------------------------------------------------
+#  Passage selection
+# ---------------------------------------------------------------------
+def select_passages(query: str, pages: list, token_budget: int = None,
+                    max_per_source: int = None, use_cross_encoder: bool = None) -> list:
+    """
+    Pick the chunks most relevant to the query across all fetched pages.
+
+    pages: list of {"citation_id": ..., "text": ...}, in source rank order.
+    Every page is chunked; chunks are scored with BM25 against the query and,
+    when a cross-encoder is loaded, the BM25 shortlist is rescored with it.
+    The best chunks are packed greedily into token_budget, at most
+    max_per_source per page. Returns [{"text", "citation_id", "score"}] best
+    first. Ties (e.g. no query term matches anywhere) keep page and position
+    order, so the result degrades to "leading chunks of the top sources".
+    """
+    token_budget = config.PASSAGE_TOKEN_BUDGET if token_budget is None else token_budget
+    max_per_source = config.PASSAGE_MAX_PER_SOURCE if max_per_source is None else max_per_source
+    use_cross_encoder = config.PASSAGE_CROSS_ENCODER if use_cross_encoder is None else use_cross_encoder
+
+    passages = []
+    for page in pages:
+        text = page.get("text", "")
+        for start, end in chunk_spans(text, max_tokens=config.PASSAGE_CHUNK_TOKENS):
+            passages.append({"text": text[start:end], "citation_id": page["citation_id"], "span": (start, end)})
+    if not passages:
+        return []
+
+    scores = BM25Index([p["text"] for p in passages]).scores(query)
+    order = sorted(range(len(passages)), key=lambda i: (-scores[i], i))
+
+    if use_cross_encoder:
+        shortlist = order[:config.PASSAGE_RERANK_TOP]
+        ce_scores = cross_encoder_scores(query, [passages[i]["text"] for i in shortlist])
+        if ce_scores is not None:  # otherwise keep the BM25 order
+            for i, s in zip(shortlist, ce_scores):
+                scores[i] = s
+            order = sorted(shortlist, key=lambda i: (-scores[i], i)) + order[len(shortlist):]
+
+    selected = []
+    used_tokens = 0
+    per_source = {}
+    for i in order:
+        p = passages[i]
+        cost = approx_tokens(p["text"])
+        if per_source.get(p["citation_id"], 0) >= max_per_source:
+            continue
+        if used_tokens + cost > token_budget:
+            continue
+        per_source[p["citation_id"]] = per_source.get(p["citation_id"], 0) + 1
+        used_tokens += cost
+        selected.append(dict(p, score=round(scores[i], 4)))
+    return selected
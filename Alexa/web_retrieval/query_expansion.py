@@ -0,0 +1,83 @@
+"""
+Deterministic search-query expansion.
+
+For short factual questions the LLM query planner mostly restates the
+question, adds the year and tacks on "official". expand_queries() does the
+same without a model round trip; plan_queries() decides per question whether
+that is enough or the LLM planner (generation.generate_plan) is worth calling.
+"""
+import datetime
+import re
+
+from bm25 import tokenize
+import config
+from .generation import generate_plan
+
+FRESHNESS_KEYWORDS = ("latest", "recent", "news", "today", "yesterday", "current")
+
+# Questions that ask for several things at once or a comparison need real planning
+_MULTI_PART_RE = re.compile(
+    r"\b(?:and|vs\.?|versus|compare[ds]?|comparison|difference between|differences|"
+    r"pros and cons|as well as|both|while|whereas|step by step|explain why)\b|[;,]"
+)
+
+_LEADING_RE = re.compile(
+    r"^(?:(?:can|could) you (?:tell me|find out|look up)\s+|please\s+|search (?:for|the web for)\s+)+"
+)
+
+def is_fresh(question: str) -> bool:
+    """Freshness keywords or the current year in the question."""
+    q = question.lower()
+    return any(kw in q for kw in FRESHNESS_KEYWORDS + (str(datetime.datetime.now().year),))
+
+def _normalize(question: str) -> str:
+    q = " ".join(question.strip().lower().split())
+    q = _LEADING_RE.sub("", q)
+    return q.rstrip("?.! ")
+
+def is_simple_question(question: str) -> bool:
+    """Short, single-part factual question."""
+    q = _normalize(question)
+    if not q:
+        return False
+    if len(q.split()) > config.QUERY_EXPANSION_MAX_WORDS:
+        return False
+    if question.count("?") > 1:
+        return False
+    return not _MULTI_PART_RE.search(q)
+
+def expand_queries(question: str, freshness: bool = False) -> list:
+    """
+    Query set for a simple question, in this order:
+      1. the question itself (normalized)
+      2. the question's key terms plus the current year, when freshness applies
+      3. the key terms plus "official", to pull in primary sources
+    """
+    q = _normalize(question)
+    if not q:
+        return [question]
+    year = str(datetime.datetime.now().year)
+    terms = " ".join(tokenize(q))
+
+    queries = [q]
+    if (freshness or is_fresh(q)) and year not in q:
+        queries.append(f"{terms or q} {year}")
+    if terms and "official" not in terms:
+        queries.append(f"{terms} official")
+
+    seen = set()
+    return [x for x in queries if not (x in seen or seen.add(x))]
+
+def plan_queries(question: str, freshness: bool = False, mode: str = None) -> dict:
+    """
+    Search queries for a question.
+
+    mode (default QUERY_EXPANSION_MODE): "fast" always expands deterministically,
+    "llm" always asks the LLM planner, "auto" uses the fast path for simple
+    questions. Returns {"queries": [...], "mode": "fast" | "llm"}.
+    """
+    mode = (mode or config.QUERY_EXPANSION_MODE).lower()
+    if mode == "fast" or (mode == "auto" and is_simple_question(question)):
+        return {"queries": expand_queries(question, freshness), "mode": "fast"}
+    plan = generate_plan(question, freshness)
+    return {"queries": plan.get("queries") or [question], "mode": "llm"}
@@ -2,6 +2,7 @@ import time
 import logging
 import urllib.parse
 from duckduckgo_search import DDGS
+from .cache import normalize_query
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,9 +19,8 @@ def execute_web_query(query: str, num_results: int = 10, max_retries: int = 2) -
     if not query or not query.strip():
         return []
 
-    # Sanitize query
-    clean_query = query.strip().lower()
-    clean_query = " ".join(clean_query.split()) # Collapse excessive spaces
+    # Sanitize query (same canonical form the search cache is keyed on)
+    clean_query = normalize_query(query)
 
     results = []
     attempt = 0
@@ -79,8 +79,7 @@ def execute_image_search(query: str, max_results: int = 4) -> list:
         return []
 
     # Sanitize query
-    clean_query = query.strip().lower()
-    clean_query = " ".join(clean_query.split())
+    clean_query = normalize_query(query)
 
     results = []
     max_retries = 2
@@ -6,6 +6,17 @@ from flask import Flask, render_template, request, jsonify
 from flask_socketio import SocketIO, emit
 from dispatcher import handle_user_text
 from context_manager import get_context
+import planner
+import ollama_client
+import llm_scheduler
+import model_warmup
+import intent_router
+import plan_cache
+import speculative
+import tool_registry
+import tracing
+from web_retrieval import processing
+from web_retrieval import cache as web_cache
 import os
 import json
 from datetime import datetime
@@ -55,6 +66,30 @@ def sphere_demo():
     """Serve the particle sphere demo (no voice assistant required)"""
     return render_template('sphere_demo.html')
 
+_STOP_COMMANDS = ('stop', 'cancel')
+
+def _is_stop(text):
+    """True for "stop" / "cancel", also as transcribed ("Stop.")"""
+    return text.lower().strip(' .!?,') in _STOP_COMMANDS
+
+def _special_command(user_message, channel):
+    """Response dict for built-in chat commands, or None for a normal message. "stop" only stops `channel`."""
+    context = get_context()
+    
+    if user_message.lower() == 'clear context':
+        context.clear()
+        return {'text': 'Conversation history cleared.', 'images': [], 'sources': []}
+    
+    if user_message.lower() == 'show context':
+        summary = context.get_summary()
+        return {'text': summary, 'images': [], 'sources': []}
+    
+    if _is_stop(user_message):
+        cancelled = llm_scheduler.cancel(channel)
+        return {'text': f'Stopped {cancelled} generation(s).' if cancelled else 'Nothing to stop.', 'images': [], 'sources': []}
+    
+    return None
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages from the web UI"""
@@ -65,25 +100,17 @@ def chat():
         if not user_message:
             return jsonify({'error': 'Empty message'}), 400
         
-        # Handle special commands
-        context = get_context()
-        
-        if user_message.lower() == 'clear context':
-            context.clear()
-            return jsonify({
-                'response': {'text': 'Conversation history cleared.', 'images': [], 'sources': []},
-                'system': True
-            })
+        # One channel per REST client: its next message (or "stop") only cancels its own turn
+        channel = f"rest:{data.get('client_id') or request.remote_addr}"
         
-        if user_message.lower() == 'show context':
-            summary = context.get_summary()
-            return jsonify({
-                'response': {'text': summary, 'images': [], 'sources': []},
-                'system': True
-            })
+        # Handle special commands
+        special = _special_command(user_message, channel)
+        if special is not None:
+            return jsonify({'response': special, 'system': True})
         
-        # Process normal message
-        response = handle_user_text(user_message)
+        # Process normal message (a newer message from this client cancels this one's generations)
+        with llm_scheduler.turn(channel):
+            response = handle_user_text(user_message)
         
         # Ensure response is structured dict
         if isinstance(response, str):
@@ -94,6 +121,8 @@ def chat():
             'system': False
         })
         
+    except llm_scheduler.Cancelled:
+        return jsonify({'error': 'Cancelled', 'cancelled': True}), 409
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -384,14 +413,24 @@ def get_systems_status():
     
     # Check LLM
     try:
-        r = requests.get(f"{config.OLLAMA_URL}/api/tags", timeout=2)
-        if r.status_code == 200:
-            status["llm"]["status"] = "online"
-        else:
-            status["llm"]["status"] = "error"
+        ollama_client.get_json("/api/tags", timeout=2)
+        status["llm"]["status"] = "online"
+    except requests.HTTPError:
+        status["llm"]["status"] = "error"
     except:
         status["llm"]["status"] = "offline"
 
+    # Planner prompt-eval counters (prefix cache reuse shows up as a small prompt_eval_count)
+    status["llm"]["planner"] = planner.get_planner_metrics()
+    status["llm"]["fast_router"] = intent_router.get_stats()
+    status["llm"]["plan_cache"] = plan_cache.get_stats()
+    status["llm"]["client"] = ollama_client.get_metrics()
+    status["llm"]["scheduler"] = llm_scheduler.get_status()
+    status["llm"]["models"] = model_warmup.get_status()
+    status["speculative"] = speculative.get_stats()
+    status["tools"] = tool_registry.get_stats()
+    status["cache"] = web_cache.get_stats()
+
     # Check Web (DuckDuckGo reachability)
     try:
         r = requests.get("https://duckduckgo.com", timeout=2)
@@ -403,6 +442,21 @@ def get_systems_status():
         
     return jsonify(status)
 
+@app.route('/api/systems/traces', methods=['GET'])
+def get_systems_traces():
+    """Recent per-stage traces (newest first). ?limit=N, ?name=turn to filter by root span."""
+    limit = request.args.get('limit', 20, type=int)
+    name = request.args.get('name')
+    traces = tracing.get_traces(limit=config.TRACE_BUFFER_SIZE if name else limit)
+    if name:
+        traces = [t for t in traces if t["name"] == name][:limit]
+    return jsonify({"enabled": config.TRACING_ENABLED, "traces": traces})
+
+@app.route('/api/systems/traces', methods=['DELETE'])
+def clear_systems_traces():
+    tracing.clear()
+    return jsonify({"message": "Traces cleared"})
+
 # --- ROBOTS ENDPOINTS ---
 
 @app.route('/api/robots', methods=['GET'])
@@ -482,15 +536,31 @@ def start_voice_assistant():
         if voice_assistant is None:
             from voice_module import VoiceAssistant
             
-            def voice_callback(command_text):
-                """Handle voice commands"""
-                response = handle_user_text(command_text)
+            def voice_callback(command_text, on_event=None):
+                """Handle voice commands; streamed events go to TTS and the UI"""
+                def forward(kind, payload):
+                    if on_event:
+                        on_event(kind, payload)
+                    socketio.emit(f'voice_{kind}', payload)
+                
+                if _is_stop(command_text):
+                    # The voice module stopped speaking when the user spoke; end the generation quietly
+                    socketio.emit('voice_cancelled', {'command': command_text,
+                                                      'cancelled': llm_scheduler.cancel('voice')})
+                    return ''
+                
+                try:
+                    with llm_scheduler.turn('voice'):
+                        response = handle_user_text(command_text, on_event=forward)
+                except llm_scheduler.Cancelled:
+                    socketio.emit('voice_cancelled', {'command': command_text})
+                    return ''
                 # Emit to frontend
                 socketio.emit('voice_interaction', {
                     'command': command_text,
                     'response': response
                 })
-                return response
+                return response.get('text', '') if isinstance(response, dict) else response
             
             def status_callback(status):
                 """Handle status updates"""
@@ -500,7 +570,7 @@ def start_voice_assistant():
                 """Handle audio level updates for visualization"""
                 socketio.emit('audio_level', {'level': level})
             
-            voice_assistant = VoiceAssistant(callback=voice_callback)
+            voice_assistant = VoiceAssistant(callback=voice_callback, streaming=True)
             voice_assistant.set_status_callback(status_callback)
             voice_assistant.set_audio_level_callback(audio_level_callback)
             
@@ -526,6 +596,7 @@ def stop_voice_assistant():
     try:
         if voice_assistant:
             voice_assistant.stop()
+        llm_scheduler.cancel('voice')
         return jsonify({"status": "stopped"})
         
     except Exception as e:
@@ -557,10 +628,62 @@ def handle_disconnect():
     """Handle WebSocket disconnection"""
     print('Client disconnected')
 
+@socketio.on('chat_message')
+def handle_chat_message(data):
+    """
+    Streaming chat over the socket. Emits to the sending client only:
+        chat_token {id, text}, chat_citations {id, citations}, chat_images {id, images},
+        chat_reset {id}, then chat_done {id, response, system} or chat_error {id, error}
+    """
+    sid = request.sid
+    data = data or {}
+    message_id = data.get('id')
+    user_message = (data.get('message') or '').strip()
+    
+    if not user_message:
+        emit('chat_error', {'id': message_id, 'error': 'Empty message'})
+        return
+    
+    special = _special_command(user_message, f'web:{sid}')
+    if special is not None:
+        emit('chat_done', {'id': message_id, 'response': special, 'system': True})
+        return
+    
+    def on_event(kind, payload):
+        socketio.emit(f'chat_{kind}', dict(payload, id=message_id), to=sid)
+    
+    def run():
+        try:
+            # A newer message from this client makes this one obsolete
+            with llm_scheduler.turn(f'web:{sid}'):
+                response = handle_user_text(user_message, on_event=on_event)
+            if isinstance(response, str):
+                response = {'text': response, 'images': [], 'sources': []}
+            socketio.emit('chat_done', {'id': message_id, 'response': response, 'system': False}, to=sid)
+        except llm_scheduler.Cancelled:
+            socketio.emit('chat_error', {'id': message_id, 'error': 'Cancelled', 'cancelled': True}, to=sid)
+        except Exception as e:
+            socketio.emit('chat_error', {'id': message_id, 'error': str(e)}, to=sid)
+    
+    # Don't block the socket's event handler while the turn runs
+    socketio.start_background_task(run)
+
+@socketio.on('chat_stop')
+def handle_chat_stop(data=None):
+    """Abort the sending client's running turn; its chat_message gets chat_error {cancelled: true}"""
+    emit('chat_stopped', {'cancelled': llm_scheduler.cancel(f'web:{request.sid}')})
+
 if __name__ == '__main__':
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
     
+    if config.OLLAMA_WARMUP:
+        model_warmup.start()
+    if config.PLANNER_WARMUP:
+        planner.warm_up_async()
+    if config.RERANK_WARMUP:
+        processing.warm_up_reranker_async()
+    
     print("="*60)
     print("VECTOR WEB INTERFACE")
     print("="*60)